@@ -0,0 +1,115 @@
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple, Union
+
+from kumo.async_storage import ThreadedStorage
+from kumo.async_task_manager import AsyncTaskManager
+from kumo.query import field
+from kumo.sqlite_storage import SqliteStorage
+from kumo.task import TaskPriority
+from kumo.task_manager import TaskManager
+
+
+# Calls the synchronous manager straight from the coroutines, blocking the
+# event loop for every request, which is what embedding kumo used to mean.
+class BlockingManager:
+    def __init__(self, manager: TaskManager):
+        self.manager = manager
+
+    async def get_task(self, id: int):
+        return self.manager.get_task(id)
+
+    async def get_tasks(self, **kwargs):
+        return self.manager.get_tasks(**kwargs)
+
+    async def update_task(self, task):
+        self.manager.update_task(task)
+
+
+def populate(db_path: str, count: int) -> None:
+    storage = SqliteStorage(db_path)
+    TaskManager(storage).create_tasks(
+        {"name": f"Task {i}", "due_date": f"2025-{i % 12 + 1:02d}-01", "priority": TaskPriority(i % 3 + 1),
+         "category": f"category-{i % 10}"}
+        for i in range(count)
+    )
+    storage.close()
+
+
+async def client(manager, count: int, requests: int, write_ratio: float, seed: int) -> None:
+    rng = random.Random(seed)
+    for _ in range(requests):
+        roll = rng.random()
+        id = rng.randint(1, count)
+        if roll < write_ratio:
+            task = await manager.get_task(id)
+            task.name = f"Task {id} edited"
+            await manager.update_task(task)
+        elif roll < 0.5:
+            await manager.get_task(id)
+        else:
+            await manager.get_tasks(query=field("category") == f"category-{id % 10}", order_by="due_date", limit=20)
+
+
+async def heartbeat(stalls: list, interval: float = 0.001) -> None:
+    # Records how late the event loop wakes up a sleeping coroutine, which is
+    # the latency every other request handled by the service would see.
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        stalls.append(time.perf_counter() - start - interval)
+
+
+async def run(manager, count: int, clients: int, requests: int, write_ratio: float) -> Tuple[float, float]:
+    stalls: List[float] = []
+    monitor = asyncio.create_task(heartbeat(stalls))
+    start = time.perf_counter()
+    await asyncio.gather(*(client(manager, count, requests, write_ratio, seed) for seed in range(clients)))
+    elapsed = time.perf_counter() - start
+    # Lets a heartbeat that was starved for the whole run record its stall.
+    await asyncio.sleep(0.01)
+    monitor.cancel()
+    return clients * requests / elapsed, max(stalls, default=0.0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare concurrent request throughput of async SQLite access")
+    parser.add_argument("--count", help="number of tasks in the store", type=int, default=50000)
+    parser.add_argument("--clients", help="number of concurrent clients", type=int, default=32)
+    parser.add_argument("--requests", help="requests per client", type=int, default=200)
+    parser.add_argument("--write-ratio", help="fraction of requests that update a task", type=float, default=0.1)
+    parser.add_argument("--workers", help="read threads for the pooled variant", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, "bench.db")
+        populate(db_path, args.count)
+
+        variants: Dict[str, Callable[[], Union[BlockingManager, ThreadedStorage]]] = {
+            "blocking calls on the event loop": lambda: BlockingManager(TaskManager(SqliteStorage(db_path))),
+            "thread pool, serialized reads": lambda: ThreadedStorage(SqliteStorage(db_path), concurrent_reads=False),
+            f"thread pool, {args.workers} read connections": lambda: ThreadedStorage(SqliteStorage(db_path),
+                                                                                    max_workers=args.workers),
+        }
+        print(f"{'variant':<40}{'requests/sec':>14}{'max loop stall ms':>20}")
+        for label, factory in variants.items():
+            async def measure() -> Tuple[float, float]:
+                target = factory()
+                if isinstance(target, ThreadedStorage):
+                    async with target:
+                        return await run(AsyncTaskManager(target), args.count, args.clients, args.requests,
+                                         args.write_ratio)
+                result = await run(target, args.count, args.clients, args.requests, args.write_ratio)
+                target.manager.storage.close()
+                return result
+
+            throughput, stall = asyncio.run(measure())
+            print(f"{label:<40}{throughput:>14.0f}{stall * 1000:>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
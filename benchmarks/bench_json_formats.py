@@ -0,0 +1,59 @@
+import argparse
+import gc
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from benchmarks.suite import synthetic_tasks
+from kumo.storage import JSON_COMPRESSIONS, JSON_LAYOUTS, JsonStorage
+from kumo.task import Task
+
+
+def run_formats(directory: str, count: int = 100000, repeat: int = 3) -> List[Dict[str, Any]]:
+    # Writes the same synthetic tasks in every layout and compression, and
+    # times a fresh storage loading the file, as a new process would.
+    tasks = [Task(id=i, **fields) for i, fields in enumerate(synthetic_tasks(count), 1)]
+    results = []
+    for layout in JSON_LAYOUTS:
+        for compression in ("none", *JSON_COMPRESSIONS):
+            path = os.path.join(directory, f"tasks-{layout}-{compression}.json")
+            storage = JsonStorage(path, layout, compression)
+            start = time.perf_counter()
+            storage.save_tasks(tasks)
+            write_seconds = time.perf_counter() - start
+
+            load_seconds = []
+            for _ in range(repeat):
+                gc.collect()
+                start = time.perf_counter()
+                JsonStorage(path).get_task(1)
+                load_seconds.append(time.perf_counter() - start)
+            results.append({
+                "layout": layout,
+                "compression": compression,
+                "bytes": os.path.getsize(path),
+                "write_seconds": write_seconds,
+                "load_seconds": min(load_seconds),
+            })
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare JsonStorage file sizes and load times per format")
+    parser.add_argument("--count", help="number of tasks in the file", type=int, default=100000)
+    parser.add_argument("--repeat", help="loads timed per format, the fastest is reported", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        results = run_formats(temp_dir, args.count, args.repeat)
+    baseline = results[0]["bytes"]
+    print(f"{'layout':<10}{'compression':<13}{'bytes':>12}{'size %':>8}{'write ms':>10}{'load ms':>10}")
+    for result in results:
+        print(f"{result['layout']:<10}{result['compression']:<13}{result['bytes']:>12}"
+              f"{result['bytes'] / baseline * 100:>8.1f}{result['write_seconds'] * 1000:>10.1f}"
+              f"{result['load_seconds'] * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import Any, Dict
+
+from kumo.storage import JsonStorage
+from kumo.task_manager import TaskManager
+
+
+def _writer(path: str, worker: int, writes: int, start: Any) -> None:
+    manager = TaskManager(JsonStorage(path))
+    start.wait()
+    for i in range(writes):
+        task = manager.create_task(f"worker {worker} task {i}", "2025-01-01", category=f"worker-{worker}")
+        task.name += " updated"
+        manager.update_task(task)
+
+
+def run_writers(path: str, processes: int = 4, writes: int = 50) -> Dict[str, Any]:
+    # Every process creates `writes` tasks and then updates each of them,
+    # all against the same file at the same time.
+    start = multiprocessing.Event()
+    workers = [multiprocessing.Process(target=_writer, args=(path, worker, writes, start))
+               for worker in range(processes)]
+    for worker in workers:
+        worker.start()
+    began = time.perf_counter()
+    start.set()
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - began
+    if any(worker.exitcode for worker in workers):
+        raise RuntimeError("A writer process failed")
+
+    tasks = JsonStorage(path).get_all_tasks()
+    operations = processes * writes * 2
+    return {
+        "processes": processes,
+        "operations": operations,
+        "seconds": seconds,
+        "operations_per_second": operations / seconds,
+        "tasks": len(tasks),
+        "lost_saves": processes * writes - len({task.id for task in tasks}),
+        "lost_updates": sum(not task.name.endswith(" updated") for task in tasks),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run concurrent writer processes against one JsonStorage file")
+    parser.add_argument("--processes", help="number of writer processes", type=int, default=4)
+    parser.add_argument("--writes", help="tasks created and updated by each process", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        result = run_writers(os.path.join(temp_dir, "tasks.json"), args.processes, args.writes)
+    for name, value in result.items():
+        print(f"{name:<24}{value:>12.2f}" if isinstance(value, float) else f"{name:<24}{value:>12}")
+
+
+if __name__ == "__main__":
+    main()
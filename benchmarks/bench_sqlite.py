@@ -0,0 +1,81 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from kumo.sqlite_storage import SqliteStorage
+from kumo.task import Task, TaskPriority
+
+
+# Opens a new connection and commits with the default rollback journal for
+# every operation, which is how SqliteStorage used to behave.
+class ConnectPerOperationStorage:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.storage = SqliteStorage(db_path, journal_mode="delete", synchronous="full", mmap_size=0)
+        self.storage.close()
+
+    def _run(self, query: str, params: tuple) -> None:
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(query, params).fetchall()
+        conn.commit()
+        conn.close()
+
+    def save_task(self, task: Task) -> None:
+        self._run("INSERT INTO tasks (id, name, due_date, priority, category) VALUES (?, ?, ?, ?, ?)",
+                  (task.id, task.name, task.due_date.toordinal(), task.priority.value if task.priority else None,
+                   task.category))
+
+    def get_task(self, id: int) -> None:
+        self._run("SELECT * FROM tasks WHERE id = ?", (id,))
+
+    def update_task(self, task: Task) -> None:
+        self._run("UPDATE tasks SET name = ? WHERE id = ?", (task.name, task.id))
+
+    def delete_task(self, id: int) -> None:
+        self._run("DELETE FROM tasks WHERE id = ?", (id,))
+
+    def close(self) -> None:
+        pass
+
+
+def run(storage, count: int) -> Dict[str, float]:
+    tasks = [Task(id=i, name=f"Task {i}", due_date="2025-01-01", priority=TaskPriority.MEDIUM, category="bench")
+             for i in range(1, count + 1)]
+    operations: Dict[str, Callable[[Task], None]] = {
+        "save": storage.save_task,
+        "get": lambda task: storage.get_task(task.id),
+        "update": storage.update_task,
+        "delete": lambda task: storage.delete_task(task.id),
+    }
+
+    results = {}
+    for name, operation in operations.items():
+        start = time.perf_counter()
+        for task in tasks:
+            operation(task)
+        results[name] = count / (time.perf_counter() - start)
+    storage.close()
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare SqliteStorage ops/sec against a connection per operation")
+    parser.add_argument("--count", help="number of tasks", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        variants = {
+            "connect-per-operation": ConnectPerOperationStorage(os.path.join(temp_dir, "before.db")),
+            "persistent (wal, synchronous=normal)": SqliteStorage(os.path.join(temp_dir, "after.db")),
+        }
+        print(f"{'variant':<40}" + "".join(f"{name:>12}" for name in ("save", "get", "update", "delete")))
+        for label, storage in variants.items():
+            results = run(storage, args.count)
+            print(f"{label:<40}" + "".join(f"{ops:>12.0f}" for ops in results.values()))
+
+
+if __name__ == "__main__":
+    main()
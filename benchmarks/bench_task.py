@@ -0,0 +1,71 @@
+import argparse
+import datetime
+import gc
+import time
+import tracemalloc
+from typing import Callable, List, Optional
+
+from kumo.task import Task, TaskPriority
+
+
+# The Task class as it was before it gained __slots__ and the fast parsing
+# paths, kept as a baseline.
+class LegacyTask:
+    def __init__(self, id: int, name: str, due_date: str, priority: Optional[TaskPriority] = None, category: Optional[str] = None):
+        self.id = id
+        self.name = name
+        self.due_date = datetime.datetime.strptime(due_date, "%Y-%m-%d").date()
+        self.priority = priority
+        self.category = category
+
+    @property
+    def due_date(self) -> datetime.date:
+        return self._due_date
+
+    @due_date.setter
+    def due_date(self, value):
+        if isinstance(value, str):
+            self._due_date = datetime.datetime.strptime(value, "%Y-%m-%d").date()
+        else:
+            self._due_date = value
+
+
+def measure(label: str, count: int, build: Callable[[int], object]) -> None:
+    gc.collect()
+    start = time.perf_counter()
+    objects: List[object] = [build(i) for i in range(count)]
+    elapsed = time.perf_counter() - start
+    del objects
+
+    sample = min(count, 100_000)
+    gc.collect()
+    tracemalloc.start()
+    objects = [build(i) for i in range(sample)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+
+    print(f"{label:<32}{elapsed:>10.2f}{elapsed / count * 1e9:>14.0f}{size / sample:>14.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure Task construction time and per-object memory")
+    parser.add_argument("--count", help="number of tasks to construct", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    ordinal = datetime.date(2025, 1, 1).toordinal()
+    data = {"id": 1, "name": "Task", "dueDate": "2025-01-01", "priority": 2, "category": "bench"}
+
+    print(f"{'variant':<32}{'total s':>10}{'ns/task':>14}{'bytes/task':>14}")
+    measure("legacy Task(str)", args.count,
+            lambda i: LegacyTask(i, "Task", "2025-01-01", TaskPriority.MEDIUM, "bench"))
+    measure("Task(str)", args.count,
+            lambda i: Task(i, "Task", "2025-01-01", TaskPriority.MEDIUM, "bench"))
+    measure("Task(date)", args.count,
+            lambda i: Task(i, "Task", datetime.date.fromordinal(ordinal), TaskPriority.MEDIUM, "bench"))
+    measure("Task.from_dict", args.count, lambda i: Task.from_dict(data))
+    measure("Task.from_row", args.count, lambda i: Task.from_row((i, "Task", ordinal, 2, "bench")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import argparse
+import contextlib
+import datetime
+import functools
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from kumo.cli_types import positive_int
+from kumo.registry import backends
+from kumo.storage import Storage
+from kumo.task import TaskPriority
+from kumo.task_manager import TaskManager
+
+DEFAULT_SIZES = (1000, 10000)
+DEFAULT_OPS = 100
+CATEGORIES = tuple(f"category-{i}" for i in range(20))
+WORDS = ("buy", "milk", "write", "report", "call", "plan", "review", "fix", "book", "clean", "pay", "send")
+FIRST_DUE_DATE = datetime.date(2024, 1, 1)
+
+StorageFactory = Callable[[], Storage]
+
+
+@contextlib.contextmanager
+def _working_directory(path: str) -> Iterator[None]:
+    # The registered storage factories open files relative to the working
+    # directory, so each store is built inside its own temporary directory.
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def synthetic_tasks(count: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield {
+            "name": " ".join(rng.choices(WORDS, k=3)),
+            "due_date": FIRST_DUE_DATE + datetime.timedelta(days=rng.randrange(730)),
+            "priority": rng.choice((None, TaskPriority.LOW, TaskPriority.MEDIUM, TaskPriority.HIGH)),
+            "category": rng.choice(CATEGORIES + (None,)),
+        }
+
+
+def _directory_size(path: str) -> int:
+    # Sharded stores keep their files in subdirectories.
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def _summarize(operation: str, latencies: List[float]) -> Dict[str, Any]:
+    total = sum(latencies)
+    quantiles = statistics.quantiles(latencies, n=20) if len(latencies) > 1 else latencies * 19
+    return {
+        "operation": operation,
+        "ops": len(latencies),
+        "total_seconds": total,
+        "mean_seconds": total / len(latencies),
+        "p50_seconds": statistics.median(latencies),
+        "p95_seconds": quantiles[18],
+        "ops_per_second": len(latencies) / total if total else None,
+    }
+
+
+def _time_each(calls: Sequence[Callable[[], Any]]) -> List[float]:
+    latencies = []
+    for call in calls:
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_store(factory: StorageFactory, size: int, ops: int, seed: int = 0) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory, _working_directory(directory):
+        storage = factory()
+        start = time.perf_counter()
+        TaskManager(storage).create_tasks(synthetic_tasks(size, seed))
+        populate_seconds = time.perf_counter() - start
+        storage.close()
+
+        # Startup is a fresh process's view: a new storage and manager
+        # answering their first request.
+        gc.collect()
+        start = time.perf_counter()
+        storage = factory()
+        manager = TaskManager(storage)
+        manager.get_task(1)
+        startup_seconds = time.perf_counter() - start
+
+        results = [{"operation": "startup", "ops": 1, "total_seconds": startup_seconds}]
+        try:
+            ids = rng.sample(range(1, size + 1), min(ops, size))
+            filters = [(rng.choice(CATEGORIES), rng.randint(1, 3)) for _ in range(max(ops // 10, 1))]
+            new_tasks = list(synthetic_tasks(ops, seed + 1))
+
+            results.append(_summarize("get_task", _time_each([functools.partial(manager.get_task, id) for id in ids])))
+            results.append(_summarize("get_tasks_filtered", _time_each(
+                [functools.partial(manager.get_tasks, category=c, priority=p) for c, p in filters])))
+            results.append(_summarize("create_task", _time_each(
+                [functools.partial(manager.create_task, **fields) for fields in new_tasks])))
+
+            tasks = []
+            for id in ids:
+                task = manager.get_task(id)
+                if task is None:
+                    raise RuntimeError(f"Task {id} is missing from the populated store")
+                task.name += " edited"
+                tasks.append(task)
+            results.append(_summarize("update_task", _time_each(
+                [functools.partial(manager.update_task, task) for task in tasks])))
+            results.append(_summarize("delete_task", _time_each(
+                [functools.partial(manager.delete_task, id) for id in ids])))
+        finally:
+            storage.close()
+
+        return {
+            "size": size,
+            "populate_seconds": populate_seconds,
+            "store_bytes": _directory_size(directory),
+            "operations": results,
+        }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        output = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def run_suite(factories: Dict[str, StorageFactory], sizes: Sequence[int] = DEFAULT_SIZES, ops: int = DEFAULT_OPS,
+              seed: int = 0, progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    results = []
+    for storage_type, factory in factories.items():
+        for size in sizes:
+            if progress:
+                progress(f"{storage_type}: {size} tasks")
+            results.append({"storage": storage_type, **bench_store(factory, size, ops, seed)})
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "ops": ops,
+        "seed": seed,
+        "results": results,
+    }
+
+
+def _sizes_argument(text: str) -> List[int]:
+    try:
+        sizes = [int(size) for size in text.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid sizes: {text!r}")
+    if any(size < 1 for size in sizes):
+        raise argparse.ArgumentTypeError("Sizes must be positive")
+    return sizes
+
+
+def main(argv: Optional[List[str]] = None, factories: Optional[Dict[str, StorageFactory]] = None) -> None:
+    if factories is None:
+        factories = {name: backend.open for name, backend in backends().items()}
+
+    parser = argparse.ArgumentParser(prog="bench", description="Time TaskManager operations on every storage backend")
+    parser.add_argument("--sizes", help="comma separated store sizes, e.g. 1000,100000,1000000",
+                        type=_sizes_argument, default=list(DEFAULT_SIZES))
+    parser.add_argument("--ops", help="number of timed calls per operation", type=positive_int,
+                        default=DEFAULT_OPS)
+    parser.add_argument("--storage", help=f"backends to run, available: {list(factories)}", action="append",
+                        choices=list(factories))
+    parser.add_argument("--seed", help="seed for the synthetic stores", type=int, default=0)
+    parser.add_argument("--output", help="file to write the JSON report to, default: stdout", type=str)
+    args = parser.parse_args(argv)
+
+    selected = {name: factories[name] for name in args.storage} if args.storage else factories
+    report = run_suite(selected, args.sizes, args.ops, args.seed,
+                       progress=lambda message: print(message, file=sys.stderr))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import asyncio
+import functools
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterable, List, Optional, Protocol, TypeVar
+
+from kumo.query import Query
+from kumo.sqlite_storage import SqliteStorage
+from kumo.storage import Storage, Summary
+from kumo.task import Task
+
+T = TypeVar("T")
+
+
+class AsyncStorage(Protocol):
+    async def get_task(self, id: int) -> Optional[Task]:
+        ...
+
+    async def get_all_tasks(self) -> List[Task]:
+        ...
+
+    async def get_tasks(self, category: Optional[str] = None, priority: Optional[int] = None,
+                        order_by: Optional[str] = None, descending: bool = False, limit: Optional[int] = None,
+                        offset: int = 0, query: Optional[Query] = None) -> List[Task]:
+        ...
+
+    def iter_tasks(self, category: Optional[str] = None, priority: Optional[int] = None,
+                   order_by: Optional[str] = None, descending: bool = False, limit: Optional[int] = None,
+                   offset: int = 0, query: Optional[Query] = None) -> AsyncIterator[Task]:
+        ...
+
+    async def save_task(self, task: Task) -> None:
+        ...
+
+    async def update_task(self, task: Task) -> None:
+        ...
+
+    async def delete_task(self, id: int) -> None:
+        ...
+
+    async def save_tasks(self, tasks: Iterable[Task]) -> None:
+        ...
+
+    async def update_tasks(self, tasks: Iterable[Task]) -> None:
+        ...
+
+    async def delete_tasks(self, ids: Iterable[int]) -> None:
+        ...
+
+    async def allocate_ids(self, count: int = 1) -> int:
+        ...
+
+    async def next_id(self) -> int:
+        ...
+
+    async def search(self, text: str, limit: Optional[int] = None) -> List[Task]:
+        ...
+
+    async def summarize(self, group_by: Iterable[str] = (), category: Optional[str] = None,
+                        priority: Optional[int] = None, query: Optional[Query] = None) -> Summary:
+        ...
+
+    async def close(self) -> None:
+        ...
+
+
+class ThreadedStorage:
+    # Runs a synchronous storage on worker threads so its I/O does not block
+    # the event loop. Writes go through a single thread, in the order they
+    # were awaited. Reads share that thread too unless the backend handles
+    # concurrent readers: SqliteStorage opens one connection per thread, so
+    # there reads run on a pool of `max_workers` threads, each with its own
+    # read connection, in parallel with each other and with the writer.
+    # iter_tasks then runs on one more thread of its own, as a cursor has
+    # to be advanced on the thread whose connection opened it.
+    def __init__(self, storage: Storage, max_workers: int = 4, concurrent_reads: Optional[bool] = None,
+                 iter_batch_size: int = 500):
+        if concurrent_reads is None:
+            concurrent_reads = isinstance(storage, SqliteStorage)
+        self.storage = storage
+        self.iter_batch_size = iter_batch_size
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kumo-writer")
+        self._reader = (ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kumo-reader")
+                        if concurrent_reads else self._writer)
+        self._iterator = (ThreadPoolExecutor(max_workers=1, thread_name_prefix="kumo-iterator")
+                          if concurrent_reads else self._writer)
+
+    async def _run(self, executor: ThreadPoolExecutor, function: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(function, *args))
+
+    async def get_task(self, id: int) -> Optional[Task]:
+        return await self._run(self._reader, self.storage.get_task, id)
+
+    async def get_all_tasks(self) -> List[Task]:
+        return await self._run(self._reader, self.storage.get_all_tasks)
+
+    async def get_tasks(self, category: Optional[str] = None, priority: Optional[int] = None,
+                        order_by: Optional[str] = None, descending: bool = False, limit: Optional[int] = None,
+                        offset: int = 0, query: Optional[Query] = None) -> List[Task]:
+        return await self._run(self._reader, self.storage.get_tasks, category, priority, order_by, descending,
+                               limit, offset, query)
+
+    async def iter_tasks(self, category: Optional[str] = None, priority: Optional[int] = None,
+                         order_by: Optional[str] = None, descending: bool = False, limit: Optional[int] = None,
+                         offset: int = 0, query: Optional[Query] = None) -> AsyncIterator[Task]:
+        # The storage iterator is created, advanced a batch at a time and
+        # closed on the same thread, so a large listing still streams without
+        # blocking the loop. Closing also covers a caller that stops early.
+        tasks = await self._run(self._iterator, self.storage.iter_tasks, category, priority, order_by, descending,
+                                limit, offset, query)
+        try:
+            while True:
+                batch = await self._run(self._iterator, lambda: list(itertools.islice(tasks, self.iter_batch_size)))
+                for task in batch:
+                    yield task
+                if len(batch) < self.iter_batch_size:
+                    return
+        finally:
+            close = getattr(tasks, "close", None)
+            if close is not None:
+                await self._run(self._iterator, close)
+
+    async def save_task(self, task: Task) -> None:
+        await self._run(self._writer, self.storage.save_task, task)
+
+    async def update_task(self, task: Task) -> None:
+        await self._run(self._writer, self.storage.update_task, task)
+
+    async def delete_task(self, id: int) -> None:
+        await self._run(self._writer, self.storage.delete_task, id)
+
+    async def save_tasks(self, tasks: Iterable[Task]) -> None:
+        await self._run(self._writer, self.storage.save_tasks, list(tasks))
+
+    async def update_tasks(self, tasks: Iterable[Task]) -> None:
+        await self._run(self._writer, self.storage.update_tasks, list(tasks))
+
+    async def delete_tasks(self, ids: Iterable[int]) -> None:
+        await self._run(self._writer, self.storage.delete_tasks, list(ids))
+
+    async def allocate_ids(self, count: int = 1) -> int:
+        return await self._run(self._writer, self.storage.allocate_ids, count)
+
+    async def next_id(self) -> int:
+        return await self._run(self._reader, self.storage.next_id)
+
+    async def search(self, text: str, limit: Optional[int] = None) -> List[Task]:
+        return await self._run(self._reader, self.storage.search, text, limit)
+
+    async def summarize(self, group_by: Iterable[str] = (), category: Optional[str] = None,
+                        priority: Optional[int] = None, query: Optional[Query] = None) -> Summary:
+        return await self._run(self._reader, self.storage.summarize, tuple(group_by), category, priority, query)
+
+    async def close(self) -> None:
+        await self._run(self._writer, self.storage.close)
+        self._writer.shutdown()
+        self._reader.shutdown()
+        self._iterator.shutdown()
+
+    async def __aenter__(self) -> "ThreadedStorage":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
@@ -0,0 +1,62 @@
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from kumo.async_storage import AsyncStorage
+from kumo.query import Query
+from kumo.storage import Summary
+from kumo.task import Task, TaskPriority
+
+
+class AsyncTaskManager:
+    def __init__(self, storage: AsyncStorage):
+        self.storage = storage
+
+    async def create_task(self, name: str, due_date: str, priority: Optional[TaskPriority] = None,
+                          category: Optional[str] = None) -> Task:
+        task = Task(id=await self.storage.allocate_ids(1), name=name, due_date=due_date,
+                    priority=priority, category=category)
+        await self.storage.save_task(task)
+        return task
+
+    async def create_tasks(self, tasks: Iterable[Dict[str, Any]]) -> List[Task]:
+        fields_list = list(tasks)
+        if not fields_list:
+            return []
+        first_id = await self.storage.allocate_ids(len(fields_list))
+        created = [Task(id=first_id + i, **fields) for i, fields in enumerate(fields_list)]
+        await self.storage.save_tasks(created)
+        return created
+
+    async def get_task(self, id: int) -> Optional[Task]:
+        return await self.storage.get_task(id)
+
+    async def get_all_tasks(self) -> List[Task]:
+        return await self.storage.get_all_tasks()
+
+    async def get_tasks(self, category: Optional[str] = None, priority: Optional[int] = None,
+                        order_by: Optional[str] = None, descending: bool = False, limit: Optional[int] = None,
+                        offset: int = 0, query: Optional[Query] = None) -> List[Task]:
+        return await self.storage.get_tasks(category, priority, order_by, descending, limit, offset, query)
+
+    def iter_tasks(self, category: Optional[str] = None, priority: Optional[int] = None,
+                   order_by: Optional[str] = None, descending: bool = False, limit: Optional[int] = None,
+                   offset: int = 0, query: Optional[Query] = None) -> AsyncIterator[Task]:
+        return self.storage.iter_tasks(category, priority, order_by, descending, limit, offset, query)
+
+    async def search(self, text: str, limit: Optional[int] = None) -> List[Task]:
+        return await self.storage.search(text, limit)
+
+    async def summarize(self, group_by: Iterable[str] = (), category: Optional[str] = None,
+                        priority: Optional[int] = None, query: Optional[Query] = None) -> Summary:
+        return await self.storage.summarize(group_by, category, priority, query)
+
+    async def update_task(self, task: Task) -> None:
+        await self.storage.update_task(task)
+
+    async def update_tasks(self, tasks: Iterable[Task]) -> None:
+        await self.storage.update_tasks(tasks)
+
+    async def delete_task(self, id: int) -> None:
+        await self.storage.delete_task(id)
+
+    async def delete_tasks(self, ids: Iterable[int]) -> None:
+        await self.storage.delete_tasks(ids)
@@ -0,0 +1,112 @@
+import argparse
+import json
+from typing import Any, Dict, Iterable, List, TextIO, Tuple, Union
+
+from kumo.task import TaskPriority, parse_due_date
+from kumo.task_manager import TaskManager
+
+BATCH_WRITE_ACTIONS = ("add", "delete")
+BATCH_READ_ACTIONS = ("get", "list", "search")
+BATCH_ACTIONS = BATCH_READ_ACTIONS + BATCH_WRITE_ACTIONS
+
+# A parsed command, or the message explaining why its line could not be parsed.
+BatchCommand = Tuple[int, Union[argparse.Namespace, str]]
+
+
+class BatchRunner:
+    # Consecutive commands of the same write action are queued and applied
+    # with one batch call, which is one transaction or file rewrite in every
+    # storage. A read, or a write of the other kind, applies the queue first,
+    # so each command still sees the effects of the ones before it.
+    def __init__(self, manager: TaskManager, output: TextIO):
+        self.manager = manager
+        self.output = output
+        self.failed = 0
+        self._pending_action = ""
+        self._pending: List[Tuple[int, Any]] = []
+
+    def run(self, commands: Iterable[BatchCommand]) -> int:
+        for line, args in commands:
+            if isinstance(args, str):
+                self._fail(line, args)
+            else:
+                self.execute(line, args)
+        self.flush()
+        return self.failed
+
+    def execute(self, line: int, args: argparse.Namespace) -> None:
+        action = args.action
+        if action not in BATCH_ACTIONS:
+            self.flush()
+            self._fail(line, f"Unknown action: {action}", action)
+            return
+        try:
+            entry = self._validate(args)
+        except ValueError as e:
+            self.flush()
+            self._fail(line, str(e), action)
+            return
+
+        if action in BATCH_WRITE_ACTIONS:
+            if action != self._pending_action:
+                self.flush()
+                self._pending_action = action
+            self._pending.append((line, entry))
+            return
+
+        self.flush()
+        if action == "get":
+            task = self.manager.get_task(args.id)
+            self._report(line, action, task=task.to_dict() if task else None)
+        elif action == "list":
+            listed = self.manager.iter_tasks(args.category, args.priority, args.order_by, args.desc, args.limit,
+                                             args.offset, args.where)
+            self._report(line, action, tasks=[task.to_dict() for task in listed])
+        else:
+            found = self.manager.search(args.text, args.limit)
+            self._report(line, action, tasks=[task.to_dict() for task in found])
+
+    def flush(self) -> None:
+        pending, action = self._pending, self._pending_action
+        self._pending, self._pending_action = [], ""
+        if not pending:
+            return
+        if action == "add":
+            created = self.manager.create_tasks(fields for _, fields in pending)
+            for (line, _), task in zip(pending, created):
+                self._report(line, action, task=task.to_dict())
+        else:
+            self.manager.delete_tasks(id for _, id in pending)
+            for line, id in pending:
+                self._report(line, action, id=id)
+
+    def _validate(self, args: argparse.Namespace) -> Any:
+        if args.action in ("get", "delete") and not args.id:
+            raise ValueError("id option is required for this action")
+        if args.action == "search" and not args.text:
+            raise ValueError("text option is required for this action")
+        if args.action == "delete":
+            return args.id
+        if args.action == "add":
+            if not args.name or not args.due:
+                raise ValueError("name and due options are required for this action")
+            return {
+                "name": args.name,
+                "due_date": parse_due_date(args.due),
+                "priority": TaskPriority(args.priority) if args.priority else None,
+                "category": args.category,
+            }
+        return None
+
+    def _report(self, line: int, action: str, **result: Any) -> None:
+        record: Dict[str, Any] = {"line": line, "action": action, "ok": True, **result}
+        self.output.write(json.dumps(record) + "\n")
+
+    def _fail(self, line: int, error: str, action: Any = None) -> None:
+        self.failed += 1
+        record = {"line": line, "action": action, "ok": False, "error": error}
+        self.output.write(json.dumps(record) + "\n")
+
+
+def run_batch(manager: TaskManager, commands: Iterable[BatchCommand], output: TextIO) -> int:
+    return BatchRunner(manager, output).run(commands)
@@ -0,0 +1,406 @@
+import contextlib
+import datetime
+import mmap
+import os
+import struct
+import threading
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from kumo.query import Query
+from kumo.search import InvertedIndex
+from kumo.storage import (StorageCounters, Summary, _atomic_write, _build_query, _check_group_by, _check_order_by,
+                          _count_groups, _page, _scanned)
+from kumo.task import Task
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+# Binary stores keep one fixed-width record per task id, at offset
+# BINARY_HEADER.size + (id - 1) * BINARY_RECORD.size, and the task names
+# and categories in a separate append-only string heap. Records are
+# (id, due date ordinal, priority or 0, flags, padding, name offset,
+# name length, category offset, category length).
+BINARY_MAGIC = b"KUMOBIN1"
+BINARY_HEADER = struct.Struct("<8sqqq")
+BINARY_RECORD = struct.Struct("<qiBB2xQIQI")
+BINARY_LIVE = 1
+BINARY_HAS_CATEGORY = 2
+BINARY_QUERY_FIELDS = {
+    "id": "t[0]",
+    "name": "_name(t)",
+    "due_date": "t[1]",
+    "priority": "(t[2] or None)",
+    "category": "_category(t)",
+}
+
+
+class BinaryStorage:
+    def __init__(self, file_path: str, compaction_ratio: float = 0.5, compaction_min_bytes: int = 64 * 1024):
+        self.file_path = file_path
+        self.compaction_ratio = compaction_ratio
+        self.compaction_min_bytes = compaction_min_bytes
+        self._lock = threading.RLock()
+        self._records: Optional[IO[bytes]] = None
+        self._heap: Optional[IO[bytes]] = None
+        self._records_map: Optional[mmap.mmap] = None
+        self._heap_map: Union[mmap.mmap, bytes] = b""
+        self._inode: Optional[int] = None
+        self._search_index: Optional[InvertedIndex] = None
+        self._search_signature: Optional[Tuple[Any, ...]] = None
+        self.counters: Optional[StorageCounters] = None
+        self._ensure_file_exists()
+
+    def _heap_path(self, generation: int) -> str:
+        return f"{self.file_path}.heap.{generation}"
+
+    def _ensure_file_exists(self) -> None:
+        if not os.path.exists(self.file_path):
+            open(self._heap_path(0), "ab").close()
+            with _atomic_write(self.file_path) as f:
+                f.write(BINARY_HEADER.pack(BINARY_MAGIC, 1, 0, 0))
+        with self._lock:
+            self._refresh()
+
+    def _open(self) -> None:
+        # A compaction replaces the records file and removes the previous
+        # heap, so a heap that vanished means the records file must be
+        # opened again.
+        while True:
+            records = open(self.file_path, "r+b", buffering=0)
+            magic, _, generation, _ = BINARY_HEADER.unpack(records.read(BINARY_HEADER.size))
+            if magic != BINARY_MAGIC:
+                records.close()
+                raise ValueError(f"{self.file_path} is not a kumo binary store")
+            try:
+                heap = open(self._heap_path(generation), "r+b", buffering=0)
+            except FileNotFoundError:
+                records.close()
+                continue
+            break
+
+        self._close_files()
+        self._records = records
+        self._heap = heap
+        self._inode = os.fstat(records.fileno()).st_ino
+        self._records_map = None
+        self._heap_map = b""
+
+    def _remap(self) -> None:
+        assert self._records is not None and self._heap is not None
+        # Superseded maps are not closed explicitly: iterators may still
+        # hold views on them, and they are released once those finish.
+        records_size = os.fstat(self._records.fileno()).st_size
+        if self._records_map is None or len(self._records_map) != records_size:
+            self._records_map = mmap.mmap(self._records.fileno(), 0, access=mmap.ACCESS_READ)
+        heap_size = os.fstat(self._heap.fileno()).st_size
+        if len(self._heap_map) != heap_size:
+            self._heap_map = mmap.mmap(self._heap.fileno(), 0, access=mmap.ACCESS_READ) if heap_size else b""
+
+    def _refresh(self) -> None:
+        if os.stat(self.file_path).st_ino != self._inode:
+            self._open()
+        self._remap()
+
+    def _close_files(self) -> None:
+        for f in (self._records, self._heap):
+            if f is not None:
+                f.close()
+        self._records = self._heap = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_files()
+            self._records_map = None
+            self._heap_map = b""
+            self._inode = None
+
+    def data_version(self) -> Tuple[int, ...]:
+        # Saves and updates append their strings to the heap, deletes add
+        # to the garbage count and a compaction replaces the records file,
+        # so this changes with every write by any process.
+        with self._lock:
+            self._refresh()
+            _, next_id, generation, garbage = self._header()
+            assert self._inode is not None
+            return self._inode, len(self._heap_map), next_id, generation, garbage
+
+    def __enter__(self) -> "BinaryStorage":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    @contextlib.contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        with self._lock:
+            while True:
+                self._refresh()
+                assert self._records is not None
+                if fcntl is not None:
+                    fcntl.flock(self._records.fileno(), fcntl.LOCK_EX)
+                if os.stat(self.file_path).st_ino == self._inode:
+                    break
+                # Compacted by another process while we were waiting.
+                if fcntl is not None:
+                    fcntl.flock(self._records.fileno(), fcntl.LOCK_UN)
+            try:
+                self._remap()
+                yield
+            finally:
+                if fcntl is not None and self._records is not None:
+                    fcntl.flock(self._records.fileno(), fcntl.LOCK_UN)
+
+    def _header(self) -> Tuple[bytes, int, int, int]:
+        assert self._records_map is not None
+        return BINARY_HEADER.unpack_from(self._records_map, 0)
+
+    def _write_header(self, next_id: int, generation: int, garbage: int) -> None:
+        assert self._records is not None
+        self._records.seek(0)
+        self._records.write(BINARY_HEADER.pack(BINARY_MAGIC, next_id, generation, garbage))
+
+    def _offset(self, id: int) -> int:
+        return BINARY_HEADER.size + (id - 1) * BINARY_RECORD.size
+
+    def _record(self, id: int) -> Optional[Tuple[Any, ...]]:
+        assert self._records_map is not None
+        offset = self._offset(id)
+        if id < 1 or offset + BINARY_RECORD.size > len(self._records_map):
+            return None
+        record = BINARY_RECORD.unpack_from(self._records_map, offset)
+        return record if record[3] & BINARY_LIVE else None
+
+    def _to_task(self, record: Tuple[Any, ...], heap: Union[mmap.mmap, bytes]) -> Task:
+        id, due_date, priority, flags, name_offset, name_length, category_offset, category_length = record
+        category = heap[category_offset:category_offset + category_length].decode() \
+            if flags & BINARY_HAS_CATEGORY else None
+        return Task.from_row((id, heap[name_offset:name_offset + name_length].decode(), due_date, priority or None, category))
+
+    def get_task(self, id: int) -> Optional[Task]:
+        with self._lock:
+            self._refresh()
+            record = self._record(id)
+            if record is None:
+                return None
+            return self._to_task(record, self._heap_map)
+
+    def get_all_tasks(self) -> List[Task]:
+        return list(self.iter_tasks())
+
+    def get_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                  descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                  query: Optional[Query] = None) -> List[Task]:
+        return list(self.iter_tasks(category, priority, order_by, descending, limit, offset, query))
+
+    def iter_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                   descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                   query: Optional[Query] = None) -> Iterator[Task]:
+        _check_order_by(order_by)
+        records, strings = self._scan(_build_query(category, priority, query))
+        name, category_of = strings["_name"], strings["_category"]
+
+        key: Optional[Callable[[Tuple[Any, ...]], Any]] = None
+        if order_by is not None:
+            # Record columns: 0 id, 1 due date, 2 priority (0 when unset),
+            # 4/5 name and 6/7 category heap slices.
+            if order_by == "id":
+                key = lambda record: record[0]
+            elif order_by == "due_date":
+                key = lambda record: (record[1], record[0])
+            elif order_by == "priority":
+                key = lambda record: (record[2], record[0])
+            elif order_by == "name":
+                key = lambda record: (name(record), record[0])
+            else:
+                key = lambda record: (bool(record[3] & BINARY_HAS_CATEGORY), category_of(record) or "", record[0])
+
+        for record in _page(records, key, descending, limit, offset):
+            yield self._to_task(record, strings["_heap"]())
+
+    def _scan(self, where: Optional[Query]) -> Tuple[Iterator[Tuple[Any, ...]], Dict[str, Callable[..., Any]]]:
+        # Returns the live records matching `where`, and the functions that
+        # read their strings from the heap as it is currently mapped.
+        with self._lock:
+            self._refresh()
+            records, heap = self._records_map, self._heap_map
+        assert records is not None
+
+        def name(record: Tuple[Any, ...]) -> str:
+            return heap[record[4]:record[4] + record[5]].decode()
+
+        def category_of(record: Tuple[Any, ...]) -> Optional[str]:
+            if not record[3] & BINARY_HAS_CATEGORY:
+                return None
+            return heap[record[6]:record[6] + record[7]].decode()
+
+        strings: Dict[str, Callable[..., Any]] = {"_name": name, "_category": category_of, "_heap": lambda: heap}
+        predicate = where.to_python(BINARY_QUERY_FIELDS, datetime.date.toordinal, strings) \
+            if where is not None else None
+
+        def matching() -> Iterator[Tuple[Any, ...]]:
+            nonlocal heap
+            end = BINARY_HEADER.size + (len(records) - BINARY_HEADER.size) // BINARY_RECORD.size * BINARY_RECORD.size
+            # Filters are evaluated on the packed records; Task objects are
+            # only built for matching rows.
+            with memoryview(records) as view:
+                for record in _scanned(BINARY_RECORD.iter_unpack(view[BINARY_HEADER.size:end]), self.counters):
+                    if not record[3] & BINARY_LIVE:
+                        continue
+                    if len(heap) < record[4] + record[5] or len(heap) < record[6] + record[7]:
+                        # Updated in place after the heap was mapped.
+                        with self._lock:
+                            self._refresh()
+                            heap = self._heap_map
+                    if predicate is None or predicate(record):
+                        yield record
+
+        return matching(), strings
+
+    def summarize(self, group_by: Iterable[str] = (), category: Optional[str] = None, priority: Optional[int] = None,
+                  query: Optional[Query] = None) -> Summary:
+        # Counted on the packed records, like filters.
+        group_by = _check_group_by(group_by)
+        records, strings = self._scan(_build_query(category, priority, query))
+        return _count_groups(records, group_by, BINARY_QUERY_FIELDS, datetime.date.today().toordinal(),
+                             datetime.date.fromordinal, strings)
+
+    def _write_records(self, tasks: Iterable[Task], update: bool) -> None:
+        with self._write_lock():
+            assert self._records is not None and self._heap is not None
+            _, next_id, generation, garbage = self._header()
+            heap_end = os.fstat(self._heap.fileno()).st_size
+            heap_data = bytearray()
+            pending: Dict[int, Tuple[Any, ...]] = {}
+
+            for task in tasks:
+                if task.id < 1:
+                    raise ValueError(f"Task id must be positive, got {task.id}")
+                old = pending[task.id] if task.id in pending else self._record(task.id)
+                if update and old is None:
+                    continue
+                if old is not None:
+                    garbage += old[5] + old[7]
+
+                name = task.name.encode()
+                category = task.category.encode() if task.category is not None else b""
+                name_offset = heap_end + len(heap_data)
+                heap_data += name
+                category_offset = heap_end + len(heap_data)
+                heap_data += category
+
+                flags = BINARY_LIVE | (BINARY_HAS_CATEGORY if task.category is not None else 0)
+                priority = task.priority.value if task.priority else 0
+                pending[task.id] = (task.id, task.due_date.toordinal(), priority, flags,
+                                    name_offset, len(name), category_offset, len(category))
+                next_id = max(next_id, task.id + 1)
+
+            # Strings are written before the records that point at them.
+            self._heap.seek(heap_end)
+            self._heap.write(heap_data)
+            for id, record in sorted(pending.items()):
+                self._records.seek(self._offset(id))
+                self._records.write(BINARY_RECORD.pack(*record))
+            self._write_header(next_id, generation, garbage)
+            needs_compaction = self._needs_compaction(garbage, heap_end + len(heap_data))
+        if needs_compaction:
+            self.compact()
+
+    def _needs_compaction(self, garbage: int, heap_size: int) -> bool:
+        return garbage > self.compaction_min_bytes and garbage > heap_size * self.compaction_ratio
+
+    def save_task(self, task: Task) -> None:
+        self.save_tasks([task])
+
+    def update_task(self, task: Task) -> None:
+        self.update_tasks([task])
+
+    def delete_task(self, id: int) -> None:
+        self.delete_tasks([id])
+
+    def save_tasks(self, tasks: Iterable[Task]) -> None:
+        self._write_records(tasks, update=False)
+
+    def update_tasks(self, tasks: Iterable[Task]) -> None:
+        self._write_records(tasks, update=True)
+
+    def delete_tasks(self, ids: Iterable[int]) -> None:
+        tombstone = bytes(BINARY_RECORD.size)
+        with self._write_lock():
+            assert self._records is not None and self._heap is not None
+            _, next_id, generation, garbage = self._header()
+            for id in sorted(set(ids)):
+                record = self._record(id)
+                if record is None:
+                    continue
+                garbage += record[5] + record[7]
+                self._records.seek(self._offset(id))
+                self._records.write(tombstone)
+            self._write_header(next_id, generation, garbage)
+            needs_compaction = self._needs_compaction(garbage, os.fstat(self._heap.fileno()).st_size)
+        if needs_compaction:
+            self.compact()
+
+    def allocate_ids(self, count: int = 1) -> int:
+        with self._write_lock():
+            _, next_id, generation, garbage = self._header()
+            self._write_header(next_id + count, generation, garbage)
+            return next_id
+
+    def next_id(self) -> int:
+        with self._lock:
+            self._refresh()
+            return self._header()[1]
+
+    def search(self, text: str, limit: Optional[int] = None) -> List[Task]:
+        with self._lock:
+            self._refresh()
+            assert self._records_map is not None
+            # Renaming a task grows the heap and deleting one bumps the
+            # garbage counter, so either invalidates the token index.
+            signature = (self._inode, len(self._records_map), len(self._heap_map), self._header()[3])
+            if self._search_index is None or self._search_signature != signature:
+                self._search_index = InvertedIndex.build((task.id, task.name) for task in self.iter_tasks())
+                self._search_signature = signature
+            tasks = []
+            for id in self._search_index.search(text):
+                record = self._record(id)
+                if record is not None:
+                    tasks.append(self._to_task(record, self._heap_map))
+                    if limit is not None and len(tasks) == limit:
+                        break
+            return tasks
+
+    def compact(self) -> None:
+        # Rewrites the heap without the strings of deleted and updated
+        # tasks and drops trailing tombstones. The new heap gets a new
+        # generation number, so readers of the old records file keep a
+        # consistent pair of files until they notice the new inode.
+        with self._write_lock():
+            records, heap = self._records_map, self._heap_map
+            assert records is not None
+            _, next_id, generation, _ = self._header()
+            new_generation = generation + 1
+
+            end = BINARY_HEADER.size + (len(records) - BINARY_HEADER.size) // BINARY_RECORD.size * BINARY_RECORD.size
+            heap_offset = 0
+            # The heap is renamed into place before the records file that
+            # refers to it, hence the nesting.
+            with _atomic_write(self.file_path) as new_records:
+                with _atomic_write(self._heap_path(new_generation)) as new_heap:
+                    new_records.write(BINARY_HEADER.pack(BINARY_MAGIC, next_id, new_generation, 0))
+                    for offset in range(BINARY_HEADER.size, end, BINARY_RECORD.size):
+                        record = BINARY_RECORD.unpack_from(records, offset)
+                        if not record[3] & BINARY_LIVE:
+                            continue
+                        name = heap[record[4]:record[4] + record[5]]
+                        category = heap[record[6]:record[6] + record[7]]
+                        new_heap.write(name)
+                        new_heap.write(category)
+                        new_records.seek(offset)
+                        new_records.write(BINARY_RECORD.pack(*record[:4], heap_offset, record[5],
+                                                             heap_offset + len(name), record[7]))
+                        heap_offset += len(name) + len(category)
+
+            os.unlink(self._heap_path(generation))
@@ -0,0 +1,302 @@
+import copy
+import datetime
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from kumo.query import Condition, Query, combine
+from kumo.search import tokenize
+from kumo.storage import (EXISTING_IDS_BATCH_SIZE, JSON_QUERY_FIELDS, Storage, Summary, _build_query, _check_group_by,
+                          _check_page, _existing_ids, _summarize_tasks, _task_sort_key)
+from kumo.task import Task
+
+DEFAULT_MAX_PENDING = 1000
+
+# What a buffered id turns into when the buffer is flushed. "replace" is a
+# delete followed by a save, for an id saved again after being deleted.
+PENDING_SAVE = "save"
+PENDING_UPDATE = "update"
+PENDING_DELETE = "delete"
+PENDING_REPLACE = "replace"
+
+# The net effect of another write to an id that already has a pending one.
+_COALESCE = {
+    (PENDING_SAVE, PENDING_SAVE): PENDING_SAVE,
+    (PENDING_SAVE, PENDING_UPDATE): PENDING_SAVE,
+    (PENDING_SAVE, PENDING_DELETE): None,
+    (PENDING_UPDATE, PENDING_SAVE): PENDING_REPLACE,
+    (PENDING_UPDATE, PENDING_UPDATE): PENDING_UPDATE,
+    (PENDING_UPDATE, PENDING_DELETE): PENDING_DELETE,
+    (PENDING_DELETE, PENDING_SAVE): PENDING_REPLACE,
+    (PENDING_DELETE, PENDING_UPDATE): PENDING_DELETE,
+    (PENDING_DELETE, PENDING_DELETE): PENDING_DELETE,
+    (PENDING_REPLACE, PENDING_SAVE): PENDING_REPLACE,
+    (PENDING_REPLACE, PENDING_UPDATE): PENDING_REPLACE,
+    (PENDING_REPLACE, PENDING_DELETE): PENDING_DELETE,
+}
+
+Pending = Tuple[str, Optional[Task]]
+
+
+class BufferedStorage:
+    # Keeps writes in memory and applies them to the wrapped storage together:
+    # one delete_tasks, save_tasks and update_tasks call, so one transaction
+    # or file rewrite each, per flush. Writes to the same id are combined
+    # into their net effect. The buffer is flushed once it holds
+    # `max_pending` ids, `flush_interval` seconds after its oldest write,
+    # and on flush() and close(). Reads see the buffered writes.
+    def __init__(self, storage: Storage, max_pending: int = DEFAULT_MAX_PENDING,
+                 flush_interval: Optional[float] = None):
+        if max_pending < 1:
+            raise ValueError("max_pending must be positive")
+        self.storage = storage
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.flushes = 0
+        self._pending: Dict[int, Pending] = {}
+        self._oldest: Optional[float] = None
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        self._flush_error: Optional[BaseException] = None
+        self._flusher: Optional[threading.Thread] = None
+        if flush_interval is not None:
+            self._flusher = threading.Thread(target=self._flush_periodically, name="kumo-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_periodically(self) -> None:
+        assert self.flush_interval is not None
+        while not self._closed.wait(self.flush_interval / 2):
+            with self._lock:
+                if self._oldest is None or time.monotonic() - self._oldest < self.flush_interval:
+                    continue
+                try:
+                    self.flush()
+                except Exception as e:
+                    # The writes stay buffered and the error is raised by
+                    # the next flush on the caller's thread.
+                    self._flush_error = e
+
+    def _buffer(self, action: str, id: int, task: Optional[Task]) -> None:
+        # Tasks are copied in and out of the buffer, so that changing a task
+        # object after saving it does not change what will be written.
+        task = copy.copy(task)
+        with self._lock:
+            if id in self._pending:
+                coalesced = _COALESCE[self._pending[id][0], action]
+                if coalesced is None:
+                    del self._pending[id]
+                    return
+                # A delete drops the task; anything else keeps the newest one.
+                self._pending[id] = (coalesced, None if coalesced == PENDING_DELETE else task)
+            else:
+                self._pending[id] = (action, task)
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+            if len(self._pending) >= self.max_pending:
+                self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            error, self._flush_error = self._flush_error, None
+            if self._pending:
+                pending = self._pending
+                deleted = [id for id, (action, _) in pending.items() if action in (PENDING_DELETE, PENDING_REPLACE)]
+                # Deletes go first, as a replaced task is deleted and then
+                # saved. Each call's entries leave the buffer as soon as it
+                # succeeds, so after a failure the next flush only repeats
+                # the calls that did not go through.
+                if deleted:
+                    self.storage.delete_tasks(deleted)
+                    for id in deleted:
+                        action, task = pending.pop(id)
+                        if action == PENDING_REPLACE:
+                            pending[id] = (PENDING_SAVE, task)
+                saved = {id: task for id, (action, task) in pending.items()
+                         if action == PENDING_SAVE and task is not None}
+                if saved:
+                    self.storage.save_tasks(saved.values())
+                    for id in saved:
+                        del pending[id]
+                updated = {id: task for id, (action, task) in pending.items()
+                           if action == PENDING_UPDATE and task is not None}
+                if updated:
+                    self.storage.update_tasks(updated.values())
+                    for id in updated:
+                        del pending[id]
+                self._oldest = None
+                self.flushes += 1
+                error = None
+            if error is not None:
+                raise error
+
+    def _stored_updates(self) -> Set[int]:
+        # A buffered update only applies if the task is already stored.
+        ids = [id for id, (action, _) in self._pending.items() if action == PENDING_UPDATE]
+        return _existing_ids(self.storage, ids) if ids else set()
+
+    def _overlay(self, stored: Iterable[Task], query: Optional[Query], order_by: Optional[str],
+                 descending: bool) -> Iterator[Task]:
+        # Stored tasks with a buffered write are replaced by the buffered
+        # version, if it still matches; buffered tasks the storage did not
+        # return are merged in, in order or at the end.
+        pending = dict(self._pending)
+        updates = self._stored_updates()
+        matches = query.to_python(JSON_QUERY_FIELDS, datetime.date.isoformat) if query is not None else None
+        key = _task_sort_key(order_by)
+        returned: Set[int] = set()
+
+        def visible(task: Task) -> bool:
+            return matches is None or matches(task.to_dict())
+
+        def merge_stored() -> Iterator[Task]:
+            for task in stored:
+                if task.id not in pending:
+                    yield task
+                    continue
+                action, buffered = pending[task.id]
+                if action == PENDING_UPDATE and buffered is not None and visible(buffered):
+                    returned.add(task.id)
+                    # An update can change the sort key, which is handled
+                    # with the other buffered tasks.
+                    if key is None:
+                        yield copy.copy(buffered)
+
+        def buffered_tasks() -> List[Task]:
+            tasks = []
+            for id, (action, task) in pending.items():
+                if action in (PENDING_SAVE, PENDING_REPLACE) or (action == PENDING_UPDATE and id in updates):
+                    if task is not None and visible(task) and (key is not None or id not in returned):
+                        tasks.append(copy.copy(task))
+            return tasks
+
+        if key is None:
+            yield from merge_stored()
+            yield from buffered_tasks()
+        else:
+            merged = merge_stored()
+            yield from heapq.merge(merged, sorted(buffered_tasks(), key=key, reverse=descending), key=key,
+                                   reverse=descending)
+
+    def get_task(self, id: int) -> Optional[Task]:
+        with self._lock:
+            if id not in self._pending:
+                return self.storage.get_task(id)
+            action, task = self._pending[id]
+            if action == PENDING_UPDATE and self.storage.get_task(id) is None:
+                return None
+            return copy.copy(task)
+
+    def get_all_tasks(self) -> List[Task]:
+        with self._lock:
+            if not self._pending:
+                return self.storage.get_all_tasks()
+            return list(self._overlay(self.storage.get_all_tasks(), None, None, False))
+
+    def get_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                  descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                  query: Optional[Query] = None) -> List[Task]:
+        return list(self.iter_tasks(category, priority, order_by, descending, limit, offset, query))
+
+    def iter_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                   descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                   query: Optional[Query] = None) -> Iterator[Task]:
+        _check_page(limit, offset)
+        with self._lock:
+            if not self._pending:
+                return self.storage.iter_tasks(category, priority, order_by, descending, limit, offset, query)
+            # Every buffered id can hide at most one stored task, so that many
+            # more are read to still fill the page.
+            stored_limit = None if limit is None else offset + limit + len(self._pending)
+            stored = self.storage.get_tasks(category, priority, order_by, descending, stored_limit, 0, query)
+            tasks = self._overlay(stored, _build_query(category, priority, query), order_by, descending)
+            return iter(list(itertools.islice(tasks, offset, None if limit is None else offset + limit)))
+
+    def search(self, text: str, limit: Optional[int] = None) -> List[Task]:
+        with self._lock:
+            if not self._pending:
+                return self.storage.search(text, limit)
+            tokens = set(tokenize(text))
+            if not tokens:
+                return []
+            stored_limit = None if limit is None else limit + len(self._pending)
+            tasks = [task for task in self._overlay(self.storage.search(text, stored_limit), None, None, False)
+                     if tokens <= set(tokenize(task.name))]
+            return tasks if limit is None else tasks[:limit]
+
+    def summarize(self, group_by: Iterable[str] = (), category: Optional[str] = None, priority: Optional[int] = None,
+                  query: Optional[Query] = None) -> Summary:
+        group_by = _check_group_by(group_by)
+        with self._lock:
+            summary = self.storage.summarize(group_by, category, priority, query)
+            if not self._pending:
+                return summary
+            # The stored counts are corrected for the buffered ids only: the
+            # stored versions of those tasks are taken out and the buffered
+            # ones that will be written are added.
+            where = _build_query(category, priority, query)
+            ids = list(self._pending)
+            replaced: List[Task] = []
+            for start in range(0, len(ids), EXISTING_IDS_BATCH_SIZE):
+                batch = Condition("id", "in", ids[start:start + EXISTING_IDS_BATCH_SIZE])
+                replaced.extend(self.storage.iter_tasks(query=combine(where, batch)))
+            updates = self._stored_updates()
+            matches = where.to_python(JSON_QUERY_FIELDS, datetime.date.isoformat) if where is not None else None
+            written = [task for id, (action, task) in self._pending.items()
+                       if task is not None and (action != PENDING_UPDATE or id in updates)
+                       and (matches is None or matches(task.to_dict()))]
+
+        for key, count in _summarize_tasks(replaced, group_by).items():
+            summary[key] -= count
+        for key, count in _summarize_tasks(written, group_by).items():
+            summary[key] = summary.get(key, 0) + count
+        return {key: count for key, count in summary.items() if count or not group_by}
+
+    def save_task(self, task: Task) -> None:
+        self._buffer(PENDING_SAVE, task.id, task)
+
+    def update_task(self, task: Task) -> None:
+        self._buffer(PENDING_UPDATE, task.id, task)
+
+    def delete_task(self, id: int) -> None:
+        self._buffer(PENDING_DELETE, id, None)
+
+    def save_tasks(self, tasks: Iterable[Task]) -> None:
+        with self._lock:
+            for task in tasks:
+                self.save_task(task)
+
+    def update_tasks(self, tasks: Iterable[Task]) -> None:
+        with self._lock:
+            for task in tasks:
+                self.update_task(task)
+
+    def delete_tasks(self, ids: Iterable[int]) -> None:
+        with self._lock:
+            for id in ids:
+                self.delete_task(id)
+
+    def allocate_ids(self, count: int = 1) -> int:
+        return self.storage.allocate_ids(count)
+
+    def next_id(self) -> int:
+        # Buffered saves with ids of their own move the sequence once flushed.
+        with self._lock:
+            saved = [id + 1 for id, (action, _) in self._pending.items() if action in (PENDING_SAVE, PENDING_REPLACE)]
+            return max([self.storage.next_id()] + saved)
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        try:
+            self.flush()
+        finally:
+            self.storage.close()
+
+    def __enter__(self) -> "BufferedStorage":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
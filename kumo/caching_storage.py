@@ -0,0 +1,203 @@
+import copy
+import datetime
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, TypeVar
+
+from kumo.query import Query
+from kumo.storage import JSON_QUERY_FIELDS, Storage, Summary, _build_query
+from kumo.task import Task
+
+T = TypeVar("T")
+
+DEFAULT_MAX_TASKS = 10000
+DEFAULT_MAX_QUERIES = 256
+
+
+class _QueryResult:
+    def __init__(self, tasks: List[Task], query: Optional[Query], offset: int):
+        self.tasks = tasks
+        self.ids = {task.id for task in tasks}
+        self.matches = query.to_python(JSON_QUERY_FIELDS, datetime.date.isoformat) if query is not None else None
+        self.offset = offset
+
+    def affected_by(self, id: int, task: Optional[Task]) -> bool:
+        # A write can only change the result if the task was in it or now
+        # matches its filter. With an offset, a change to any matching task
+        # before the page shifts it, and the old version of the task is not
+        # known, so every write counts.
+        if self.offset or id in self.ids:
+            return True
+        return task is not None and (self.matches is None or self.matches(task.to_dict()))
+
+
+class CachingStorage:
+    # Read-through cache in front of a storage: an LRU of `max_tasks` tasks
+    # by id, including ids that do not exist, and an LRU of `max_queries`
+    # get_tasks results keyed by their arguments. Writes made through this
+    # wrapper drop only the entries they can affect. Writes made by anything
+    # else are noticed through the storage's data_version(), when it has one
+    # (SQLite's PRAGMA data_version, the JSON file's mtime, size and inode,
+    # the journal's and the binary heap's growth), and clear the whole cache. Searches, summaries and unlimited iter_tasks
+    # calls are not cached.
+    def __init__(self, storage: Storage, max_tasks: int = DEFAULT_MAX_TASKS, max_queries: int = DEFAULT_MAX_QUERIES):
+        self.storage = storage
+        self.max_tasks = max_tasks
+        self.max_queries = max_queries
+        self.task_hits = 0
+        self.task_misses = 0
+        self.query_hits = 0
+        self.query_misses = 0
+        self.invalidations = 0
+        self._tasks: "OrderedDict[int, Optional[Task]]" = OrderedDict()
+        self._queries: "OrderedDict[Hashable, _QueryResult]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._data_version: Optional[Callable[[], Any]] = getattr(storage, "data_version", None)
+        # SQLite's data_version is per connection, and SqliteStorage has one
+        # connection per thread, so each thread keeps the version it saw.
+        self._seen = threading.local()
+
+    def cache_stats(self) -> Dict[str, int]:
+        return {
+            "task_hits": self.task_hits,
+            "task_misses": self.task_misses,
+            "query_hits": self.query_hits,
+            "query_misses": self.query_misses,
+            "invalidations": self.invalidations,
+            "cached_tasks": len(self._tasks),
+            "cached_queries": len(self._queries),
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tasks.clear()
+            self._queries.clear()
+
+    def _check_version(self) -> None:
+        if self._data_version is None:
+            return
+        version = self._data_version()
+        # A thread that has not looked before cannot tell what changed since
+        # the cache was filled, so it starts from an empty cache.
+        if getattr(self._seen, "version", None) != version:
+            if self._tasks or self._queries:
+                self.invalidations += 1
+            self.clear()
+            self._seen.version = version
+
+    def _store(self, cache: "OrderedDict[Any, T]", key: Any, value: T, size: int) -> None:
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > size:
+            cache.popitem(last=False)
+
+    def _write(self, tasks: Dict[int, Optional[Task]], write: Callable[[], T]) -> T:
+        # `tasks` maps every written id to its new version, or to None when
+        # it is deleted or may not exist.
+        with self._lock:
+            self._check_version()
+            try:
+                return write()
+            finally:
+                for id in tasks:
+                    self._tasks.pop(id, None)
+                stale = [key for key, result in self._queries.items()
+                         if any(result.affected_by(id, task) for id, task in tasks.items())]
+                for key in stale:
+                    del self._queries[key]
+                if self._data_version is not None:
+                    self._seen.version = self._data_version()
+
+    def get_task(self, id: int) -> Optional[Task]:
+        with self._lock:
+            self._check_version()
+            if id in self._tasks:
+                self.task_hits += 1
+                self._tasks.move_to_end(id)
+                return copy.copy(self._tasks[id])
+            self.task_misses += 1
+            task = self.storage.get_task(id)
+            self._store(self._tasks, id, copy.copy(task), self.max_tasks)
+            return task
+
+    def _cached_query(self, key: Hashable, query: Optional[Query], offset: int,
+                      load: Callable[[], List[Task]]) -> List[Task]:
+        with self._lock:
+            self._check_version()
+            result = self._queries.get(key)
+            if result is not None:
+                self.query_hits += 1
+                self._queries.move_to_end(key)
+            else:
+                self.query_misses += 1
+                result = _QueryResult(load(), query, offset)
+                self._store(self._queries, key, result, self.max_queries)
+            return [copy.copy(task) for task in result.tasks]
+
+    def get_all_tasks(self) -> List[Task]:
+        return self._cached_query(("all",), None, 0, self.storage.get_all_tasks)
+
+    def get_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                  descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                  query: Optional[Query] = None) -> List[Task]:
+        where = _build_query(category, priority, query)
+        where_key = None
+        if where is not None:
+            sql, params = where.to_sql()
+            where_key = (sql, tuple(params))
+        key = ("tasks", where_key, order_by, descending, limit, offset)
+        return self._cached_query(key, where, offset, lambda: self.storage.get_tasks(
+            category, priority, order_by, descending, limit, offset, query))
+
+    def iter_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                   descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                   query: Optional[Query] = None) -> Iterator[Task]:
+        # Only results of bounded size are cached; the others keep streaming.
+        if limit is not None:
+            return iter(self.get_tasks(category, priority, order_by, descending, limit, offset, query))
+        return self.storage.iter_tasks(category, priority, order_by, descending, limit, offset, query)
+
+    def search(self, text: str, limit: Optional[int] = None) -> List[Task]:
+        return self.storage.search(text, limit)
+
+    def summarize(self, group_by: Iterable[str] = (), category: Optional[str] = None, priority: Optional[int] = None,
+                  query: Optional[Query] = None) -> Summary:
+        return self.storage.summarize(group_by, category, priority, query)
+
+    def save_task(self, task: Task) -> None:
+        self.save_tasks([task])
+
+    def update_task(self, task: Task) -> None:
+        self.update_tasks([task])
+
+    def delete_task(self, id: int) -> None:
+        self.delete_tasks([id])
+
+    def save_tasks(self, tasks: Iterable[Task]) -> None:
+        tasks = list(tasks)
+        self._write({task.id: task for task in tasks}, lambda: self.storage.save_tasks(tasks))
+
+    def update_tasks(self, tasks: Iterable[Task]) -> None:
+        tasks = list(tasks)
+        self._write({task.id: task for task in tasks}, lambda: self.storage.update_tasks(tasks))
+
+    def delete_tasks(self, ids: Iterable[int]) -> None:
+        ids = list(ids)
+        self._write(dict.fromkeys(ids), lambda: self.storage.delete_tasks(ids))
+
+    def allocate_ids(self, count: int = 1) -> int:
+        # Allocating rewrites the JSON header, which changes its mtime.
+        return self._write({}, lambda: self.storage.allocate_ids(count))
+
+    def next_id(self) -> int:
+        return self.storage.next_id()
+
+    def close(self) -> None:
+        self.clear()
+        self.storage.close()
+
+    def __enter__(self) -> "CachingStorage":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,160 @@
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import traceback
+from typing import Callable, List, Optional, TextIO, Tuple
+
+# Every message is a frame: a one byte kind, a four byte payload length and
+# the payload. A client sends one request frame holding its command line
+# arguments as a JSON list; the daemon answers with any number of output
+# frames followed by one exit frame holding the exit status.
+FRAME_HEADER = struct.Struct("!cI")
+FRAME_REQUEST = b"r"
+FRAME_OUTPUT = b"o"
+FRAME_EXIT = b"x"
+OUTPUT_FRAME_SIZE = 64 * 1024
+# Requests are handled one at a time, so a client that connects and sends
+# nothing would otherwise hold up every other one.
+REQUEST_TIMEOUT = 10.0
+
+Executor = Callable[[List[str], TextIO], int]
+
+
+def _write_frame(f: io.BufferedIOBase, kind: bytes, payload: bytes) -> None:
+    f.write(FRAME_HEADER.pack(kind, len(payload)) + payload)
+
+
+def _read_exact(f: io.BufferedIOBase, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise ConnectionError("kumo daemon closed the connection")
+    return data
+
+
+def _read_frame(f: io.BufferedIOBase) -> Tuple[bytes, bytes]:
+    kind, size = FRAME_HEADER.unpack(_read_exact(f, FRAME_HEADER.size))
+    return kind, _read_exact(f, size)
+
+
+class _OutputWriter(io.StringIO):
+    # Collects the command's output and sends it on in frames of about
+    # OUTPUT_FRAME_SIZE characters.
+    def __init__(self, f: io.BufferedIOBase):
+        super().__init__(newline="")
+        self._f = f
+
+    def write(self, text: str) -> int:
+        written = super().write(text)
+        if self.tell() >= OUTPUT_FRAME_SIZE:
+            self.flush()
+        return written
+
+    def flush(self) -> None:
+        text = self.getvalue()
+        if text:
+            _write_frame(self._f, FRAME_OUTPUT, text.encode())
+            self.seek(0)
+            self.truncate()
+        self._f.flush()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: "DaemonServer"
+    # Applied to the connection's socket by StreamRequestHandler.setup().
+    timeout = REQUEST_TIMEOUT
+
+    def handle(self) -> None:
+        try:
+            kind, payload = _read_frame(self.rfile)
+        except (ConnectionError, TimeoutError):
+            return
+        if kind != FRAME_REQUEST:
+            return
+        output = _OutputWriter(self.wfile)
+        try:
+            status = self.server.execute(json.loads(payload), output)
+        except Exception as e:
+            # The client gets the error and a status instead of a dropped
+            # connection; the daemon's own stderr gets the traceback.
+            traceback.print_exc(file=sys.stderr)
+            print(f"Error: {e}", file=output)
+            status = 1
+        output.flush()
+        _write_frame(self.wfile, FRAME_EXIT, str(status).encode())
+
+
+class DaemonServer(socketserver.UnixStreamServer):
+    # Requests are handled one at a time, so the storage behind the executor
+    # never sees concurrent calls.
+    def __init__(self, socket_path: str, execute: Executor):
+        self.execute = execute
+        self.socket_path = socket_path
+        if os.path.exists(socket_path):
+            probe = _connect(socket_path)
+            if probe is not None:
+                probe.close()
+                raise RuntimeError(f"A kumo daemon is already listening on {socket_path}")
+            os.unlink(socket_path)
+        super().__init__(socket_path, _RequestHandler)
+
+    def server_bind(self) -> None:
+        # Anyone who can connect can change the tasks, so only the owner
+        # may. Connections are refused until server_activate() listens.
+        super().server_bind()
+        os.chmod(self.socket_path, 0o600)
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            os.unlink(self.server_address)  # type: ignore[arg-type]
+        except FileNotFoundError:
+            pass
+
+
+def _connect(socket_path: str) -> Optional[socket.socket]:
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        sock.close()
+        return None
+    return sock
+
+
+def forward(socket_path: str, argv: List[str], stdout: TextIO) -> Optional[int]:
+    # Returns None when no daemon is listening, so the caller can run the
+    # command itself. Once the request has been sent, failures are raised
+    # instead, as the daemon may already have executed it.
+    sock = _connect(socket_path)
+    if sock is None:
+        return None
+    with sock, sock.makefile("rwb") as f:
+        _write_frame(f, FRAME_REQUEST, json.dumps(argv).encode())
+        f.flush()
+        while True:
+            kind, payload = _read_frame(f)
+            if kind == FRAME_OUTPUT:
+                stdout.write(payload.decode())
+            elif kind == FRAME_EXIT:
+                return int(payload)
+
+
+def _terminate(signum: int, frame: object) -> None:
+    raise KeyboardInterrupt
+
+
+def serve(socket_path: str, execute: Executor) -> None:
+    signal.signal(signal.SIGTERM, _terminate)
+    with DaemonServer(socket_path, execute) as server:
+        print(f"kumo daemon listening on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,4 @@
+TASK_FIELDS = ("id", "name", "due_date", "priority", "category")
+# Fields tasks can be counted by; overdue groups them by whether their due
+# date is before today.
+SUMMARY_FIELDS = ("category", "priority", "due_date", "overdue")
@@ -0,0 +1,213 @@
+import bisect
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from kumo.query import Query
+from kumo.storage import Storage, StorageCounters, Summary
+from kumo.task import Task
+
+T = TypeVar("T")
+
+# Upper bounds, in seconds, of the latency histogram buckets; the last
+# bucket counts everything slower.
+LATENCY_BUCKETS = (1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0)
+LATENCY_LABELS = tuple(f"<{bound * 1000:g}ms" for bound in LATENCY_BUCKETS) + (f">={LATENCY_BUCKETS[-1] * 1000:g}ms",)
+IO_COUNTERS_PATH = "/proc/thread-self/io"
+
+
+def _read_io_counters() -> Optional[Tuple[int, int, int]]:
+    # rchar and wchar count the bytes this thread passed to read and write
+    # calls, whatever file they went to. Reading the counters is itself a
+    # read, so its size is returned to be subtracted.
+    try:
+        with open(IO_COUNTERS_PATH, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    fields = dict(line.split(b": ") for line in data.splitlines())
+    return int(fields[b"rchar"]), int(fields[b"wchar"]), len(data)
+
+
+class OperationStats:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.tasks = 0
+        self.rows_scanned = 0
+        self.rows_loaded = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "seconds": self.seconds,
+            "mean_seconds": self.seconds / self.calls if self.calls else 0.0,
+            "max_seconds": self.max_seconds,
+            "histogram": dict(zip(LATENCY_LABELS, self.histogram)),
+            "tasks": self.tasks,
+            "rows_scanned": self.rows_scanned,
+            "rows_loaded": self.rows_loaded,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+        }
+
+
+class _Measurement:
+    def __init__(self, stats: OperationStats, counters: StorageCounters):
+        self.stats = stats
+        self.counters = counters
+        self.tasks = 0
+        self.seconds = 0.0
+        self.rows_scanned = 0
+        self.rows_loaded = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    # Generators are measured one step at a time, so the time a caller
+    # spends between steps is not charged to the storage.
+    def run(self, function: Callable[..., T], *args: Any) -> T:
+        io_before = _read_io_counters()
+        scanned, loaded = self.counters.rows_scanned, self.counters.rows_loaded
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.rows_scanned += self.counters.rows_scanned - scanned
+            self.rows_loaded += self.counters.rows_loaded - loaded
+            io_after = _read_io_counters()
+            if io_before is not None and io_after is not None:
+                self.bytes_read += io_after[0] - io_before[0] - io_before[2]
+                self.bytes_written += io_after[1] - io_before[1]
+
+    def finish(self) -> None:
+        stats = self.stats
+        stats.calls += 1
+        stats.seconds += self.seconds
+        stats.max_seconds = max(stats.max_seconds, self.seconds)
+        stats.histogram[bisect.bisect_left(LATENCY_BUCKETS, self.seconds)] += 1
+        stats.tasks += self.tasks
+        stats.rows_scanned += self.rows_scanned
+        stats.rows_loaded += self.rows_loaded
+        stats.bytes_read += self.bytes_read
+        stats.bytes_written += self.bytes_written
+
+
+class InstrumentedStorage:
+    # Wraps any storage and records, per method: calls, latency, Task objects
+    # returned, rows the backend scanned or parsed, and bytes read and
+    # written. Figures are per thread of the caller, so concurrent use from
+    # several threads attributes I/O only to the calling thread.
+    def __init__(self, storage: Storage):
+        self.storage = storage
+        self.stats: Dict[str, OperationStats] = {}
+        self.counters = StorageCounters()
+        self.counts_rows = hasattr(storage, "counters")
+        if self.counts_rows:
+            storage.counters = self.counters  # type: ignore[attr-defined]
+
+    def reset(self) -> None:
+        self.stats = {}
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.to_dict() for name, stats in self.stats.items()}
+
+    def _measure(self, name: str) -> _Measurement:
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = OperationStats()
+        return _Measurement(stats, self.counters)
+
+    def _call(self, name: str, function: Callable[..., T], *args: Any) -> T:
+        measurement = self._measure(name)
+        try:
+            result = measurement.run(function, *args)
+        finally:
+            measurement.finish()
+        if isinstance(result, Task):
+            measurement.stats.tasks += 1
+        elif isinstance(result, list):
+            measurement.stats.tasks += len(result)
+        return result
+
+    def _iterate(self, name: str, tasks: Iterator[Task]) -> Iterator[Task]:
+        measurement = self._measure(name)
+        try:
+            while True:
+                try:
+                    task = measurement.run(next, tasks)
+                except StopIteration:
+                    return
+                measurement.tasks += 1
+                yield task
+        finally:
+            measurement.finish()
+
+    def get_task(self, id: int) -> Optional[Task]:
+        return self._call("get_task", self.storage.get_task, id)
+
+    def get_all_tasks(self) -> List[Task]:
+        return self._call("get_all_tasks", self.storage.get_all_tasks)
+
+    def get_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                  descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                  query: Optional[Query] = None) -> List[Task]:
+        return self._call("get_tasks", self.storage.get_tasks, category, priority, order_by, descending, limit,
+                          offset, query)
+
+    def iter_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                   descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                   query: Optional[Query] = None) -> Iterator[Task]:
+        tasks = self.storage.iter_tasks(category, priority, order_by, descending, limit, offset, query)
+        return self._iterate("iter_tasks", tasks)
+
+    def save_task(self, task: Task) -> None:
+        self._call("save_task", self.storage.save_task, task)
+
+    def update_task(self, task: Task) -> None:
+        self._call("update_task", self.storage.update_task, task)
+
+    def delete_task(self, id: int) -> None:
+        self._call("delete_task", self.storage.delete_task, id)
+
+    def save_tasks(self, tasks: Iterable[Task]) -> None:
+        self._call("save_tasks", self.storage.save_tasks, tasks)
+
+    def update_tasks(self, tasks: Iterable[Task]) -> None:
+        self._call("update_tasks", self.storage.update_tasks, tasks)
+
+    def delete_tasks(self, ids: Iterable[int]) -> None:
+        self._call("delete_tasks", self.storage.delete_tasks, ids)
+
+    def allocate_ids(self, count: int = 1) -> int:
+        return self._call("allocate_ids", self.storage.allocate_ids, count)
+
+    def next_id(self) -> int:
+        return self._call("next_id", self.storage.next_id)
+
+    def search(self, text: str, limit: Optional[int] = None) -> List[Task]:
+        return self._call("search", self.storage.search, text, limit)
+
+    def summarize(self, group_by: Iterable[str] = (), category: Optional[str] = None, priority: Optional[int] = None,
+                  query: Optional[Query] = None) -> Summary:
+        return self._call("summarize", self.storage.summarize, group_by, category, priority, query)
+
+    def close(self) -> None:
+        self._call("close", self.storage.close)
+
+
+def format_report(report: Dict[str, Dict[str, Any]], counts_rows: bool = True) -> str:
+    columns = ("calls", "total ms", "mean ms", "max ms", "tasks", "scanned", "loaded", "read B", "written B")
+    lines = [f"{'operation':<14}" + "".join(f"{column:>11}" for column in columns)]
+    for name, stats in report.items():
+        rows = (stats["rows_scanned"], stats["rows_loaded"]) if counts_rows else ("-", "-")
+        values = (stats["calls"], f"{stats['seconds'] * 1000:.2f}", f"{stats['mean_seconds'] * 1000:.3f}",
+                  f"{stats['max_seconds'] * 1000:.3f}", stats["tasks"], *rows, stats["bytes_read"],
+                  stats["bytes_written"])
+        lines.append(f"{name:<14}" + "".join(f"{value:>11}" for value in values))
+        buckets = ", ".join(f"{label}: {count}" for label, count in stats["histogram"].items() if count)
+        lines.append(f"{'':<14}  latency {buckets}")
+    return "\n".join(lines)
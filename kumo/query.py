@@ -0,0 +1,346 @@
+import datetime
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from kumo.fields import TASK_FIELDS
+from kumo.task import TaskPriority, parse_due_date, parse_priority
+
+QUERY_FIELDS = TASK_FIELDS
+QUERY_OPERATORS = ("=", "!=", "<", "<=", ">", ">=", "in", "startswith", "contains")
+TEXT_FIELDS = ("name", "category")
+
+# Compiled queries treat a missing priority or category like SQL treats
+# NULL: it only matches "= None", never a comparison with a value.
+
+
+class Query:
+    def __and__(self, other: "Query") -> "Query":
+        return And(self, other)
+
+    def __or__(self, other: "Query") -> "Query":
+        return Or(self, other)
+
+    def __invert__(self) -> "Query":
+        return Not(self)
+
+    def to_sql(self) -> Tuple[str, List[Any]]:
+        params: List[Any] = []
+        return self._sql(params), params
+
+    def to_python(self, fields: Dict[str, str], encode_date: Callable[[datetime.date], Any],
+                  namespace: Optional[Dict[str, Any]] = None) -> Callable[[Any], bool]:
+        # The whole query becomes the body of a single lambda over the row
+        # `t`, so evaluating it costs one call per row. `fields` maps field
+        # names to Python expressions reading them from `t`.
+        params: Dict[str, Any] = dict(namespace or {})
+        source = f"lambda t: {self._python(fields, encode_date, params)}"
+        return eval(source, {"__builtins__": {}, **params})
+
+    def _sql(self, params: List[Any]) -> str:
+        raise NotImplementedError
+
+    def _python(self, fields: Dict[str, str], encode_date: Callable[[datetime.date], Any], params: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+
+def _bind(params: Dict[str, Any], value: Any) -> str:
+    name = f"_p{len(params)}"
+    params[name] = value
+    return name
+
+
+class Condition(Query):
+    def __init__(self, field: str, op: str, value: Any):
+        if field not in QUERY_FIELDS:
+            raise ValueError(f"Unknown field {field!r}, expected one of {QUERY_FIELDS}")
+        if op not in QUERY_OPERATORS:
+            raise ValueError(f"Unknown operator {op!r}, expected one of {QUERY_OPERATORS}")
+        if op in ("startswith", "contains") and field not in TEXT_FIELDS:
+            raise ValueError(f"Operator {op!r} only applies to {TEXT_FIELDS}")
+        if value is None and op not in ("=", "!="):
+            raise ValueError(f"Operator {op!r} cannot be used with None")
+
+        self.field = field
+        self.op = op
+        if op == "in":
+            self.value: Any = tuple(self._normalize(item) for item in value)
+        else:
+            self.value = self._normalize(value)
+
+    def _normalize(self, value: Any) -> Any:
+        if value is None:
+            return None
+        if self.field == "due_date":
+            return parse_due_date(value) if isinstance(value, str) else value
+        if self.field == "priority":
+            if isinstance(value, str):
+                if value.isdigit():
+                    value = int(value)
+                elif value.upper() in TaskPriority.__members__:
+                    value = TaskPriority[value.upper()]
+                else:
+                    raise ValueError(f"Unknown priority {value!r}")
+            priority = parse_priority(value)
+            assert priority is not None
+            return priority.value
+        if self.field == "id":
+            return int(value)
+        return str(value)
+
+    def __repr__(self) -> str:
+        return f"Condition({self.field!r}, {self.op!r}, {self.value!r})"
+
+    def _sql(self, params: List[Any]) -> str:
+        def encode(value: Any) -> Any:
+            return value.toordinal() if isinstance(value, datetime.date) else value
+
+        column = self.field
+        if self.value is None:
+            return f"{column} IS NULL" if self.op == "=" else f"{column} IS NOT NULL"
+        if self.op == "in":
+            if not self.value:
+                return "0"
+            params.extend(encode(item) for item in self.value)
+            return f"{column} IN ({', '.join('?' * len(self.value))})"
+        if self.op == "startswith":
+            # LIKE is case-insensitive in SQLite, unlike str.startswith.
+            params.extend((len(self.value), self.value))
+            return f"substr({column}, 1, ?) = ?"
+        if self.op == "contains":
+            params.append(self.value)
+            return f"instr({column}, ?) > 0"
+        params.append(encode(self.value))
+        return f"{column} {self.op} ?"
+
+    def _python(self, fields: Dict[str, str], encode_date: Callable[[datetime.date], Any], params: Dict[str, Any]) -> str:
+        def encode(value: Any) -> Any:
+            return encode_date(value) if isinstance(value, datetime.date) else value
+
+        expression = fields[self.field]
+        if self.value is None:
+            return f"({expression} is None)" if self.op == "=" else f"({expression} is not None)"
+        if self.op == "in":
+            return f"({expression} in {_bind(params, frozenset(encode(item) for item in self.value))})"
+
+        value = _bind(params, encode(self.value))
+        variable = f"_v{len(params)}"
+        if self.op == "startswith":
+            test = f"{variable}.startswith({value})"
+        elif self.op == "contains":
+            test = f"{value} in {variable}"
+        elif self.op == "=":
+            test = f"{variable} == {value}"
+        else:
+            test = f"{variable} {self.op} {value}"
+        return f"(({variable} := {expression}) is not None and {test})"
+
+
+class And(Query):
+    def __init__(self, *queries: Query):
+        self.queries = queries
+
+    def __repr__(self) -> str:
+        return f"And{self.queries!r}"
+
+    def _sql(self, params: List[Any]) -> str:
+        if not self.queries:
+            return "1"
+        return "(" + " AND ".join(query._sql(params) for query in self.queries) + ")"
+
+    def _python(self, fields: Dict[str, str], encode_date: Callable[[datetime.date], Any], params: Dict[str, Any]) -> str:
+        if not self.queries:
+            return "True"
+        return "(" + " and ".join(query._python(fields, encode_date, params) for query in self.queries) + ")"
+
+
+class Or(Query):
+    def __init__(self, *queries: Query):
+        self.queries = queries
+
+    def __repr__(self) -> str:
+        return f"Or{self.queries!r}"
+
+    def _sql(self, params: List[Any]) -> str:
+        if not self.queries:
+            return "0"
+        return "(" + " OR ".join(query._sql(params) for query in self.queries) + ")"
+
+    def _python(self, fields: Dict[str, str], encode_date: Callable[[datetime.date], Any], params: Dict[str, Any]) -> str:
+        if not self.queries:
+            return "False"
+        return "(" + " or ".join(query._python(fields, encode_date, params) for query in self.queries) + ")"
+
+
+class Not(Query):
+    def __init__(self, query: Query):
+        self.query = query
+
+    def __repr__(self) -> str:
+        return f"Not({self.query!r})"
+
+    def _sql(self, params: List[Any]) -> str:
+        # A condition on a missing value is False in the Python predicates,
+        # so its negation matches; IFNULL makes SQL agree instead of
+        # propagating NULL.
+        return f"(NOT IFNULL({self.query._sql(params)}, 0))"
+
+    def _python(self, fields: Dict[str, str], encode_date: Callable[[datetime.date], Any], params: Dict[str, Any]) -> str:
+        return f"(not {self.query._python(fields, encode_date, params)})"
+
+
+class Field:
+    def __init__(self, name: str):
+        self.name = name
+
+    def __eq__(self, value: Any) -> Condition:  # type: ignore[override]
+        return Condition(self.name, "=", value)
+
+    def __ne__(self, value: Any) -> Condition:  # type: ignore[override]
+        return Condition(self.name, "!=", value)
+
+    def __lt__(self, value: Any) -> Condition:
+        return Condition(self.name, "<", value)
+
+    def __le__(self, value: Any) -> Condition:
+        return Condition(self.name, "<=", value)
+
+    def __gt__(self, value: Any) -> Condition:
+        return Condition(self.name, ">", value)
+
+    def __ge__(self, value: Any) -> Condition:
+        return Condition(self.name, ">=", value)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def in_(self, values: Iterable[Any]) -> Condition:
+        return Condition(self.name, "in", values)
+
+    def startswith(self, prefix: str) -> Condition:
+        return Condition(self.name, "startswith", prefix)
+
+    def contains(self, text: str) -> Condition:
+        return Condition(self.name, "contains", text)
+
+
+def field(name: str) -> Field:
+    if name not in QUERY_FIELDS:
+        raise ValueError(f"Unknown field {name!r}, expected one of {QUERY_FIELDS}")
+    return Field(name)
+
+
+def overdue(today: Optional[datetime.date] = None) -> Condition:
+    return Condition("due_date", "<", today or datetime.date.today())
+
+
+def combine(*queries: Optional[Query]) -> Optional[Query]:
+    present = [query for query in queries if query is not None]
+    if not present:
+        return None
+    if len(present) == 1:
+        return present[0]
+    return And(*present)
+
+
+_TOKEN = re.compile(r'''\s*(?:(?P<op><=|>=|!=|=|<|>|\(|\)|,)|"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<word>[^\s()<>=!,'"]+))''')
+_KEYWORDS = ("and", "or", "not", "in", "startswith", "contains", "overdue", "null")
+
+
+class _Parser:
+    # expression := term ("or" term)*
+    # term       := factor ("and" factor)*
+    # factor     := "not" factor | "(" expression ")" | "overdue" | comparison
+    # comparison := FIELD OP value | FIELD "in" "(" value ("," value)* ")"
+    #             | FIELD ("startswith" | "contains") value
+    def __init__(self, text: str):
+        self.tokens: List[Tuple[str, str]] = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = _TOKEN.match(text, position)
+            if match is None:
+                raise ValueError(f"Unexpected character at position {position} in query {text!r}")
+            position = match.end()
+            if match.group("op") is not None:
+                self.tokens.append(("op", match.group("op")))
+            elif match.group("word") is not None:
+                word = match.group("word")
+                kind = "keyword" if word.lower() in _KEYWORDS else "word"
+                self.tokens.append((kind, word.lower() if kind == "keyword" else word))
+            else:
+                self.tokens.append(("string", match.group("dq") if match.group("dq") is not None else match.group("sq")))
+        self.position = 0
+
+    def peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def next(self) -> Tuple[str, str]:
+        token = self.peek()
+        if token is None:
+            raise ValueError("Unexpected end of query")
+        self.position += 1
+        return token
+
+    def accept(self, kind: str, value: str) -> bool:
+        if self.peek() == (kind, value):
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, kind: str, value: str) -> None:
+        if not self.accept(kind, value):
+            raise ValueError(f"Expected {value!r} in query")
+
+    def parse(self) -> Query:
+        query = self.expression()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected {self.peek()[1]!r} in query")  # type: ignore[index]
+        return query
+
+    def expression(self) -> Query:
+        queries = [self.term()]
+        while self.accept("keyword", "or"):
+            queries.append(self.term())
+        return queries[0] if len(queries) == 1 else Or(*queries)
+
+    def term(self) -> Query:
+        queries = [self.factor()]
+        while self.accept("keyword", "and"):
+            queries.append(self.factor())
+        return queries[0] if len(queries) == 1 else And(*queries)
+
+    def factor(self) -> Query:
+        if self.accept("keyword", "not"):
+            return Not(self.factor())
+        if self.accept("op", "("):
+            query = self.expression()
+            self.expect("op", ")")
+            return query
+        if self.accept("keyword", "overdue"):
+            return overdue()
+
+        kind, name = self.next()
+        if kind != "word" or name not in QUERY_FIELDS:
+            raise ValueError(f"Expected a field name, got {name!r}")
+        kind, op = self.next()
+        if kind == "keyword" and op == "in":
+            self.expect("op", "(")
+            values = [self.value()]
+            while self.accept("op", ","):
+                values.append(self.value())
+            self.expect("op", ")")
+            return Condition(name, "in", values)
+        if (kind == "keyword" and op in ("startswith", "contains")) or (kind == "op" and op in QUERY_OPERATORS):
+            return Condition(name, op, self.value())
+        raise ValueError(f"Expected an operator after {name!r}, got {op!r}")
+
+    def value(self) -> Any:
+        kind, value = self.next()
+        if kind == "keyword" and value == "null":
+            return None
+        if kind not in ("word", "string"):
+            raise ValueError(f"Expected a value, got {value!r}")
+        return value
+
+
+def parse_query(text: str) -> Query:
+    return _Parser(text).parse()
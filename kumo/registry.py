@@ -0,0 +1,68 @@
+import importlib
+import os
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+if TYPE_CHECKING:
+    from kumo.storage import Storage
+
+# Installed packages can provide more backends under this entry point group,
+# e.g. `redis = "kumo_redis:RedisStorage"`; the class is called with a path.
+ENTRY_POINT_GROUP = "kumo.storages"
+
+
+class StorageBackend:
+    # A backend is named by "module:attribute" and only imported when a
+    # storage is opened, so the CLI can start without importing any of them.
+    def __init__(self, target: str, default_path: str):
+        self.target = target
+        self.default_path = default_path
+
+    def load(self) -> Callable[[str], "Storage"]:
+        module, _, attribute = self.target.partition(":")
+        return getattr(importlib.import_module(module), attribute)
+
+    def open(self, path: Optional[str] = None) -> "Storage":
+        return self.load()(path or self.default_path)
+
+
+_backends: Dict[str, StorageBackend] = {
+    "json": StorageBackend("kumo.storage:JsonStorage", "tasks.json"),
+    "sqlite": StorageBackend("kumo.sqlite_storage:SqliteStorage", "tasks.db"),
+    "journal": StorageBackend("kumo.storage:JournalStorage", "tasks.jsonl"),
+    "binary": StorageBackend("kumo.binary_storage:BinaryStorage", "tasks.bin"),
+    "sharded": StorageBackend("kumo.sharded_storage:open_sharded_storage", "tasks.shards"),
+}
+_entry_points_loaded = False
+
+
+def register_backend(name: str, target: str, default_path: Optional[str] = None) -> None:
+    _backends[name] = StorageBackend(target, default_path or f"tasks.{name}")
+
+
+def _load_entry_points() -> None:
+    # importlib.metadata is slow to import and scans every installed
+    # distribution, so this only runs when a name is not already known.
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+    from importlib.metadata import entry_points
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        if entry_point.name not in _backends:
+            register_backend(entry_point.name, entry_point.value)
+
+
+def get_backend(name: str) -> Optional[StorageBackend]:
+    if name not in _backends:
+        _load_entry_points()
+    return _backends.get(name)
+
+
+def backends(include_entry_points: bool = False) -> Dict[str, StorageBackend]:
+    if include_entry_points:
+        _load_entry_points()
+    return dict(_backends)
+
+
+def default_socket_path(storage_type: str) -> str:
+    return os.path.abspath(f".kumo-{storage_type}.sock")
@@ -0,0 +1,71 @@
+import heapq
+import math
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_WORD = re.compile(r"[^\W_]+")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    # Mirrors SQLite's unicode61 tokenizer with remove_diacritics: words are
+    # runs of letters and digits, compared without case or accents.
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _WORD.findall(stripped)
+
+
+class InvertedIndex:
+    def __init__(self) -> None:
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._lengths: Dict[int, int] = {}
+        self._total_length = 0
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[int, str]]) -> "InvertedIndex":
+        index = cls()
+        for id, text in documents:
+            index.add(id, text)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, id: int, text: str) -> None:
+        tokens = tokenize(text)
+        for token in tokens:
+            postings = self._postings.setdefault(token, {})
+            postings[id] = postings.get(id, 0) + 1
+        self._lengths[id] = len(tokens)
+        self._total_length += len(tokens)
+
+    def search(self, text: str, limit: Optional[int] = None) -> List[int]:
+        # Every query word has to occur in a document. Candidates come from
+        # intersecting the posting lists, smallest first, and are ranked by
+        # BM25 like SQLite's FTS5, ties broken by id.
+        tokens = set(tokenize(text))
+        if not tokens or not self._lengths:
+            return []
+        postings = sorted((self._postings.get(token, {}) for token in tokens), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+
+        count = len(self._lengths)
+        average_length = self._total_length / count or 1
+        scores = []
+        for id in candidates:
+            length_norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[id] / average_length)
+            score = 0.0
+            for posting in postings:
+                frequency = posting[id]
+                idf = math.log((count - len(posting) + 0.5) / (len(posting) + 0.5) + 1)
+                score += idf * frequency * (BM25_K1 + 1) / (frequency + length_norm)
+            scores.append((-score, id))
+        ranked = sorted(scores) if limit is None else heapq.nsmallest(limit, scores)
+        return [id for _, id in ranked]
@@ -0,0 +1,250 @@
+import heapq
+import itertools
+import json
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, TypeVar
+
+from kumo.query import Query
+from kumo.registry import get_backend
+from kumo.storage import Storage, Summary, _atomic_write, _check_page, _existing_ids, _task_sort_key
+from kumo.task import Task
+
+T = TypeVar("T")
+
+SHARD_PARTITIONS = ("id", "category")
+SHARD_MANIFEST = "shards.json"
+DEFAULT_SHARD_COUNT = 4
+DEFAULT_SHARD_BACKEND = "sqlite"
+
+
+class ShardedStorage:
+    # Spreads tasks over several storages by `id % len(shards)` or by a hash
+    # of the category. Lookups by id (or by category, when partitioned by
+    # category) go to a single shard; everything else is sent to every shard
+    # on a thread pool and the results merged. Ids are allocated by the first
+    # shard, so they stay unique across all of them.
+    def __init__(self, shards: Sequence[Storage], partition_by: str = "id", max_workers: Optional[int] = None):
+        if not shards:
+            raise ValueError("At least one shard is required")
+        if partition_by not in SHARD_PARTITIONS:
+            raise ValueError(f"Cannot partition tasks by {partition_by!r}, expected one of {SHARD_PARTITIONS}")
+        self.shards = list(shards)
+        self.partition_by = partition_by
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or len(self.shards),
+                                            thread_name_prefix="kumo-shard")
+        # A lower bound of the first shard's next id, so saving tasks that
+        # were given ids by allocate_ids does not have to check it again.
+        self._next_id = 0
+
+    def _category_shard(self, category: Optional[str]) -> int:
+        # crc32 rather than hash(), which changes between processes.
+        if category is None:
+            return 0
+        return zlib.crc32(category.encode()) % len(self.shards)
+
+    def _shard_index(self, task: Task) -> int:
+        if self.partition_by == "id":
+            return task.id % len(self.shards)
+        return self._category_shard(task.category)
+
+    def _id_shard(self, id: int) -> Optional[Storage]:
+        if self.partition_by == "id":
+            return self.shards[id % len(self.shards)]
+        return None
+
+    def _fan_out(self, call: Callable[[Storage], T]) -> List[T]:
+        if len(self.shards) == 1:
+            return [call(self.shards[0])]
+        return list(self._executor.map(call, self.shards))
+
+    def _group(self, tasks: Iterable[Task]) -> Dict[int, List[Task]]:
+        groups: Dict[int, List[Task]] = {}
+        for task in tasks:
+            groups.setdefault(self._shard_index(task), []).append(task)
+        return groups
+
+    def _write_groups(self, groups: Dict[int, T], write: Callable[[Storage, T], None]) -> None:
+        list(self._executor.map(lambda index: write(self.shards[index], groups[index]), groups))
+
+    def _merge(self, results: Iterable[Iterable[Task]], order_by: Optional[str], descending: bool,
+               limit: Optional[int], offset: int) -> Iterator[Task]:
+        # Every shard returns its tasks already sorted, so an ordered result
+        # is a k-way merge instead of a sort of everything.
+        _check_page(limit, offset)
+        key = _task_sort_key(order_by)
+        if key is None:
+            tasks: Iterable[Task] = itertools.chain.from_iterable(results)
+        else:
+            tasks = heapq.merge(*results, key=key, reverse=descending)
+        return itertools.islice(tasks, offset, None if limit is None else offset + limit)
+
+    def get_task(self, id: int) -> Optional[Task]:
+        shard = self._id_shard(id)
+        if shard is not None:
+            return shard.get_task(id)
+        return next((task for task in self._fan_out(lambda shard: shard.get_task(id)) if task is not None), None)
+
+    def get_all_tasks(self) -> List[Task]:
+        return list(itertools.chain.from_iterable(self._fan_out(lambda shard: shard.get_all_tasks())))
+
+    def get_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                  descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                  query: Optional[Query] = None) -> List[Task]:
+        if self.partition_by == "category" and category is not None:
+            shard = self.shards[self._category_shard(category)]
+            return shard.get_tasks(category, priority, order_by, descending, limit, offset, query)
+        # Any shard may hold the whole page, so each returns up to offset + limit.
+        shard_limit = None if limit is None else offset + limit
+        results = self._fan_out(lambda shard: shard.get_tasks(category, priority, order_by, descending, shard_limit,
+                                                              0, query))
+        return list(self._merge(results, order_by, descending, limit, offset))
+
+    def iter_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                   descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                   query: Optional[Query] = None) -> Iterator[Task]:
+        # The shard iterators are merged lazily on the calling thread, so
+        # memory stays flat however many tasks are listed.
+        if self.partition_by == "category" and category is not None:
+            shard = self.shards[self._category_shard(category)]
+            yield from shard.iter_tasks(category, priority, order_by, descending, limit, offset, query)
+            return
+        shard_limit = None if limit is None else offset + limit
+        results = [shard.iter_tasks(category, priority, order_by, descending, shard_limit, 0, query)
+                   for shard in self.shards]
+        yield from self._merge(results, order_by, descending, limit, offset)
+
+    def save_task(self, task: Task) -> None:
+        self.save_tasks([task])
+
+    def update_task(self, task: Task) -> None:
+        self.update_tasks([task])
+
+    def delete_task(self, id: int) -> None:
+        self.delete_tasks([id])
+
+    def save_tasks(self, tasks: Iterable[Task]) -> None:
+        tasks = list(tasks)
+        if not tasks:
+            return
+        self._write_groups(self._group(tasks), lambda shard, group: shard.save_tasks(group))
+        # Tasks saved with ids of their own, e.g. by an import, move the
+        # sequence past them like a single storage would.
+        max_id = max(task.id for task in tasks)
+        if max_id >= self._next_id:
+            next_id = self.shards[0].next_id()
+            if max_id >= next_id:
+                self.shards[0].allocate_ids(max_id + 1 - next_id)
+            self._next_id = max(next_id, max_id + 1)
+
+    def update_tasks(self, tasks: Iterable[Task]) -> None:
+        tasks = list(tasks)
+        if self.partition_by == "id":
+            self._write_groups(self._group(tasks), lambda shard, group: shard.update_tasks(group))
+            return
+
+        # A new category can move a task to another shard, so first find
+        # where every task lives now.
+        ids = [task.id for task in tasks]
+        stored = self._fan_out(lambda shard: _existing_ids(shard, ids))
+        found: Set[int] = set().union(*stored)
+        groups = self._group(task for task in tasks if task.id in found)
+
+        def write(index: int) -> None:
+            shard = self.shards[index]
+            targeted = groups.get(index, [])
+            updated = [task for task in targeted if task.id in stored[index]]
+            moved_in = [task for task in targeted if task.id not in stored[index]]
+            targeted_ids = {task.id for task in targeted}
+            moved_out = [id for id in stored[index] if id not in targeted_ids]
+            if moved_out:
+                shard.delete_tasks(moved_out)
+            if updated:
+                shard.update_tasks(updated)
+            if moved_in:
+                shard.save_tasks(moved_in)
+
+        list(self._executor.map(write, range(len(self.shards))))
+
+    def delete_tasks(self, ids: Iterable[int]) -> None:
+        ids = list(ids)
+        if self.partition_by == "id":
+            groups: Dict[int, List[int]] = {}
+            for id in ids:
+                groups.setdefault(id % len(self.shards), []).append(id)
+            self._write_groups(groups, lambda shard, group: shard.delete_tasks(group))
+        elif ids:
+            self._fan_out(lambda shard: shard.delete_tasks(ids))
+
+    def allocate_ids(self, count: int = 1) -> int:
+        first_id = self.shards[0].allocate_ids(count)
+        self._next_id = max(self._next_id, first_id + count)
+        return first_id
+
+    def next_id(self) -> int:
+        return max(self.shards[0].next_id(), self._next_id)
+
+    def search(self, text: str, limit: Optional[int] = None) -> List[Task]:
+        # Relevance scores are only comparable within a shard, so the
+        # shards' rankings are interleaved: every shard's best match first.
+        results = self._fan_out(lambda shard: shard.search(text, limit))
+        tasks = [task for rank in itertools.zip_longest(*results) for task in rank if task is not None]
+        return tasks if limit is None else tasks[:limit]
+
+    def summarize(self, group_by: Iterable[str] = (), category: Optional[str] = None, priority: Optional[int] = None,
+                  query: Optional[Query] = None) -> Summary:
+        group_by = tuple(group_by)
+        if self.partition_by == "category" and category is not None:
+            return self.shards[self._category_shard(category)].summarize(group_by, category, priority, query)
+        summary: Summary = {}
+        for counts in self._fan_out(lambda shard: shard.summarize(group_by, category, priority, query)):
+            for key, count in counts.items():
+                summary[key] = summary.get(key, 0) + count
+        return summary
+
+    def close(self) -> None:
+        try:
+            self._fan_out(lambda shard: shard.close())
+        finally:
+            self._executor.shutdown()
+
+    def __enter__(self) -> "ShardedStorage":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def open_sharded_storage(path: str, shard_count: int = DEFAULT_SHARD_COUNT, backend: str = DEFAULT_SHARD_BACKEND,
+                         partition_by: str = "id") -> ShardedStorage:
+    # The shards live in the `path` directory. Its manifest records how
+    # they were created, since opening them with a different count or
+    # partitioning would look tasks up in the wrong shard.
+    manifest_path = os.path.join(path, SHARD_MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        if backend == "sharded" or get_backend(backend) is None:
+            raise ValueError(f"Unknown shard backend: {backend}")
+        if partition_by not in SHARD_PARTITIONS:
+            raise ValueError(f"Cannot partition tasks by {partition_by!r}, expected one of {SHARD_PARTITIONS}")
+        manifest = {"backend": backend, "shards": shard_count, "partitionBy": partition_by}
+        os.makedirs(path, exist_ok=True)
+        with _atomic_write(manifest_path) as f:
+            f.write(json.dumps(manifest).encode())
+
+    shard_backend = get_backend(manifest["backend"])
+    if shard_backend is None:
+        raise ValueError(f"Unknown shard backend: {manifest['backend']}")
+    extension = os.path.splitext(shard_backend.default_path)[1]
+    shards: List[Storage] = []
+    try:
+        for i in range(manifest["shards"]):
+            shards.append(shard_backend.open(os.path.join(path, f"shard-{i}{extension}")))
+    except BaseException:
+        for shard in shards:
+            shard.close()
+        raise
+    return ShardedStorage(shards, manifest["partitionBy"])
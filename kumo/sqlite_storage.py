@@ -0,0 +1,314 @@
+import datetime
+import sqlite3
+import threading
+from typing import Any, Iterable, Iterator, List, Optional
+
+from kumo.query import Query
+from kumo.search import tokenize
+from kumo.storage import Summary, _build_query, _check_group_by, _check_order_by, _check_page, _summary
+from kumo.task import Task
+
+SQLITE_JOURNAL_MODES = ("delete", "truncate", "persist", "memory", "wal", "off")
+SQLITE_SYNCHRONOUS_MODES = ("off", "normal", "full", "extra")
+
+# Schema migrations, applied in order. PRAGMA user_version records how many
+# of them a database has already gone through.
+SQLITE_MIGRATIONS = (
+    (
+        '''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            priority INTEGER DEFAULT NULL,
+            category TEXT DEFAULT NULL
+        )
+        ''',
+    ),
+    (
+        # Due dates are stored as proleptic Gregorian ordinals
+        # (datetime.date.toordinal), which are compact and sort correctly.
+        '''
+        CREATE TABLE tasks_v2 (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            due_date INTEGER NOT NULL,
+            priority INTEGER DEFAULT NULL,
+            category TEXT DEFAULT NULL
+        ) STRICT
+        ''',
+        '''
+        INSERT INTO tasks_v2 (id, name, due_date, priority, category)
+        SELECT id, name, CAST(julianday(due_date) - 1721424.5 AS INTEGER), priority, category FROM tasks
+        ''',
+        "DROP TABLE tasks",
+        "ALTER TABLE tasks_v2 RENAME TO tasks",
+    ),
+    (
+        "CREATE INDEX IF NOT EXISTS idx_tasks_category ON tasks (category)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks (priority)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_due_date ON tasks (due_date)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_category_priority ON tasks (category, priority)",
+    ),
+    (
+        "CREATE TABLE id_sequence (next_id INTEGER NOT NULL) STRICT",
+        "INSERT INTO id_sequence (next_id) SELECT IFNULL(MAX(id), 0) + 1 FROM tasks",
+    ),
+    (
+        # Full-text index over task names, kept in sync by triggers.
+        '''
+        CREATE VIRTUAL TABLE tasks_fts USING fts5(
+            name, content='tasks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        )
+        ''',
+        '''
+        CREATE TRIGGER tasks_fts_insert AFTER INSERT ON tasks BEGIN
+            INSERT INTO tasks_fts (rowid, name) VALUES (new.id, new.name);
+        END
+        ''',
+        '''
+        CREATE TRIGGER tasks_fts_delete AFTER DELETE ON tasks BEGIN
+            INSERT INTO tasks_fts (tasks_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        END
+        ''',
+        '''
+        CREATE TRIGGER tasks_fts_update AFTER UPDATE OF name ON tasks BEGIN
+            INSERT INTO tasks_fts (tasks_fts, rowid, name) VALUES ('delete', old.id, old.name);
+            INSERT INTO tasks_fts (rowid, name) VALUES (new.id, new.name);
+        END
+        ''',
+        "INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')",
+    ),
+)
+SQLITE_SCHEMA_VERSION = len(SQLITE_MIGRATIONS)
+SQLITE_TASK_COLUMNS = "id, name, due_date, priority, category"
+
+
+class SqliteStorage:
+    def __init__(self, db_path: str, journal_mode: str = "wal", synchronous: str = "normal",
+                 cache_size: int = -16000, mmap_size: int = 256 * 1024 * 1024, cached_statements: int = 256,
+                 iter_batch_size: int = 500):
+        if journal_mode.lower() not in SQLITE_JOURNAL_MODES:
+            raise ValueError(f"Unknown journal mode: {journal_mode}")
+        if synchronous.lower() not in SQLITE_SYNCHRONOUS_MODES:
+            raise ValueError(f"Unknown synchronous mode: {synchronous}")
+
+        self.db_path = db_path
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.iter_batch_size = iter_batch_size
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+        self._initialize_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections are long-lived and owned by a single thread each.
+        # sqlite3 keeps a per-connection cache of prepared statements, so
+        # the queries below are compiled only once per thread.
+        conn = sqlite3.connect(self.db_path, cached_statements=self.cached_statements, check_same_thread=False)
+        conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _initialize_db(self) -> None:
+        conn = self._conn
+        for version, statements in enumerate(SQLITE_MIGRATIONS, start=1):
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                continue
+            # Re-checked under the write lock, in case another process has
+            # migrated the database in the meantime.
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute("PRAGMA user_version").fetchone()[0] < version:
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(f"PRAGMA user_version = {version}")
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def close(self) -> None:
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def __enter__(self) -> "SqliteStorage":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def get_task(self, id: int) -> Optional[Task]:
+        row = self._conn.execute(f"SELECT {SQLITE_TASK_COLUMNS} FROM tasks WHERE id = ?", (id,)).fetchone()
+
+        if row:
+            return Task.from_row(row)
+        return None
+
+    def get_all_tasks(self) -> List[Task]:
+        rows = self._conn.execute(f"SELECT {SQLITE_TASK_COLUMNS} FROM tasks").fetchall()
+
+        return [Task.from_row(row) for row in rows]
+
+    def _select_tasks(self, category: Optional[str], priority: Optional[int], order_by: Optional[str] = None,
+                      descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                      query: Optional[Query] = None) -> sqlite3.Cursor:
+        _check_order_by(order_by)
+        # SQLite would read a negative limit as no limit at all.
+        _check_page(limit, offset)
+        sql = f"SELECT {SQLITE_TASK_COLUMNS} FROM tasks"
+
+        params: List[Any] = []
+        where = _build_query(category, priority, query)
+        if where is not None:
+            where_sql, params = where.to_sql()
+            sql += " WHERE " + where_sql
+
+        if order_by is not None:
+            direction = "DESC" if descending else "ASC"
+            sql += f" ORDER BY {order_by} {direction}, id {direction}"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend((-1 if limit is None else limit, offset))
+
+        return self._conn.execute(sql, params)
+
+    def get_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                  descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                  query: Optional[Query] = None) -> List[Task]:
+        rows = self._select_tasks(category, priority, order_by, descending, limit, offset, query).fetchall()
+
+        return [Task.from_row(row) for row in rows]
+
+    def iter_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                   descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                   query: Optional[Query] = None) -> Iterator[Task]:
+        # A dedicated cursor is used so that other queries issued while the
+        # caller consumes the generator do not reset it.
+        cursor = self._select_tasks(category, priority, order_by, descending, limit, offset, query)
+        cursor.arraysize = self.iter_batch_size
+        try:
+            while True:
+                rows = cursor.fetchmany()
+                if not rows:
+                    return
+                for row in rows:
+                    yield Task.from_row(row)
+        finally:
+            cursor.close()
+
+    def save_task(self, task: Task) -> None:
+        self.save_tasks([task])
+
+    def update_task(self, task: Task) -> None:
+        self.update_tasks([task])
+
+    def delete_task(self, id: int) -> None:
+        self.delete_tasks([id])
+
+    def save_tasks(self, tasks: Iterable[Task]) -> None:
+        with self._conn as conn:
+            conn.executemany(
+                "INSERT INTO tasks (id, name, due_date, priority, category) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (task.id, task.name, task.due_date.toordinal(), task.priority.value if task.priority else None,
+                     task.category)
+                    for task in tasks
+                )
+            )
+
+    def update_tasks(self, tasks: Iterable[Task]) -> None:
+        with self._conn as conn:
+            conn.executemany(
+                "UPDATE tasks SET name = ?, due_date = ?, priority = ?, category = ? WHERE id = ?",
+                (
+                    (task.name, task.due_date.toordinal(), task.priority.value if task.priority else None,
+                     task.category, task.id)
+                    for task in tasks
+                )
+            )
+
+    def delete_tasks(self, ids: Iterable[int]) -> None:
+        with self._conn as conn:
+            conn.executemany("DELETE FROM tasks WHERE id = ?", ((id,) for id in ids))
+
+    def search(self, text: str, limit: Optional[int] = None) -> List[Task]:
+        # Every word is quoted so that user input is never parsed as FTS5
+        # query syntax.
+        match = " ".join('"' + token + '"' for token in tokenize(text))
+        if not match:
+            return []
+        columns = ", ".join(f"tasks.{column}" for column in SQLITE_TASK_COLUMNS.split(", "))
+        rows = self._conn.execute(
+            f"SELECT {columns} FROM tasks_fts JOIN tasks ON tasks.id = tasks_fts.rowid "
+            "WHERE tasks_fts MATCH ? ORDER BY bm25(tasks_fts), tasks.id LIMIT ?",
+            (match, -1 if limit is None else limit)
+        ).fetchall()
+        return [Task.from_row(row) for row in rows]
+
+    def summarize(self, group_by: Iterable[str] = (), category: Optional[str] = None, priority: Optional[int] = None,
+                  query: Optional[Query] = None) -> Summary:
+        # Counted by SQLite with GROUP BY, which walks the category,
+        # priority and due date indexes instead of returning every row.
+        group_by = _check_group_by(group_by)
+        params: List[Any] = []
+        columns = []
+        for field in group_by:
+            if field == "overdue":
+                columns.append("due_date < ?")
+                params.append(datetime.date.today().toordinal())
+            else:
+                columns.append(field)
+        sql = f"SELECT {', '.join(columns + ['COUNT(*)'])} FROM tasks"
+
+        where = _build_query(category, priority, query)
+        if where is not None:
+            where_sql, where_params = where.to_sql()
+            sql += " WHERE " + where_sql
+            params.extend(where_params)
+        if group_by:
+            sql += " GROUP BY " + ", ".join(str(column) for column in range(1, len(group_by) + 1))
+
+        rows = self._conn.execute(sql, params).fetchall()
+        return _summary(((row[:-1], row[-1]) for row in rows), group_by, datetime.date.fromordinal)
+
+    def data_version(self) -> int:
+        # Changes when another connection, in this process or another one,
+        # commits a change; commits made through this thread's connection
+        # leave it as it is.
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def allocate_ids(self, count: int = 1) -> int:
+        # MAX(id) is a single b-tree seek on the primary key; it keeps the
+        # sequence ahead of tasks saved with explicit ids.
+        with self._conn as conn:
+            next_id = conn.execute(
+                "UPDATE id_sequence SET next_id = MAX(next_id, (SELECT IFNULL(MAX(id), 0) + 1 FROM tasks)) + ? "
+                "RETURNING next_id",
+                (count,)
+            ).fetchone()[0]
+        return next_id - count
+
+    def next_id(self) -> int:
+        return self._conn.execute(
+            "SELECT MAX(next_id, (SELECT IFNULL(MAX(id), 0) + 1 FROM tasks)) FROM id_sequence"
+        ).fetchone()[0]
@@ -1,17 +1,237 @@
+import collections
+import contextlib
 import datetime
+import heapq
+import itertools
+import importlib
+import io
 import json
-import sqlite3
-from typing import Any, Dict, List, Optional, Protocol, Union
-
-from kumo.task import Task, TaskPriority
-
-
-def adapt_datetime_iso(val):
-    return val.isoformat()
+import os
+import stat
+import tempfile
+import threading
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Protocol, Set, Tuple, TypeVar
+
+from kumo.fields import SUMMARY_FIELDS, TASK_FIELDS
+from kumo.query import Condition, Query, combine
+from kumo.search import InvertedIndex
+from kumo.task import Task
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+T = TypeVar("T")
+
+# Task counts by group: each key holds the values of the group_by fields,
+# in order, and is () when nothing is grouped.
+Summary = Dict[Tuple[Any, ...], int]
+
+TASK_ORDER_FIELDS = TASK_FIELDS
+JSON_TASK_KEYS = {"id": "id", "name": "name", "due_date": "dueDate", "priority": "priority", "category": "category"}
+JSON_QUERY_FIELDS = {
+    "id": 't["id"]',
+    "name": 't["name"]',
+    "due_date": 't["dueDate"]',
+    "priority": 't.get("priority")',
+    "category": 't.get("category")',
+}
+TASK_SUMMARY_FIELDS = {
+    "due_date": "t.due_date",
+    "priority": "(t.priority.value if t.priority else None)",
+    "category": "t.category",
+}
+
+# JSON files start with a fixed-width header holding the next free task id,
+# so allocating ids only rewrites these bytes instead of the whole file.
+JSON_HEADER_PREFIX = b'{"nextId": '
+JSON_HEADER_ID_WIDTH = 20
+JSON_HEADER_SIZE = len(JSON_HEADER_PREFIX) + JSON_HEADER_ID_WIDTH + 1
+JSON_STREAM_CHUNK_SIZE = 64 * 1024
+# Everything after the header is written in one of these layouts: the task
+# list indented, the task list without whitespace, or one array per field.
+JSON_LAYOUTS = ("pretty", "compact", "columnar")
+JSON_BODY_PREFIXES = {"pretty": b'\n"tasks": ', "compact": b'\n"tasks":', "columnar": b'\n"columns":'}
+# The body can also be compressed by one of these standard library modules,
+# which is recognized on read by its magic bytes. The header stays plain
+# text, so allocating ids still rewrites it in place.
+JSON_COMPRESSIONS = {"zlib": b"x", "gzip": b"\x1f\x8b", "lzma": b"\xfd7zXZ\x00"}
+JSON_VERSION_WIDTH = 20
+JSON_OPTIMISTIC_ATTEMPTS = 3
+# Ids are looked up with one "id in (...)" query per slice, which keeps
+# SQLite well under its limit on bound parameters.
+EXISTING_IDS_BATCH_SIZE = 500
+
+# SQLite and binary storage live in their own modules, so that opening one
+# backend does not import the dependencies of the others. Their names are
+# still importable from here and are loaded on first access.
+LAZY_MODULES = {"SQLITE_": "kumo.sqlite_storage", "SqliteStorage": "kumo.sqlite_storage",
+                "BINARY_": "kumo.binary_storage", "BinaryStorage": "kumo.binary_storage"}
+
+
+def __getattr__(name: str) -> Any:
+    for prefix, module in LAZY_MODULES.items():
+        if name.startswith(prefix):
+            return getattr(importlib.import_module(module), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@contextlib.contextmanager
+def _atomic_write(path: str) -> Iterator[IO[bytes]]:
+    # The temporary file is created like any new file, so it gets the
+    # permissions the umask allows, and then takes over those of the file
+    # it replaces. mkstemp would leave it readable by the owner only.
+    temp_path = f"{path}.{os.urandom(6).hex()}.tmp"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            with contextlib.suppress(FileNotFoundError):
+                os.chmod(temp_path, stat.S_IMODE(os.stat(path).st_mode))
+            yield f
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+class StorageCounters:
+    # Backends that load and filter rows in Python count them here when an
+    # instrumentation wrapper attaches counters; see kumo.instrumentation.
+    # SQLite filters inside the database and leaves them untouched.
+    def __init__(self) -> None:
+        self.rows_scanned = 0
+        self.rows_loaded = 0
+
+    def scan(self, items: Iterable[T]) -> Iterator[T]:
+        for item in items:
+            self.rows_scanned += 1
+            yield item
+
+
+def _scanned(items: Iterable[T], counters: Optional[StorageCounters]) -> Iterable[T]:
+    return items if counters is None else counters.scan(items)
+
+
+def _check_order_by(order_by: Optional[str]) -> None:
+    if order_by is not None and order_by not in TASK_ORDER_FIELDS:
+        raise ValueError(f"Cannot order tasks by {order_by!r}, expected one of {TASK_ORDER_FIELDS}")
+
+
+def _check_page(limit: Optional[int], offset: int) -> None:
+    if limit is not None and limit < 0:
+        raise ValueError(f"limit must not be negative: {limit}")
+    if offset < 0:
+        raise ValueError(f"offset must not be negative: {offset}")
+
+
+def _build_query(category: Optional[str], priority: Optional[int], query: Optional[Query]) -> Optional[Query]:
+    return combine(
+        Condition("category", "=", category) if category is not None else None,
+        Condition("priority", "=", priority) if priority is not None else None,
+        query,
+    )
+
+
+def _filter_dicts(tasks: Iterable[Dict[str, Any]], query: Optional[Query],
+                  counters: Optional[StorageCounters] = None) -> Iterable[Dict[str, Any]]:
+    tasks = _scanned(tasks, counters)
+    if query is None:
+        return tasks
+    return filter(query.to_python(JSON_QUERY_FIELDS, datetime.date.isoformat), tasks)
+
+
+def _dict_sort_key(order_by: Optional[str]) -> Optional[Callable[[Dict[str, Any]], Any]]:
+    _check_order_by(order_by)
+    if order_by is None:
+        return None
+    key = JSON_TASK_KEYS[order_by]
+    # Missing values sort first, like NULLs in SQLite, and ties are broken
+    # by id so that pages are stable.
+    return lambda task: (task.get(key) is not None, task.get(key), task["id"])
 
 
-def convert_datetime(val):
-    return datetime.datetime.fromisoformat(val.decode())
+def _task_sort_key(order_by: Optional[str]) -> Optional[Callable[[Task], Any]]:
+    # The same order the backends return: missing values first, ties by id.
+    _check_order_by(order_by)
+    if order_by is None:
+        return None
+    if order_by == "priority":
+        def value(task: Task) -> Any:
+            return task.priority.value if task.priority else None
+    else:
+        attribute = order_by
+
+        def value(task: Task) -> Any:
+            return getattr(task, attribute)
+    return lambda task: (value(task) is not None, value(task), task.id)
+
+
+def _page(items: Iterable[T], key: Optional[Callable[[T], Any]], descending: bool, limit: Optional[int],
+          offset: int) -> Iterable[T]:
+    _check_page(limit, offset)
+    if key is None:
+        return itertools.islice(items, offset, None if limit is None else offset + limit)
+    if limit is None:
+        return itertools.islice(sorted(items, key=key, reverse=descending), offset, None)
+    # Only offset + limit items are kept instead of sorting everything.
+    select = heapq.nlargest if descending else heapq.nsmallest
+    return select(offset + limit, items, key=key)[offset:]
+
+
+def _existing_ids(storage: "Storage", ids: Iterable[int]) -> Set[int]:
+    ids = list(ids)
+    existing: Set[int] = set()
+    for start in range(0, len(ids), EXISTING_IDS_BATCH_SIZE):
+        query = Condition("id", "in", ids[start:start + EXISTING_IDS_BATCH_SIZE])
+        existing.update(task.id for task in storage.iter_tasks(query=query))
+    return existing
+
+
+def _check_group_by(group_by: Iterable[str]) -> Tuple[str, ...]:
+    group_by = tuple(group_by)
+    for field in group_by:
+        if field not in SUMMARY_FIELDS:
+            raise ValueError(f"Cannot group tasks by {field!r}, expected one of {SUMMARY_FIELDS}")
+    return group_by
+
+
+def _summary(groups: Iterable[Tuple[Tuple[Any, ...], int]], group_by: Tuple[str, ...],
+             decode_date: Callable[[Any], datetime.date]) -> Summary:
+    # Backends count the group values as they store them; only the keys of
+    # the result are decoded, once per group instead of once per task.
+    decoders = [decode_date if field == "due_date" else bool if field == "overdue" else None for field in group_by]
+    summary: Summary = {}
+    for key, count in groups:
+        key = tuple(value if decode is None or value is None else decode(value)
+                    for decode, value in zip(decoders, key))
+        summary[key] = summary.get(key, 0) + count
+    if not group_by:
+        summary.setdefault((), 0)
+    return summary
+
+
+def _count_groups(rows: Iterable[Any], group_by: Tuple[str, ...], fields: Dict[str, str], today: Any,
+                  decode_date: Callable[[Any], datetime.date], namespace: Optional[Dict[str, Any]] = None) -> Summary:
+    # Like a compiled query, the group key is a single lambda over the row
+    # `t`, built from the expressions in `fields`, and rows are counted by
+    # Counter without building Task objects.
+    expressions = [f"({fields['due_date']} < _today)" if field == "overdue" else fields[field] for field in group_by]
+    key = eval(f"lambda t: ({''.join(expression + ', ' for expression in expressions)})",
+               {"__builtins__": {}, "_today": today, **(namespace or {})})
+    return _summary(collections.Counter(map(key, rows)).items(), group_by, decode_date)
+
+
+def _summarize_dicts(tasks: Iterable[Dict[str, Any]], group_by: Iterable[str], query: Optional[Query],
+                     counters: Optional[StorageCounters] = None) -> Summary:
+    group_by = _check_group_by(group_by)
+    return _count_groups(_filter_dicts(tasks, query, counters), group_by, JSON_QUERY_FIELDS,
+                         datetime.date.today().isoformat(), datetime.date.fromisoformat)
+
+
+def _summarize_tasks(tasks: Iterable[Task], group_by: Iterable[str]) -> Summary:
+    group_by = _check_group_by(group_by)
+    return _count_groups(tasks, group_by, TASK_SUMMARY_FIELDS, datetime.date.today(), lambda value: value)
 
 
 class Storage(Protocol):
@@ -21,7 +241,14 @@ class Storage(Protocol):
     def get_all_tasks(self) -> List[Task]:
         ...
 
-    def get_tasks(self, category: Optional[str] = None, priority: Optional[int] = None) -> List[Task]:
+    def get_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                  descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                  query: Optional[Query] = None) -> List[Task]:
+        ...
+
+    def iter_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                   descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                   query: Optional[Query] = None) -> Iterator[Task]:
         ...
 
     def save_task(self, task: Task) -> None:
@@ -33,186 +260,656 @@ class Storage(Protocol):
     def delete_task(self, id: int) -> None:
         ...
 
+    def save_tasks(self, tasks: Iterable[Task]) -> None:
+        ...
+
+    def update_tasks(self, tasks: Iterable[Task]) -> None:
+        ...
+
+    def delete_tasks(self, ids: Iterable[int]) -> None:
+        ...
+
+    def allocate_ids(self, count: int = 1) -> int:
+        ...
+
+    def next_id(self) -> int:
+        ...
+
+    def search(self, text: str, limit: Optional[int] = None) -> List[Task]:
+        ...
+
+    def summarize(self, group_by: Iterable[str] = (), category: Optional[str] = None, priority: Optional[int] = None,
+                  query: Optional[Query] = None) -> Summary:
+        ...
+
+    def close(self) -> None:
+        ...
+
 
 class JsonStorage:
-    def __init__(self, file_path: str):
+    # Writers never modify the tasks file in place. A new version is written
+    # to a temporary file and renamed over it, so readers and a crash only
+    # ever see a complete file. Writes are optimistic: the file is parsed,
+    # changed and serialized without any lock, and only the version check
+    # and the rename happen under an exclusive flock of `<file>.lock`. A
+    # writer whose base version is outdated starts over, and after a few
+    # conflicts holds the lock for the whole read-modify-write instead.
+    #
+    # Files are read in any layout and compression. Writes use `layout` and
+    # `compression` ("none" to write plain JSON), or keep the file's current
+    # format when they are not given; new files default to pretty JSON.
+    def __init__(self, file_path: str, layout: Optional[str] = None, compression: Optional[str] = None):
+        if layout is not None and layout not in JSON_LAYOUTS:
+            raise ValueError(f"Unknown JSON layout: {layout}, expected one of {JSON_LAYOUTS}")
+        if compression is not None and compression != "none" and compression not in JSON_COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}, expected one of {['none', *JSON_COMPRESSIONS]}")
         self.file_path = file_path
+        self.layout = layout
+        self.compression = compression
+        self._file_format = ("pretty", "none")
+        self.lock_path = file_path + ".lock"
+        self._tasks: List[Dict[str, Any]] = []
+        self._index: Dict[int, Dict[str, Any]] = {}
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._version = 0
+        self._next_id = 1
+        self._search_index: Optional[InvertedIndex] = None
+        self.counters: Optional[StorageCounters] = None
         self._ensure_file_exists()
 
     def _ensure_file_exists(self) -> None:
+        # A file that cannot be parsed is reported rather than replaced, as
+        # it may still hold tasks. Empty files are treated as new ones.
+        with self._lock() as lock:
+            try:
+                if os.path.getsize(self.file_path) > 0:
+                    return
+            except FileNotFoundError:
+                pass
+            fd = os.open(self.file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+            with os.fdopen(fd, "wb") as f:
+                f.write(self._encode([], 1))
+            self._write_version(lock, self._read_version(lock) + 1)
+
+    @contextlib.contextmanager
+    def _lock(self, exclusive: bool = True) -> Iterator[IO[bytes]]:
+        # The lock file also holds the version number, which is incremented
+        # by every write of the tasks file.
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o666)
+        with os.fdopen(fd, "r+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield f
+
+    def _read_version(self, lock: IO[bytes]) -> int:
+        lock.seek(0)
+        data = lock.read(JSON_VERSION_WIDTH).strip()
+        return int(data) if data else 0
+
+    def _write_version(self, lock: IO[bytes], version: int) -> None:
+        lock.seek(0)
+        lock.write(str(version).ljust(JSON_VERSION_WIDTH).encode())
+        lock.flush()
+
+    def _file_signature(self, stat: Optional[os.stat_result] = None) -> Tuple[int, int, int]:
+        if stat is None:
+            stat = os.stat(self.file_path)
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def data_version(self) -> Tuple[int, int, int]:
+        # Changes whenever the file is written, by this or any other process.
+        return self._file_signature()
+
+    def _cache_tasks(self, tasks: List[Dict[str, Any]], next_id: int, signature: Tuple[int, int, int],
+                     version: int) -> None:
+        self._tasks = tasks
+        self._index = {task["id"]: task for task in tasks}
+        self._next_id = next_id
+        self._signature = signature
+        self._version = version
+        self._search_index = None
+
+    def _read_tasks(self, lock: Optional[IO[bytes]] = None) -> List[Dict[str, Any]]:
+        # The parsed file is reused for as long as its mtime, size and inode
+        # are unchanged, so writes made by other processes are still seen.
+        if self._signature is None or self._signature != self._file_signature():
+            # The version is read before the file is opened, so the tasks
+            # are at least as new as the version they are cached with.
+            with contextlib.nullcontext(lock) if lock else self._lock(exclusive=False) as locked:
+                version = self._read_version(locked)
+                f = open(self.file_path, "rb")
+            with f:
+                signature = self._file_signature(os.fstat(f.fileno()))
+                tasks, next_id, self._file_format = self._decode(f.read())
+            next_id = max(next_id, max((task["id"] for task in tasks), default=0) + 1)
+            self._cache_tasks(tasks, next_id, signature, version)
+            if self.counters is not None:
+                self.counters.rows_loaded += len(tasks)
+        return self._tasks
+
+    def _read_header(self, f: IO[bytes]) -> Optional[int]:
+        f.seek(0)
+        return self._parse_header(f.read(JSON_HEADER_SIZE))
+
+    def _parse_header(self, header: bytes) -> Optional[int]:
+        if len(header) != JSON_HEADER_SIZE or not header.startswith(JSON_HEADER_PREFIX) or not header.endswith(b","):
+            return None
         try:
-            with open(self.file_path, "r") as f:
-                json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            with open(self.file_path, "w") as f:
-                json.dump([], f)
-
-    def _read_tasks(self) -> List[Dict[str, Any]]:
-        with open(self.file_path, "r") as f:
-            return json.load(f)
-
-    def _write_tasks(self, tasks: List[Dict[str, Any]]) -> None:
-        with open(self.file_path, "w") as f:
-            json.dump(tasks, f, indent=2)
+            return int(header[len(JSON_HEADER_PREFIX):-1])
+        except ValueError:
+            return None
+
+    def _output_format(self) -> Tuple[str, str]:
+        return self.layout or self._file_format[0], self.compression or self._file_format[1]
+
+    def _encode(self, tasks: List[Dict[str, Any]], next_id: int) -> bytes:
+        layout, compression = self._output_format()
+        if layout == "columnar":
+            columns = {key: [task.get(key) for task in tasks] for key in JSON_TASK_KEYS.values()}
+            data = json.dumps(columns, separators=(",", ":"))
+        elif layout == "compact":
+            data = json.dumps(tasks, separators=(",", ":"))
+        else:
+            data = json.dumps(tasks, indent=2)
+        body = JSON_BODY_PREFIXES[layout] + data.encode() + b"}\n"
+        if compression != "none":
+            body = importlib.import_module(compression).compress(body)
+        return JSON_HEADER_PREFIX + str(next_id).ljust(JSON_HEADER_ID_WIDTH).encode() + b"," + body
+
+    def _decode(self, data: bytes) -> Tuple[List[Dict[str, Any]], int, Tuple[str, str]]:
+        compression = "none"
+        if self._parse_header(data[:JSON_HEADER_SIZE]) is not None:
+            body = data[JSON_HEADER_SIZE:]
+            for name, magic in JSON_COMPRESSIONS.items():
+                if body.startswith(magic):
+                    body = importlib.import_module(name).decompress(body)
+                    data = data[:JSON_HEADER_SIZE] + body
+                    compression = name
+                    break
+            layout = next((layout for layout, prefix in JSON_BODY_PREFIXES.items() if body.startswith(prefix)),
+                          "pretty")
+        else:
+            layout = "pretty"
+
+        parsed = json.loads(data)
+        if isinstance(parsed, list):
+            return parsed, 1, (layout, compression)
+        if "columns" in parsed:
+            # Missing priorities and categories are null in their columns,
+            # but left out of the task dicts, like Task.to_dict does.
+            columns = parsed["columns"]
+            keys = list(columns)
+            tasks = [{key: value for key, value in zip(keys, values) if value is not None}
+                     for values in zip(*columns.values())]
+            return tasks, parsed["nextId"], (layout, compression)
+        return parsed["tasks"], parsed["nextId"], (layout, compression)
+
+    def _write_tasks(self, tasks: List[Dict[str, Any]], version: Optional[int] = None,
+                     lock: Optional[IO[bytes]] = None) -> bool:
+        # Replaces the file with `tasks` unless another write has happened
+        # since `version`, in which case nothing is written and False is
+        # returned.
+        next_id = max(self._next_id, max((task["id"] for task in tasks), default=0) + 1)
+        # Cleared once the file has been renamed into place.
+        temp_path: Optional[str]
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.file_path)),
+                                         prefix=os.path.basename(self.file_path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "r+b") as f:
+                with contextlib.suppress(FileNotFoundError):
+                    os.chmod(temp_path, stat.S_IMODE(os.stat(self.file_path).st_mode))
+                f.write(self._encode(tasks, next_id))
+                f.flush()
+                with contextlib.nullcontext(lock) if lock else self._lock() as locked:
+                    current_version = self._read_version(locked)
+                    if version is not None and version != current_version:
+                        return False
+                    # Ids may have been allocated since the file was read.
+                    with contextlib.suppress(FileNotFoundError), open(self.file_path, "rb") as current:
+                        allocated = self._read_header(current)
+                        if allocated is not None and allocated > next_id:
+                            next_id = allocated
+                            f.seek(len(JSON_HEADER_PREFIX))
+                            f.write(str(next_id).ljust(JSON_HEADER_ID_WIDTH).encode())
+                            f.flush()
+                    os.replace(temp_path, self.file_path)
+                    temp_path = None
+                    self._write_version(locked, current_version + 1)
+                signature = self._file_signature(os.fstat(f.fileno()))
+        finally:
+            if temp_path is not None:
+                os.unlink(temp_path)
+        self._cache_tasks(tasks, next_id, signature, current_version + 1)
+        self._file_format = self._output_format()
+        return True
+
+    def _modify(self, change: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]) -> None:
+        for _ in range(JSON_OPTIMISTIC_ATTEMPTS):
+            tasks = self._read_tasks()
+            if self._write_tasks(change(list(tasks)), self._version):
+                return
+            self._signature = None
+        # Under heavy contention the lock is held from the read to the
+        # rename, so this writer cannot lose again.
+        with self._lock() as lock:
+            self._write_tasks(change(list(self._read_tasks(lock))), lock=lock)
+
+    def allocate_ids(self, count: int = 1) -> int:
+        # Only the fixed-width header is rewritten, in place: readers may
+        # see either id, and writers reread it under the lock.
+        with self._lock() as lock, open(self.file_path, "r+b") as f:
+            next_id = self._read_header(f)
+            if next_id is not None:
+                fresh = self._signature == self._file_signature(os.fstat(f.fileno()))
+                f.seek(len(JSON_HEADER_PREFIX))
+                f.write(str(next_id + count).ljust(JSON_HEADER_ID_WIDTH).encode())
+                f.flush()
+                if fresh:
+                    self._next_id = next_id + count
+                    self._signature = self._file_signature(os.fstat(f.fileno()))
+            else:
+                # Files written before the header existed are upgraded first.
+                self._write_tasks(list(self._read_tasks(lock)), lock=lock)
+
+        if next_id is None:
+            return self.allocate_ids(count)
+        return next_id
+
+    def next_id(self) -> int:
+        # Reads the header without writing it, so the file is left as it is.
+        with self._lock(exclusive=False), open(self.file_path, "rb") as f:
+            next_id = self._read_header(f)
+        if next_id is None:
+            self._read_tasks()
+            return self._next_id
+        return next_id
 
     def get_task(self, id: int) -> Optional[Task]:
-        tasks = self._read_tasks()
-        for task in tasks:
-            if task["id"] == id:
-                return Task.from_dict(task)
-        return None
+        self._read_tasks()
+        task = self._index.get(id)
+        if task is None:
+            return None
+        return Task.from_dict(task)
 
     def get_all_tasks(self) -> List[Task]:
         return [Task.from_dict(task) for task in self._read_tasks()]
 
-    def get_tasks(self, category: Optional[str] = None, priority: Optional[int] = None) -> List[Task]:
-        return [
-            Task.from_dict(task)
-            for task in self._read_tasks()
-            if (category is None or task.get("category") == category) and
-            (priority is None or task.get("priority") == priority)
-        ]
+    def get_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                  descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                  query: Optional[Query] = None) -> List[Task]:
+        key = _dict_sort_key(order_by)
+        tasks = _filter_dicts(self._read_tasks(), _build_query(category, priority, query), self.counters)
+        return [Task.from_dict(task) for task in _page(tasks, key, descending, limit, offset)]
+
+    def iter_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                   descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                   query: Optional[Query] = None) -> Iterator[Task]:
+        # A fresh cache is served from memory; otherwise the file is parsed
+        # incrementally and not cached, so memory stays flat on huge files.
+        key = _dict_sort_key(order_by)
+        if self._signature is not None and self._signature == self._file_signature():
+            tasks: Iterable[Dict[str, Any]] = list(self._tasks)
+        else:
+            tasks = self._stream_tasks()
+        tasks = _filter_dicts(tasks, _build_query(category, priority, query), self.counters)
+        for task in _page(tasks, key, descending, limit, offset):
+            yield Task.from_dict(task)
+
+    def search(self, text: str, limit: Optional[int] = None) -> List[Task]:
+        # The token index is built on first use and dropped whenever the
+        # cached tasks are replaced.
+        self._read_tasks()
+        if self._search_index is None:
+            self._search_index = InvertedIndex.build((id, task["name"]) for id, task in self._index.items())
+        return [Task.from_dict(self._index[id]) for id in self._search_index.search(text, limit)]
+
+    def summarize(self, group_by: Iterable[str] = (), category: Optional[str] = None, priority: Optional[int] = None,
+                  query: Optional[Query] = None) -> Summary:
+        # Counted in one pass over the parsed dicts.
+        return _summarize_dicts(self._read_tasks(), group_by, _build_query(category, priority, query), self.counters)
+
+    def _stream_tasks(self) -> Iterator[Dict[str, Any]]:
+        decoder = json.JSONDecoder()
+        with open(self.file_path, "rb") as raw:
+            # Only a plain task list can be parsed a task at a time;
+            # compressed and columnar files are decoded whole.
+            start = raw.read(JSON_HEADER_SIZE + len(JSON_BODY_PREFIXES["compact"]))
+            if self._parse_header(start[:JSON_HEADER_SIZE]) is not None and \
+                    not start[JSON_HEADER_SIZE:].startswith(JSON_BODY_PREFIXES["compact"]):
+                tasks = self._decode(start + raw.read())[0]
+                if self.counters is not None:
+                    self.counters.rows_loaded += len(tasks)
+                yield from tasks
+                return
+            raw.seek(0)
+            f = io.TextIOWrapper(raw, encoding="utf-8")
+            buffer = f.read(JSON_STREAM_CHUNK_SIZE)
+            eof = not buffer
+
+            def fill(pos: int) -> int:
+                nonlocal buffer, eof
+                chunk = f.read(JSON_STREAM_CHUNK_SIZE)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                return 0
+
+            # Locate the opening bracket of the task list, either at the top
+            # level (legacy files) or after the "tasks" key of the header.
+            pos = 0
+            while True:
+                stripped = buffer.lstrip()
+                if stripped.startswith("["):
+                    pos = len(buffer) - len(stripped) + 1
+                    break
+                key = buffer.find('"tasks"')
+                if key != -1:
+                    bracket = buffer.find("[", key)
+                    if bracket != -1:
+                        pos = bracket + 1
+                        break
+                if eof:
+                    raise json.JSONDecodeError("Task list not found", buffer, 0)
+                fill(0)
+
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                    pos += 1
+                if pos == len(buffer):
+                    if eof:
+                        raise json.JSONDecodeError("Unterminated task list", buffer, pos)
+                    pos = fill(pos)
+                    continue
+                if buffer[pos] == "]":
+                    return
+                try:
+                    task, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    pos = fill(pos)
+                    continue
+                if self.counters is not None:
+                    self.counters.rows_loaded += 1
+                yield task
+                pos = end
 
     def save_task(self, task: Task) -> None:
-        tasks = self._read_tasks()
-        tasks.append(task.to_dict())
-        self._write_tasks(tasks)
+        self.save_tasks([task])
 
     def update_task(self, task: Task) -> None:
-        tasks = self._read_tasks()
-        for i, task_data in enumerate(tasks):
-            if task_data["id"] == task.id:
-                tasks[i] = task.to_dict()
-        self._write_tasks(tasks)
+        self.update_tasks([task])
 
     def delete_task(self, id: int) -> None:
-        tasks = self._read_tasks()
-        tasks = [task for task in tasks if task["id"] != id]
-        self._write_tasks(tasks)
-
-
-class SqliteStorage:
-    def __init__(self, db_path: str):
-        self.db_path = db_path
-
-        sqlite3.register_adapter(datetime.datetime, adapt_datetime_iso)
-        sqlite3.register_converter("datetime", convert_datetime)
-
-        self._initialize_db()
-
-    def _initialize_db(self) -> None:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL,
-                due_date TEXT NOT NULL,
-                priority INTEGER DEFAULT NULL,
-                category TEXT DEFAULT NULL
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        self.delete_tasks([id])
 
-    def get_task(self, id: int) -> Optional[Task]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM tasks WHERE id = ?", (id,))
-        row = cursor.fetchone()
-        conn.close()
-
-        if row:
-            priority = TaskPriority(row[3]) if row[3] is not None else None
-            return Task(
-                id=row[0],
-                name=row[1],
-                due_date=row[2],
-                priority=priority,
-                category=row[4]
-            )
-        return None
+    def save_tasks(self, tasks: Iterable[Task]) -> None:
+        new_tasks = [task.to_dict() for task in tasks]
+        self._modify(lambda stored: stored + new_tasks)
 
-    def get_all_tasks(self) -> List[Task]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM tasks")
-        rows = cursor.fetchall()
-        conn.close()
-
-        return [
-            Task(
-                id=row[0],
-                name=row[1],
-                due_date=row[2],
-                priority=row[3],
-                category=row[4]
-            )
-            for row in rows
-        ]
-
-    def get_tasks(self, category: Optional[str] = None, priority: Optional[int] = None) -> List[Task]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        query = "SELECT * FROM tasks"
-
-        params: List[Union[str, int]] = []
-        where = []
-
-        if category is not None:
-            where.append("category = ?")
-            params.append(category)
-        if priority is not None:
-            where.append("priority = ?")
-            params.append(priority)
-
-        if where:
-            query += " WHERE " + " AND ".join(where)
-
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        conn.close()
-
-        return [
-            Task(
-                id=row[0],
-                name=row[1],
-                due_date=row[2],
-                priority=row[3],
-                category=row[4]
-            )
-            for row in rows
-        ]
+    def update_tasks(self, tasks: Iterable[Task]) -> None:
+        updated = {task.id: task.to_dict() for task in tasks}
+        self._modify(lambda stored: [updated.get(task["id"], task) for task in stored])
 
-    def save_task(self, task: Task) -> None:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def delete_tasks(self, ids: Iterable[int]) -> None:
+        deleted = set(ids)
+        self._modify(lambda stored: [task for task in stored if task["id"] not in deleted])
 
-        priority_value = task.priority.value if task.priority else None
+    def close(self) -> None:
+        pass
 
-        cursor.execute(
-            "INSERT INTO tasks (id, name, due_date, priority, category) VALUES (?, ?, ?, ?, ?)",
-            (task.id, task.name, task.due_date.isoformat(), priority_value, task.category)
-        )
-        conn.commit()
-        conn.close()
 
-    def update_task(self, task: Task) -> None:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+class JournalStorage:
+    def __init__(self, file_path: str, compaction_ratio: float = 2.0, compaction_min_bytes: int = 64 * 1024,
+                 background_compaction: bool = True):
+        self.file_path = file_path
+        self.snapshot_path = file_path + ".snapshot"
+        self.lock_path = file_path + ".lock"
+        self.compaction_ratio = compaction_ratio
+        self.compaction_min_bytes = compaction_min_bytes
+        self.background_compaction = background_compaction
+        self._lock = threading.RLock()
+        self._lock_held = False
+        self._tasks: Dict[int, Dict[str, Any]] = {}
+        self._next_id = 1
+        self._search_index: Optional[InvertedIndex] = None
+        self._snapshot_signature: Optional[Tuple[int, int, int]] = None
+        self._journal_inode: Optional[int] = None
+        self._journal_offset = 0
+        self._compaction_thread: Optional[threading.Thread] = None
+        self.counters: Optional[StorageCounters] = None
+        self._ensure_files_exist()
+
+    def _ensure_files_exist(self) -> None:
+        with self._locked():
+            if not os.path.exists(self.snapshot_path):
+                self._replace_file(self.snapshot_path, b'{"nextId":1,"tasks":[]}')
+            with open(self.file_path, "ab"):
+                pass
+            self._refresh()
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive: bool = True) -> Iterator[None]:
+        # Threads of this process are serialized by the thread lock and
+        # processes by the lock file. Only the outermost call locks the file,
+        # as a second flock from the same process would wait on the first.
+        with self._lock:
+            if self._lock_held:
+                yield
+                return
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o666)
+            with os.fdopen(fd, "r+b") as f:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                self._lock_held = True
+                try:
+                    yield
+                finally:
+                    self._lock_held = False
+
+    def _replace_file(self, path: str, data: bytes) -> None:
+        with _atomic_write(path) as f:
+            f.write(data)
+
+    def _refresh(self) -> None:
+        # Called with the lock file held, so no other process is compacting
+        # or half way through an append.
+        with open(self.file_path, "rb") as journal:
+            journal_stat = os.fstat(journal.fileno())
+            stat = os.stat(self.snapshot_path)
+            snapshot_signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+            if (snapshot_signature != self._snapshot_signature or journal_stat.st_ino != self._journal_inode or
+                    journal_stat.st_size < self._journal_offset):
+                with open(self.snapshot_path, "r") as f:
+                    snapshot = json.load(f)
+                if isinstance(snapshot, list):
+                    snapshot = {"nextId": 1, "tasks": snapshot}
+                self._tasks = {task["id"]: task for task in snapshot["tasks"]}
+                self._search_index = None
+                self._next_id = max(snapshot["nextId"], max(self._tasks, default=0) + 1)
+                self._snapshot_signature = snapshot_signature
+                self._journal_inode = journal_stat.st_ino
+                self._journal_offset = 0
+                if self.counters is not None:
+                    self.counters.rows_loaded += len(self._tasks)
+
+            if journal_stat.st_size > self._journal_offset:
+                journal.seek(self._journal_offset)
+                data = journal.read(journal_stat.st_size - self._journal_offset)
+                end = data.rfind(b"\n") + 1
+                for line in data[:end].splitlines():
+                    if line:
+                        self._apply(json.loads(line))
+                        if self.counters is not None:
+                            self.counters.rows_loaded += 1
+                self._journal_offset += end
+
+    def _apply(self, entry: Dict[str, Any]) -> None:
+        op = entry["op"]
+        if op != "allocate":
+            self._search_index = None
+        if op == "add":
+            self._tasks[entry["task"]["id"]] = entry["task"]
+            self._next_id = max(self._next_id, entry["task"]["id"] + 1)
+        elif op == "allocate":
+            self._next_id += entry["count"]
+        elif op == "update":
+            if entry["task"]["id"] in self._tasks:
+                self._tasks[entry["task"]["id"]] = entry["task"]
+        elif op == "delete":
+            self._tasks.pop(entry["id"], None)
+        elif op == "batch":
+            for batch_entry in entry["entries"]:
+                self._apply(batch_entry)
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        with self._locked():
+            # The journal may have been compacted by another process since
+            # we last read it, so the file is reopened after taking the lock.
+            self._refresh()
+            with open(self.file_path, "r+b") as f:
+                # Anything past the last complete entry was left by a writer
+                # that crashed mid-append, and is cut off so that the new
+                # entry starts on a line of its own.
+                if os.fstat(f.fileno()).st_size > self._journal_offset:
+                    f.truncate(self._journal_offset)
+                f.seek(self._journal_offset)
+                f.write(json.dumps(entry, separators=(",", ":")).encode() + b"\n")
+            self._refresh()
+            if self._needs_compaction():
+                self._start_compaction()
+
+    def _needs_compaction(self) -> bool:
+        assert self._snapshot_signature is not None
+        threshold = max(self.compaction_min_bytes, self._snapshot_signature[1] * self.compaction_ratio)
+        return self._journal_offset > threshold
+
+    def _start_compaction(self) -> None:
+        if not self.background_compaction:
+            self.compact()
+        elif self._compaction_thread is None or not self._compaction_thread.is_alive():
+            self._compaction_thread = threading.Thread(target=self.compact, name="kumo-journal-compaction")
+            self._compaction_thread.start()
+
+    def compact(self) -> None:
+        with self._locked(exclusive=False):
+            self._refresh()
+            snapshot_data = {"nextId": self._next_id, "tasks": list(self._tasks.values())}
+            journal_inode = self._journal_inode
+            journal_offset = self._journal_offset
+
+        snapshot = json.dumps(snapshot_data, separators=(",", ":")).encode()
+
+        with self._locked():
+            self._refresh()
+            if self._journal_inode != journal_inode:
+                return
+            # Entries appended while the snapshot was being serialized are
+            # carried over into the fresh journal.
+            with open(self.file_path, "rb") as f:
+                f.seek(journal_offset)
+                tail = f.read(self._journal_offset - journal_offset)
+            self._replace_file(self.snapshot_path, snapshot)
+            self._replace_file(self.file_path, tail)
+
+            stat = os.stat(self.snapshot_path)
+            self._snapshot_signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+            self._journal_inode = os.stat(self.file_path).st_ino
+            self._journal_offset = len(tail)
+
+    def close(self) -> None:
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+            self._compaction_thread = None
+
+    def data_version(self) -> Tuple[int, ...]:
+        # Every change appends to the journal, and a compaction replaces
+        # both files, so this changes with every write by any process.
+        journal = os.stat(self.file_path)
+        snapshot = os.stat(self.snapshot_path)
+        return (journal.st_ino, journal.st_size, journal.st_mtime_ns, snapshot.st_ino, snapshot.st_mtime_ns)
+
+    def __enter__(self) -> "JournalStorage":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
 
-        priority_value = task.priority.value if task.priority else None
+    def get_task(self, id: int) -> Optional[Task]:
+        with self._locked(exclusive=False):
+            self._refresh()
+            task = self._tasks.get(id)
+        if task is None:
+            return None
+        return Task.from_dict(task)
 
-        cursor.execute(
-            "UPDATE tasks SET name = ?, due_date = ?, priority = ?, category = ? WHERE id = ?",
-            (task.name, task.due_date.isoformat(), priority_value, task.category, task.id)
-        )
-        conn.commit()
-        conn.close()
+    def get_all_tasks(self) -> List[Task]:
+        with self._locked(exclusive=False):
+            self._refresh()
+            tasks = list(self._tasks.values())
+        return [Task.from_dict(task) for task in tasks]
+
+    def get_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                  descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                  query: Optional[Query] = None) -> List[Task]:
+        return list(self.iter_tasks(category, priority, order_by, descending, limit, offset, query))
+
+    def iter_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                   descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                   query: Optional[Query] = None) -> Iterator[Task]:
+        key = _dict_sort_key(order_by)
+        with self._locked(exclusive=False):
+            self._refresh()
+            tasks = list(self._tasks.values())
+        matching = _filter_dicts(tasks, _build_query(category, priority, query), self.counters)
+        for task in _page(matching, key, descending, limit, offset):
+            yield Task.from_dict(task)
+
+    def save_task(self, task: Task) -> None:
+        self._append({"op": "add", "task": task.to_dict()})
+
+    def update_task(self, task: Task) -> None:
+        self._append({"op": "update", "task": task.to_dict()})
 
     def delete_task(self, id: int) -> None:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM tasks WHERE id = ?", (id,))
-        conn.commit()
-        conn.close()
+        self._append({"op": "delete", "id": id})
+
+    # A batch is journaled as a single line, so a crash while appending it
+    # leaves a partial line that replay ignores: all or nothing.
+    def save_tasks(self, tasks: Iterable[Task]) -> None:
+        self._append({"op": "batch", "entries": [{"op": "add", "task": task.to_dict()} for task in tasks]})
+
+    def update_tasks(self, tasks: Iterable[Task]) -> None:
+        self._append({"op": "batch", "entries": [{"op": "update", "task": task.to_dict()} for task in tasks]})
+
+    def delete_tasks(self, ids: Iterable[int]) -> None:
+        self._append({"op": "batch", "entries": [{"op": "delete", "id": id} for id in ids]})
+
+    def search(self, text: str, limit: Optional[int] = None) -> List[Task]:
+        with self._locked(exclusive=False):
+            self._refresh()
+            if self._search_index is None:
+                self._search_index = InvertedIndex.build((id, task["name"]) for id, task in self._tasks.items())
+            tasks = [self._tasks[id] for id in self._search_index.search(text, limit)]
+        return [Task.from_dict(task) for task in tasks]
+
+    def summarize(self, group_by: Iterable[str] = (), category: Optional[str] = None, priority: Optional[int] = None,
+                  query: Optional[Query] = None) -> Summary:
+        with self._locked(exclusive=False):
+            self._refresh()
+            tasks = list(self._tasks.values())
+        return _summarize_dicts(tasks, group_by, _build_query(category, priority, query), self.counters)
+
+    def allocate_ids(self, count: int = 1) -> int:
+        # Other processes cannot append while we hold the lock, so once the
+        # journal is replayed our entry is the next one and the range starts
+        # at the current next id.
+        with self._locked():
+            self._refresh()
+            first = self._next_id
+            self._append({"op": "allocate", "count": count})
+            return first
+
+    def next_id(self) -> int:
+        with self._locked(exclusive=False):
+            self._refresh()
+            return self._next_id
@@ -2,7 +2,7 @@ import datetime
 import json
 
 from enum import Enum
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Sequence, Union
 
 
 class TaskPriority(Enum):
@@ -11,12 +11,32 @@ class TaskPriority(Enum):
     HIGH = 3
 
 
+_PRIORITIES = {priority.value: priority for priority in TaskPriority}
+
+
+def parse_due_date(value: str) -> datetime.date:
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        # fromisoformat rejects dates without zero padding, which strptime
+        # has always accepted.
+        return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def parse_priority(value: Union[TaskPriority, int, None]) -> Optional[TaskPriority]:
+    if value is None or isinstance(value, TaskPriority):
+        return value
+    return _PRIORITIES.get(value) or TaskPriority(value)
+
+
 class Task:
-    def __init__(self, id: int, name: str, due_date: str, priority: Optional[TaskPriority] = None, category: Optional[str] = None):
+    __slots__ = ("id", "name", "_due_date", "priority", "category")
+
+    def __init__(self, id: int, name: str, due_date: Union[str, datetime.date], priority: Union[TaskPriority, int, None] = None, category: Optional[str] = None):
         self.id = id
         self.name = name
-        self.due_date = datetime.datetime.strptime(due_date, "%Y-%m-%d").date()
-        self.priority = priority
+        self._due_date = parse_due_date(due_date) if isinstance(due_date, str) else due_date
+        self.priority = parse_priority(priority)
         self.category = category
 
     @property
@@ -24,14 +44,14 @@ class Task:
         return self._due_date
 
     @due_date.setter
-    def due_date(self, value: str):
-        if  isinstance(value, str):
-            self._due_date = datetime.datetime.strptime(value, "%Y-%m-%d").date()
+    def due_date(self, value: Union[str, datetime.date]):
+        if isinstance(value, str):
+            self._due_date = parse_due_date(value)
         else:
             self._due_date = value
 
     def __str__(self):
-        return f"Task #{self.id}: {self.name}, due date: {self.due_date}, priority: {TaskPriority(self.priority).name if self.priority else None}, category: {self.category}"
+        return f"Task #{self.id}: {self.name}, due date: {self.due_date}, priority: {self.priority.name if self.priority else None}, category: {self.category}"
 
     def to_dict(self) -> dict:
         result = {
@@ -49,16 +69,25 @@ class Task:
 
     @classmethod
     def from_dict(cls,  data: Dict[str, Any]) -> "Task":
-        priority_value = data.get("priority")
-        priority = TaskPriority(priority_value) if priority_value is not None else None
-
-        return cls(
-            id=data["id"],
-            name=data["name"],
-            due_date=data["dueDate"],
-            priority=priority,
-            category=data.get("category")
-        )
+        task = cls.__new__(cls)
+        task.id = data["id"]
+        task.name = data["name"]
+        task._due_date = parse_due_date(data["dueDate"])
+        task.priority = parse_priority(data.get("priority"))
+        task.category = data.get("category")
+        return task
+
+    @classmethod
+    def from_row(cls, row: Sequence[Any]) -> "Task":
+        # Storage rows are (id, name, due date ordinal, priority value,
+        # category) and are trusted, so validation is skipped.
+        task = cls.__new__(cls)
+        task.id = row[0]
+        task.name = row[1]
+        task._due_date = datetime.date.fromordinal(row[2])
+        task.priority = _PRIORITIES[row[3]] if row[3] is not None else None
+        task.category = row[4]
+        return task
 
     def to_json(self) -> str:
         return json.dumps(self.to_dict())
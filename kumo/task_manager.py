@@ -1,35 +1,67 @@
-from typing import List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
-from kumo.storage import Storage
+from kumo.instrumentation import InstrumentedStorage
+from kumo.query import Query
+from kumo.storage import Storage, Summary
 from kumo.task import Task, TaskPriority
 
 
 class TaskManager:
-    def __init__(self, storage: Storage):
-        self.storage = storage
-        self._next_id = self._get_next_id()
+    def __init__(self, storage: Storage, instrument: bool = False):
+        self.storage = InstrumentedStorage(storage) if instrument else storage
 
-    def _get_next_id(self) -> int:
-        tasks = self.storage.get_all_tasks()
-        if not tasks:
-            return 1
-        return max(task.id for task in tasks) + 1
+    @property
+    def stats(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        if isinstance(self.storage, InstrumentedStorage):
+            return self.storage.report()
+        return None
 
     def create_task(self, name: str, due_date: str, priority: Optional[TaskPriority] = None, category: Optional[str] = None) -> Task:
-        task = Task(id=self._next_id, name=name, due_date=due_date,
+        task = Task(id=self.storage.allocate_ids(1), name=name, due_date=due_date,
                     priority=priority, category=category)
         self.storage.save_task(task)
-        self._next_id += 1
         return task
 
+    def create_tasks(self, tasks: Iterable[Dict[str, Any]]) -> List[Task]:
+        fields_list = list(tasks)
+        if not fields_list:
+            return []
+        first_id = self.storage.allocate_ids(len(fields_list))
+        created = [Task(id=first_id + i, **fields) for i, fields in enumerate(fields_list)]
+        self.storage.save_tasks(created)
+        return created
+
     def get_task(self, id: int) -> Optional[Task]:
         return self.storage.get_task(id)
 
     def get_all_tasks(self) -> List[Task]:
         return self.storage.get_all_tasks()
 
-    def get_tasks(self, category: Optional[str] = None, priority: Optional[int] = None) -> List[Task]:
-        return self.storage.get_tasks(category, priority)
+    def get_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                  descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                  query: Optional[Query] = None) -> List[Task]:
+        return self.storage.get_tasks(category, priority, order_by, descending, limit, offset, query)
+
+    def iter_tasks(self, category: Optional[str] = None, priority: Optional[int] = None, order_by: Optional[str] = None,
+                   descending: bool = False, limit: Optional[int] = None, offset: int = 0,
+                   query: Optional[Query] = None) -> Iterator[Task]:
+        return self.storage.iter_tasks(category, priority, order_by, descending, limit, offset, query)
+
+    def search(self, text: str, limit: Optional[int] = None) -> List[Task]:
+        return self.storage.search(text, limit)
+
+    def summarize(self, group_by: Iterable[str] = (), category: Optional[str] = None, priority: Optional[int] = None,
+                  query: Optional[Query] = None) -> Summary:
+        return self.storage.summarize(group_by, category, priority, query)
+
+    def update_task(self, task: Task) -> None:
+        self.storage.update_task(task)
+
+    def update_tasks(self, tasks: Iterable[Task]) -> None:
+        self.storage.update_tasks(tasks)
 
     def delete_task(self, id: int) -> None:
         self.storage.delete_task(id)
+
+    def delete_tasks(self, ids: Iterable[int]) -> None:
+        self.storage.delete_tasks(ids)
@@ -0,0 +1,136 @@
+import csv
+import itertools
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, TextIO, Tuple
+
+from kumo.fields import TASK_FIELDS
+from kumo.storage import Storage, _existing_ids
+from kumo.task import Task, TaskPriority
+
+TRANSFER_FORMATS = ("jsonl", "csv")
+DEFAULT_CHUNK_SIZE = 1000
+
+# Called after every chunk with the number of tasks written and skipped so far.
+TransferProgress = Callable[[int, int], None]
+
+
+def guess_format(path: Optional[str], default: str = "jsonl") -> str:
+    if path and path.lower().endswith(".csv"):
+        return "csv"
+    return default
+
+
+def _parse_csv_priority(value: str) -> Optional[TaskPriority]:
+    if not value:
+        return None
+    if value.isdigit():
+        return TaskPriority(int(value))
+    try:
+        return TaskPriority[value.upper()]
+    except KeyError:
+        raise ValueError(f"Invalid priority: {value!r}")
+
+
+def _task_from_record(record: Dict[str, Any]) -> Task:
+    # Records without an id are given one when they are imported.
+    if "name" not in record or "dueDate" not in record:
+        raise ValueError("name and dueDate are required")
+    return Task(record.get("id") or 0, record["name"], record["dueDate"], record.get("priority"),
+                record.get("category"))
+
+
+def read_tasks(lines: Iterable[str], format: str = "jsonl") -> Iterator[Task]:
+    if format not in TRANSFER_FORMATS:
+        raise ValueError(f"Unknown format: {format}")
+    if format == "jsonl":
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                yield _task_from_record(json.loads(line))
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"line {number}: {e}")
+        return
+
+    reader = csv.DictReader(lines)
+    missing = {"name", "due_date"} - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"CSV header is missing {sorted(missing)}")
+    for row in reader:
+        try:
+            yield Task(int(row["id"]) if row.get("id") else 0, row["name"], row["due_date"],
+                       _parse_csv_priority(row.get("priority") or ""), row.get("category") or None)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"line {reader.line_num}: {e}")
+
+
+def write_tasks(tasks: Iterable[Task], output: TextIO, format: str = "jsonl", chunk_size: int = DEFAULT_CHUNK_SIZE,
+                progress: Optional[TransferProgress] = None) -> int:
+    if format not in TRANSFER_FORMATS:
+        raise ValueError(f"Unknown format: {format}")
+    writer = None
+    if format == "csv":
+        writer = csv.writer(output, lineterminator="\n")
+        writer.writerow(TASK_FIELDS)
+
+    written = 0
+    for task in tasks:
+        if writer is None:
+            output.write(task.to_json() + "\n")
+        else:
+            writer.writerow((task.id, task.name, task.due_date.isoformat(),
+                             task.priority.value if task.priority else "", task.category or ""))
+        written += 1
+        if progress and written % chunk_size == 0:
+            progress(written, 0)
+    if progress and written % chunk_size:
+        progress(written, 0)
+    return written
+
+
+def import_tasks(storage: Storage, tasks: Iterable[Task], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 progress: Optional[TransferProgress] = None, replace: bool = False) -> Tuple[int, int]:
+    # Tasks are saved a chunk at a time, each chunk in one save_tasks call,
+    # so at most one chunk is held in memory and a failure loses at most the
+    # chunk in flight. Tasks whose id is already stored are skipped, which
+    # makes rerunning an interrupted import continue where it stopped, or
+    # with `replace` overwritten by the imported version.
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    imported = skipped = 0
+    tasks = iter(tasks)
+    while True:
+        chunk = list(itertools.islice(tasks, chunk_size))
+        if not chunk:
+            break
+        existing = _existing_ids(storage, [task.id for task in chunk if task.id])
+        new_tasks = [task for task in chunk if task.id not in existing]
+        replaced = [task for task in chunk if task.id in existing] if replace else []
+        unnumbered = [task for task in new_tasks if not task.id]
+        if unnumbered:
+            first_id = storage.allocate_ids(len(unnumbered))
+            for i, task in enumerate(unnumbered):
+                task.id = first_id + i
+        if new_tasks:
+            storage.save_tasks(new_tasks)
+        if replaced:
+            storage.update_tasks(replaced)
+        imported += len(new_tasks) + len(replaced)
+        skipped += len(chunk) - len(new_tasks) - len(replaced)
+        if progress:
+            progress(imported, skipped)
+    return imported, skipped
+
+
+def migrate(source: Storage, target: Storage, chunk_size: int = DEFAULT_CHUNK_SIZE,
+            progress: Optional[TransferProgress] = None, replace: bool = False) -> Tuple[int, int]:
+    # The source is only read. Tasks of the target whose ids the source
+    # does not have are left in place.
+    result = import_tasks(target, source.iter_tasks(), chunk_size, progress, replace)
+    # Ids keep their values, and the target's sequence is moved past the
+    # source's so ids of tasks deleted from the source are not handed out again.
+    source_next_id = source.next_id()
+    target_next_id = target.next_id()
+    if source_next_id > target_next_id:
+        target.allocate_ids(source_next_id - target_next_id)
+    return result
@@ -1,23 +1,60 @@
 import argparse
+import os
 import sys
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Iterator, List, Optional, TextIO, Tuple
 
-from kumo.storage import JsonStorage, SqliteStorage, Storage
-from kumo.task import TaskPriority
-from kumo.task_manager import TaskManager
+from kumo.cli_types import non_negative_int, positive_int
+from kumo.fields import SUMMARY_FIELDS, TASK_FIELDS
+from kumo.registry import backends, default_socket_path, get_backend
+
+# Everything else is imported by the code that needs it, so that --help, an
+# unknown action or a command forwarded to a daemon never import a storage
+# backend. tests/test_startup.py keeps an eye on the import budget.
+if TYPE_CHECKING:
+    import cProfile
+
+    from kumo.batch import BatchCommand
+    from kumo.query import Query
+    from kumo.storage import Storage
+    from kumo.task_manager import TaskManager
+    from kumo.transfer import TransferProgress
 
 DEFAULT_STORAGE_TYPE = "json"
-STORAGE_TYPES = {
-    "json": lambda: JsonStorage("tasks.json"),
-    "sqlite": lambda: SqliteStorage("tasks.db")
-}
+PRIORITY_HELP = "task priority [1 - LOW, 2 - MEDIUM, 3 - HIGH]"
 ERROR_ID_REQUIRED = "id option is required for this action"
+ERROR_TEXT_REQUIRED = "text option is required for this action"
+ERROR_TO_REQUIRED = f"to option is required for this action, available: {list(backends())}"
+PROFILE_LINES = 30
+# What the stats action counts by when --group-by is not given.
+DEFAULT_STATS_GROUPS = (("category",), ("priority",), ("overdue",))
+
+
+def resolve_storage_type(storage_type: Optional[str] = None) -> str:
+    if not storage_type or get_backend(storage_type) is None:
+        return DEFAULT_STORAGE_TYPE
+    return storage_type
+
+
+def get_storage(storage_type: Optional[str] = None) -> "Storage":
+    backend = get_backend(resolve_storage_type(storage_type))
+    assert backend is not None
+    return backend.open()
+
 
+def query_argument(text: str) -> "Query":
+    from kumo.query import parse_query
+    try:
+        return parse_query(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
 
-def get_storage(storage_type: Optional[str] = None) -> Storage:
-    if not storage_type or storage_type not in STORAGE_TYPES:
-        storage_type = DEFAULT_STORAGE_TYPE
-    return STORAGE_TYPES[storage_type]()
+
+def group_by_argument(text: str) -> Tuple[str, ...]:
+    fields = tuple(field.strip() for field in text.split(","))
+    for field in fields:
+        if field not in SUMMARY_FIELDS:
+            raise argparse.ArgumentTypeError(f"cannot group by {field!r}, expected one of {SUMMARY_FIELDS}")
+    return fields
 
 
 def check_required_id(args: argparse.Namespace) -> None:
@@ -26,60 +63,315 @@ def check_required_id(args: argparse.Namespace) -> None:
         sys.exit(1)
 
 
-def handle_get_task(manager: TaskManager, args: argparse.Namespace) -> None:
+def handle_get_task(manager: "TaskManager", args: argparse.Namespace) -> None:
     check_required_id(args)
     print(manager.get_task(args.id))
 
 
-def handle_list_tasks(manager: TaskManager, args: argparse.Namespace) -> None:
-    for task in manager.get_tasks(args.category, args.priority):
+def handle_list_tasks(manager: "TaskManager", args: argparse.Namespace) -> None:
+    tasks = manager.iter_tasks(args.category, args.priority, args.order_by, args.desc, args.limit, args.offset,
+                               args.where)
+    for task in tasks:
         print(task)
 
 
-def handle_add_task(manager: TaskManager, args: argparse.Namespace) -> None:
+def handle_search_tasks(manager: "TaskManager", args: argparse.Namespace) -> None:
+    if not args.text:
+        print(ERROR_TEXT_REQUIRED)
+        sys.exit(1)
+    for task in manager.search(args.text, args.limit):
+        print(task)
+
+
+def format_group_value(field: str, value: Any) -> str:
+    if value is None:
+        return "None"
+    if field == "priority":
+        from kumo.task import TaskPriority
+        return TaskPriority(value).name
+    if field == "overdue":
+        return "yes" if value else "no"
+    return str(value)
+
+
+def handle_stats(manager: "TaskManager", args: argparse.Namespace) -> None:
+    # Every count is computed by the storage, e.g. with GROUP BY in SQLite,
+    # without loading the tasks.
+    total = manager.summarize((), args.category, args.priority, args.where)[()]
+    print(f"tasks: {total}")
+    for group_by in [args.group_by] if args.group_by else DEFAULT_STATS_GROUPS:
+        summary = manager.summarize(group_by, args.category, args.priority, args.where)
+        print(f"by {', '.join(group_by)}:")
+        # Missing values first, like listings.
+        for key, count in sorted(summary.items(), key=lambda item: [(value is not None, value) for value in item[0]]):
+            print(f"  {' / '.join(format_group_value(field, value) for field, value in zip(group_by, key))}: {count}")
+
+
+def handle_add_task(manager: "TaskManager", args: argparse.Namespace) -> None:
+    from kumo.task import TaskPriority
     priority = TaskPriority(args.priority) if args.priority else None
     manager.create_task(args.name, args.due, priority, args.category)
 
 
-def handle_delete_task(manager: TaskManager, args: argparse.Namespace) -> None:
+def handle_delete_task(manager: "TaskManager", args: argparse.Namespace) -> None:
     check_required_id(args)
     manager.delete_task(args.id)
     for task in manager.get_tasks():
         print(task)
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("action", help="action to perform", type=str)
+class BatchArgumentParser(argparse.ArgumentParser):
+    # Batch output is one JSON line per command, so usage errors are
+    # reported for the line and help text is not printed.
+    def error(self, message: str):
+        raise ValueError(message)
+
+    def print_help(self, file: Any = None) -> None:
+        pass
+
+
+def read_batch_commands(lines: TextIO) -> Iterator["BatchCommand"]:
+    import shlex
+    parser = build_parser(BatchArgumentParser)
+    for number, line in enumerate(lines, 1):
+        try:
+            argv = shlex.split(line, comments=True)
+            if argv:
+                yield number, parser.parse_args(argv)
+        except ValueError as e:
+            yield number, str(e)
+        except SystemExit:
+            # Raised after --help, which would otherwise end the whole batch.
+            yield number, "--help is not available in a batch"
+
+
+def handle_batch(manager: "TaskManager", args: argparse.Namespace) -> None:
+    import contextlib
+
+    from kumo.batch import run_batch
+    with contextlib.ExitStack() as stack:
+        lines = sys.stdin if args.file in (None, "-") else stack.enter_context(open(args.file))
+        failed = run_batch(manager, read_batch_commands(lines), sys.stdout)
+    if failed:
+        sys.exit(1)
+
+
+def print_progress(action: str) -> "TransferProgress":
+    def progress(done: int, skipped: int) -> None:
+        print(f"{action}: {done} tasks" + (f", {skipped} skipped" if skipped else ""), file=sys.stderr)
+    return progress
+
+
+def handle_import(manager: "TaskManager", args: argparse.Namespace) -> None:
+    import contextlib
+
+    from kumo.transfer import guess_format, import_tasks, read_tasks
+    with contextlib.ExitStack() as stack:
+        lines = sys.stdin if args.file in (None, "-") else stack.enter_context(open(args.file, newline=""))
+        try:
+            import_tasks(manager.storage, read_tasks(lines, args.format or guess_format(args.file)),
+                         args.chunk_size, print_progress("imported"), args.replace)
+        except ValueError as e:
+            print(f"Import failed: {e}")
+            sys.exit(1)
+
+
+def handle_export(manager: "TaskManager", args: argparse.Namespace) -> None:
+    import contextlib
+
+    from kumo.transfer import guess_format, write_tasks
+    tasks = manager.iter_tasks(args.category, args.priority, args.order_by, args.desc, args.limit, args.offset,
+                               args.where)
+    with contextlib.ExitStack() as stack:
+        output = sys.stdout if args.file in (None, "-") else stack.enter_context(open(args.file, "w", newline=""))
+        write_tasks(tasks, output, args.format or guess_format(args.file), args.chunk_size,
+                    print_progress("exported"))
+
+
+def handle_migrate(manager: "TaskManager", args: argparse.Namespace) -> None:
+    from kumo.transfer import migrate
+    if not args.to or get_backend(args.to) is None:
+        print(ERROR_TO_REQUIRED)
+        sys.exit(1)
+    if args.to == resolve_storage_type(args.storage):
+        print("Source and target storage are the same")
+        sys.exit(1)
+    target = get_storage(args.to)
+    try:
+        migrate(manager.storage, target, args.chunk_size, print_progress("migrated"), args.replace)
+    finally:
+        target.close()
+
+
+ACTIONS = {
+    "get": handle_get_task,
+    "list": handle_list_tasks,
+    "search": handle_search_tasks,
+    "stats": handle_stats,
+    "add": handle_add_task,
+    "delete": handle_delete_task,
+    "batch": handle_batch,
+    "import": handle_import,
+    "export": handle_export,
+    "migrate": handle_migrate
+}
+# These read or write files of the calling process, so they are never
+# forwarded to a daemon.
+LOCAL_ACTIONS = ("batch", "import", "export", "migrate")
+
+
+def build_parser(parser_class: type = argparse.ArgumentParser) -> argparse.ArgumentParser:
+    parser = parser_class()
+    parser.add_argument("action", help="action to perform, or serve to start a daemon for the storage", type=str)
     parser.add_argument("--id", help="task id", type=int)
     parser.add_argument("--name", help="task name", type=str)
     parser.add_argument("--due", help="task due date", type=str)
     parser.add_argument("--category", help="task category", type=str)
+    parser.add_argument("--text", help="words to search for in task names", type=str)
+    parser.add_argument("--priority", help=PRIORITY_HELP, type=int)
 
-    priority_help = f"task priority [1 - {TaskPriority.LOW.name}, 2 - {TaskPriority.MEDIUM.name}, 3 - {TaskPriority.HIGH.name}]"
-    parser.add_argument("--priority", help=priority_help, type=int)
+    where_help = "filter listed tasks, e.g. \"priority >= 2 and (category in (home, work) or overdue)\""
+    parser.add_argument("--where", help=where_help, type=query_argument)
+    parser.add_argument("--order-by", help="field to sort listed tasks by", choices=TASK_FIELDS)
+    parser.add_argument("--desc", help="sort listed tasks in descending order", action="store_true")
+    parser.add_argument("--limit", help="maximum number of tasks to list", type=non_negative_int)
+    parser.add_argument("--offset", help="number of tasks to skip when listing", type=non_negative_int,
+                        default=0)
+    parser.add_argument("--group-by", help=f"comma-separated fields to count tasks by in the stats action, from "
+                        f"{list(SUMMARY_FIELDS)}", type=group_by_argument)
+    parser.add_argument("--file", help="file with one command per line for the batch action, or the file to import "
+                        "from or export to, default: stdin/stdout", type=str)
+    parser.add_argument("--format", help="import/export file format, default: csv for .csv files, jsonl otherwise",
+                        choices=("jsonl", "csv"))
+    parser.add_argument("--chunk-size", help="tasks written per transaction by import and migrate", type=positive_int,
+                        default=1000)
+    parser.add_argument("--to", help="storage type to migrate the tasks to", type=str)
+    parser.add_argument("--replace", help="overwrite tasks whose id already exists on import and migrate instead of "
+                        "skipping them", action="store_true")
+    parser.add_argument("--cache", help="cache task lookups and listings with --limit in the daemon started by serve",
+                        action="store_true")
+    parser.add_argument("--buffer", help="keep up to SIZE changed tasks in memory and write them together, e.g. for "
+                        "batch and import", type=positive_int, metavar="SIZE")
 
-    storage_help = f"type of storage to use, available: {list(STORAGE_TYPES.keys())}"
+    storage_help = f"type of storage to use, available: {list(backends())}"
     parser.add_argument("--storage", help=storage_help, type=str)
+    parser.add_argument("--no-daemon", help="run in this process even if a daemon is serving the storage",
+                        action="store_true")
+    parser.add_argument("--stats", help="print per-operation storage statistics to stderr after the action",
+                        action="store_true")
+    parser.add_argument("--profile", help="profile the action with cProfile and print the top functions to stderr, "
+                        "or dump the profile to FILE", nargs="?", const="-", metavar="FILE")
+    return parser
 
-    args = parser.parse_args()
 
-    storage = get_storage(args.storage)
+def run_action(manager: "TaskManager", args: argparse.Namespace) -> None:
+    if args.action in ACTIONS:
+        ACTIONS[args.action](manager, args)
+    else:
+        print(f"Unknown action: {args.action}")
+        print(f"Available actions: {', '.join(ACTIONS.keys())}, serve, bench")
+        sys.exit(1)
+
+
+def run_daemon(storage_type: str, socket_path: str, cache: bool = False) -> None:
+    import contextlib
+
+    from kumo.daemon import serve
+    from kumo.task_manager import TaskManager
+    parser = build_parser()
+    storage = get_storage(storage_type)
+    if cache:
+        from kumo.caching_storage import CachingStorage
+        # Without a data version, changes made by other processes would
+        # never reach the cache.
+        if not hasattr(storage, "data_version"):
+            storage.close()
+            print(f"--cache is not supported by the {storage_type} storage")
+            sys.exit(1)
+        storage = CachingStorage(storage)
     manager = TaskManager(storage)
 
-    actions = {
-        "get": handle_get_task,
-        "list": handle_list_tasks,
-        "add": handle_add_task,
-        "delete": handle_delete_task
-    }
+    def execute(argv: List[str], stdout: TextIO) -> int:
+        with contextlib.redirect_stdout(stdout):
+            try:
+                run_action(manager, parser.parse_args(argv))
+            except SystemExit as e:
+                return e.code if isinstance(e.code, int) else 1
+        return 0
 
-    if args.action in actions:
-        actions[args.action](manager, args)
-    else:
+    try:
+        serve(socket_path, execute)
+    finally:
+        storage.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    # bench has its own options, see python main.py bench --help.
+    if argv[:1] == ["bench"]:
+        from benchmarks.suite import main as bench_main
+        bench_main(argv[1:])
+        return
+    args = build_parser().parse_args(argv)
+    if args.action not in ACTIONS and args.action != "serve":
         print(f"Unknown action: {args.action}")
-        print(f"Available actions: {', '.join(actions.keys())}")
+        print(f"Available actions: {', '.join(ACTIONS.keys())}, serve, bench")
         sys.exit(1)
+    storage_type = resolve_storage_type(args.storage)
+    socket_path = default_socket_path(storage_type)
+
+    if args.action == "serve":
+        run_daemon(storage_type, socket_path, args.cache)
+        return
+    # Statistics and buffering describe this process, so they are never
+    # forwarded either.
+    forwardable = args.action not in LOCAL_ACTIONS and not (args.stats or args.profile or args.buffer)
+    if forwardable and not args.no_daemon and os.path.exists(socket_path):
+        from kumo.daemon import forward
+        status = forward(socket_path, argv, sys.stdout)
+        if status is not None:
+            sys.exit(status)
+
+    run_in_process(storage_type, args)
+
+
+def run_in_process(storage_type: str, args: argparse.Namespace) -> None:
+    import time
+
+    from kumo.instrumentation import InstrumentedStorage, format_report
+    from kumo.task_manager import TaskManager
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    storage = get_storage(storage_type)
+    if args.buffer:
+        from kumo.buffered_storage import BufferedStorage
+        storage = BufferedStorage(storage, args.buffer)
+    opened = time.perf_counter()
+    manager = TaskManager(storage, instrument=args.stats)
+    try:
+        run_action(manager, args)
+    finally:
+        manager.storage.close()
+        finished = time.perf_counter()
+        if profiler is not None:
+            profiler.disable()
+            print_profile(profiler, args.profile)
+        if isinstance(manager.storage, InstrumentedStorage):
+            print(f"open storage: {(opened - start) * 1000:.2f} ms, total: {(finished - start) * 1000:.2f} ms",
+                  file=sys.stderr)
+            print(format_report(manager.storage.report(), manager.storage.counts_rows), file=sys.stderr)
+
+
+def print_profile(profiler: "cProfile.Profile", destination: str) -> None:
+    import pstats
+    if destination == "-":
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(PROFILE_LINES)
+    else:
+        profiler.dump_stats(destination)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,36 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from kumo.storage import BinaryStorage, JournalStorage, JsonStorage, SqliteStorage
+
+# Every backend, opened on a path without its extension. Opening the same
+# path twice gives a second instance on the same files.
+STORAGE_FACTORIES = {
+    "json": lambda path: JsonStorage(path + ".json"),
+    "journal": lambda path: JournalStorage(path + ".jsonl", background_compaction=False),
+    "sqlite": lambda path: SqliteStorage(path + ".db"),
+    "binary": lambda path: BinaryStorage(path + ".bin"),
+}
+
+
+@pytest.fixture
+def temp_dir():
+    dir_path = tempfile.mkdtemp()
+    yield dir_path
+    shutil.rmtree(dir_path)
+
+
+@pytest.fixture(params=list(STORAGE_FACTORIES))
+def storage_factory(request, temp_dir):
+    path = os.path.join(temp_dir, "test_tasks")
+    return lambda: STORAGE_FACTORIES[request.param](path)
+
+
+@pytest.fixture
+def storage(storage_factory):
+    storage = storage_factory()
+    yield storage
+    storage.close()
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from kumo.async_storage import ThreadedStorage
+from kumo.async_task_manager import AsyncTaskManager
+from kumo.query import field
+from kumo.storage import JsonStorage, SqliteStorage
+from kumo.task import TaskPriority
+
+
+@pytest.fixture
+def make_storage(storage_factory):
+    return lambda: ThreadedStorage(storage_factory(), iter_batch_size=2)
+
+
+def test_async_task_manager_round_trip(make_storage):
+    async def scenario():
+        async with make_storage() as storage:
+            manager = AsyncTaskManager(storage)
+            task = await manager.create_task("Buy milk", "2025-01-01", TaskPriority.HIGH, "home")
+            created = await manager.create_tasks([
+                {"name": f"Task {i}", "due_date": "2025-02-01", "category": "work"} for i in range(4)
+            ])
+            assert task.id == 1
+            assert [task.id for task in created] == [2, 3, 4, 5]
+
+            fetched = await manager.get_task(1)
+            assert fetched.name == "Buy milk"
+            assert fetched.priority == TaskPriority.HIGH
+
+            fetched.name = "Buy oat milk"
+            await manager.update_task(fetched)
+            await manager.delete_task(3)
+            await manager.delete_tasks([4])
+
+            assert [task.id for task in await manager.get_all_tasks()] == [1, 2, 5]
+            work = await manager.get_tasks(query=field("category") == "work", order_by="id")
+            assert [task.id for task in work] == [2, 5]
+            assert [task.id async for task in manager.iter_tasks(order_by="id", descending=True)] == [5, 2, 1]
+            assert [task.name for task in await manager.search("oat")] == ["Buy oat milk"]
+            assert await manager.summarize(["category"]) == {("home",): 1, ("work",): 2}
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_creates_get_distinct_ids(make_storage):
+    async def scenario():
+        async with make_storage() as storage:
+            manager = AsyncTaskManager(storage)
+            tasks = await asyncio.gather(*(manager.create_task(f"Task {i}", "2025-01-01") for i in range(20)))
+            assert sorted(task.id for task in tasks) == list(range(1, 21))
+            assert len(await manager.get_all_tasks()) == 20
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_reads_run_on_a_pool_of_connections(temp_dir):
+    storage = SqliteStorage(os.path.join(temp_dir, "test_tasks.db"))
+    threads = set()
+    get_task = storage.get_task
+
+    def recording_get_task(id):
+        threads.add(threading.get_ident())
+        time.sleep(0.01)
+        return get_task(id)
+
+    storage.get_task = recording_get_task
+
+    async def scenario():
+        async with ThreadedStorage(storage, max_workers=3) as async_storage:
+            manager = AsyncTaskManager(async_storage)
+            await manager.create_task("Task", "2025-01-01")
+            results = await asyncio.gather(*(manager.get_task(1) for _ in range(50)))
+            assert all(task.name == "Task" for task in results)
+
+    asyncio.run(scenario())
+    assert 1 < len(threads) <= 3
+
+
+def test_iteration_stays_on_one_thread_and_is_closed(temp_dir):
+    storage = SqliteStorage(os.path.join(temp_dir, "test_tasks.db"))
+    threads = set()
+    closed = []
+    iter_tasks = storage.iter_tasks
+
+    def recording_iter_tasks(*args):
+        try:
+            for task in iter_tasks(*args):
+                threads.add(threading.get_ident())
+                yield task
+        finally:
+            threads.add(threading.get_ident())
+            closed.append(True)
+
+    storage.iter_tasks = recording_iter_tasks
+
+    async def scenario():
+        async with ThreadedStorage(storage, max_workers=3, iter_batch_size=2) as async_storage:
+            manager = AsyncTaskManager(async_storage)
+            await manager.create_tasks([{"name": f"Task {i}", "due_date": "2025-01-01"} for i in range(10)])
+            tasks = async_storage.iter_tasks(order_by="id")
+            ids = []
+            for _ in range(5):
+                ids.append((await tasks.__anext__()).id)
+                await asyncio.gather(*(manager.get_task(1) for _ in range(5)))
+            await tasks.aclose()
+            assert ids == [1, 2, 3, 4, 5]
+
+    asyncio.run(scenario())
+    assert len(threads) == 1
+    assert closed == [True]
+
+
+def test_reads_are_serialized_for_other_backends(temp_dir):
+    storage = ThreadedStorage(JsonStorage(os.path.join(temp_dir, "test_tasks.json")), max_workers=3)
+    assert storage._reader is storage._writer
+    asyncio.run(storage.close())
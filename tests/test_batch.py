@@ -0,0 +1,104 @@
+import io
+import json
+import os
+
+import pytest
+
+from kumo.batch import run_batch
+from kumo.storage import JsonStorage, SqliteStorage
+from kumo.task_manager import TaskManager
+from main import read_batch_commands
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, temp_dir):
+    if request.param == "json":
+        storage = JsonStorage(os.path.join(temp_dir, "test_tasks.json"))
+    else:
+        storage = SqliteStorage(os.path.join(temp_dir, "test_tasks.db"))
+    yield storage
+    storage.close()
+
+
+def run(manager, script):
+    output = io.StringIO()
+    failed = run_batch(manager, read_batch_commands(io.StringIO(script)), output)
+    return failed, [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+def test_batch_reports_each_command(storage):
+    script = """
+# comment lines and blank lines are skipped
+add --name "Buy milk" --due 2025-01-01 --priority 2 --category home
+add --name 'Write report' --due 2025-02-01
+get --id 1
+list --order-by id
+delete --id 1
+list
+search --text report
+"""
+    failed, results = run(TaskManager(storage), script)
+    assert failed == 0
+    assert [(result["line"], result["action"]) for result in results] == [
+        (3, "add"), (4, "add"), (5, "get"), (6, "list"), (7, "delete"), (8, "list"), (9, "search")
+    ]
+    assert all(result["ok"] for result in results)
+    assert results[0]["task"] == {"id": 1, "name": "Buy milk", "dueDate": "2025-01-01", "priority": 2, "category": "home"}
+    assert results[1]["task"]["id"] == 2
+    assert results[2]["task"]["name"] == "Buy milk"
+    assert [task["id"] for task in results[3]["tasks"]] == [1, 2]
+    assert results[4]["id"] == 1
+    assert [task["id"] for task in results[5]["tasks"]] == [2]
+    assert [task["id"] for task in results[6]["tasks"]] == [2]
+
+
+def test_batch_groups_consecutive_writes(storage, monkeypatch):
+    calls = []
+    for method in ("save_task", "save_tasks", "delete_task", "delete_tasks"):
+        original = getattr(storage, method)
+        monkeypatch.setattr(storage, method, lambda *args, method=method, original=original: (calls.append(method), original(*args)))
+
+    script = "\n".join(f"add --name 'Task {i}' --due 2025-01-01" for i in range(5))
+    script += "\ndelete --id 1\ndelete --id 2\nadd --name 'Last' --due 2025-01-02\n"
+    failed, results = run(TaskManager(storage), script)
+
+    assert failed == 0
+    assert calls == ["save_tasks", "delete_tasks", "save_tasks"]
+    assert [task.id for task in storage.get_tasks(order_by="id")] == [3, 4, 5, 6]
+    assert results[-1]["task"]["id"] == 6
+
+
+def test_batch_reports_failures_and_continues(storage):
+    script = """add --name "Valid" --due 2025-01-01
+add --name "No due date"
+add --name "Bad date" --due not-a-date
+get
+frobnicate --id 1
+list --where "priority >>"
+list --bogus
+add --name "Unclosed
+get --id 1
+"""
+    failed, results = run(TaskManager(storage), script)
+    assert failed == 7
+    assert [result["ok"] for result in results] == [True, False, False, False, False, False, False, False, True]
+    assert results[1]["error"] == "name and due options are required for this action"
+    assert results[3]["error"] == "id option is required for this action"
+    assert results[4]["error"] == "Unknown action: frobnicate"
+    assert results[8]["task"]["name"] == "Valid"
+    assert [task.name for task in storage.get_all_tasks()] == ["Valid"]
+
+
+def test_batch_reports_help_and_continues(storage, capsys):
+    script = """add --name "First" --due 2025-01-01
+--help
+list --help
+add --name "Second" --due 2025-01-02
+"""
+    failed, results = run(TaskManager(storage), script)
+    assert failed == 2
+    results.sort(key=lambda result: result["line"])
+    assert [(result["line"], result["ok"]) for result in results] == [(1, True), (2, False), (3, False), (4, True)]
+    assert results[1]["error"] == "--help is not available in a batch"
+    assert [task.name for task in storage.get_tasks(order_by="id")] == ["First", "Second"]
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,73 @@
+import json
+import os
+
+import pytest
+
+from benchmarks import bench_sqlite
+from benchmarks.bench_json_formats import run_formats
+from benchmarks.suite import _directory_size, main, run_suite, synthetic_tasks
+from kumo.storage import JsonStorage, SqliteStorage
+
+FACTORIES = {
+    "json": lambda: JsonStorage("tasks.json"),
+    "sqlite": lambda: SqliteStorage("tasks.db"),
+}
+
+
+def test_synthetic_tasks_are_deterministic():
+    assert list(synthetic_tasks(50, seed=1)) == list(synthetic_tasks(50, seed=1))
+    assert list(synthetic_tasks(50, seed=1)) != list(synthetic_tasks(50, seed=2))
+
+
+def test_run_suite_reports_every_operation():
+    cwd = os.getcwd()
+    report = run_suite(FACTORIES, sizes=[20, 40], ops=5)
+    assert os.getcwd() == cwd
+
+    assert [(result["storage"], result["size"]) for result in report["results"]] == [
+        ("json", 20), ("json", 40), ("sqlite", 20), ("sqlite", 40)
+    ]
+    for result in report["results"]:
+        assert result["store_bytes"] > 0
+        operations = {operation["operation"]: operation for operation in result["operations"]}
+        assert list(operations) == ["startup", "get_task", "get_tasks_filtered", "create_task", "update_task",
+                                    "delete_task"]
+        assert operations["get_task"]["ops"] == 5
+        assert operations["get_tasks_filtered"]["ops"] == 1
+        assert all(operation["total_seconds"] >= 0 for operation in operations.values())
+
+
+def test_main_writes_json_report(tmp_path):
+    output = tmp_path / "report.json"
+    main(["--sizes", "10", "--ops", "3", "--storage", "sqlite", "--output", str(output)], FACTORIES)
+    report = json.loads(output.read_text())
+    assert [result["storage"] for result in report["results"]] == ["sqlite"]
+    assert report["ops"] == 3
+
+
+def test_main_rejects_zero_ops(capsys):
+    with pytest.raises(SystemExit):
+        main(["--ops", "0"], FACTORIES)
+    assert "must be positive: 0" in capsys.readouterr().err
+
+
+def test_directory_size_includes_subdirectories(tmp_path):
+    (tmp_path / "shards.json").write_bytes(b"x" * 10)
+    (tmp_path / "tasks.shards").mkdir()
+    (tmp_path / "tasks.shards" / "shard-0.db").write_bytes(b"x" * 100)
+    assert _directory_size(str(tmp_path)) == 110
+
+
+def test_run_formats_reports_size_and_load_time(tmp_path):
+    results = {(result["layout"], result["compression"]): result for result in run_formats(str(tmp_path), 200, 1)}
+    assert len(results) == 12
+    assert results["compact", "none"]["bytes"] < results["pretty", "none"]["bytes"]
+    assert results["columnar", "none"]["bytes"] < results["compact", "none"]["bytes"]
+    assert results["pretty", "lzma"]["bytes"] < results["pretty", "none"]["bytes"]
+    assert all(result["load_seconds"] > 0 for result in results.values())
+
+
+def test_bench_sqlite_runs_both_variants(capsys):
+    bench_sqlite.main(["--count", "5"])
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split()[0] for line in lines] == ["variant", "connect-per-operation", "persistent"]
@@ -0,0 +1,185 @@
+import io
+import json
+import os
+import random
+import sys
+import time
+
+import pytest
+
+import main
+from kumo.buffered_storage import BufferedStorage
+from kumo.query import parse_query
+from kumo.storage import JsonStorage, SqliteStorage
+from kumo.task import Task, TaskPriority
+from kumo.task_manager import TaskManager
+
+
+class RecordingStorage:
+    def __init__(self, storage):
+        self.storage = storage
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self.storage, name)
+
+        def record(*args):
+            if name in ("save_tasks", "update_tasks", "delete_tasks"):
+                args = (list(args[0]),)
+                self.calls.append((name, [getattr(item, "id", item) for item in args[0]]))
+            return method(*args)
+        return record
+
+
+def make_task(id, name="Task", category="home"):
+    return Task(id, f"{name} {id}", "2025-01-01", TaskPriority.LOW, category)
+
+
+def test_writes_to_one_id_are_coalesced(storage):
+    recording = RecordingStorage(storage)
+    buffered = BufferedStorage(recording)
+    buffered.save_task(make_task(1))
+    buffered.update_task(make_task(1, "Renamed"))
+    buffered.save_task(make_task(2))
+    buffered.delete_task(2)
+    buffered.update_task(make_task(3))
+    buffered.delete_task(4)
+    assert recording.calls == []
+
+    buffered.flush()
+    assert recording.calls == [("delete_tasks", [4]), ("save_tasks", [1]), ("update_tasks", [3])]
+    assert storage.get_task(1).name == "Renamed 1"
+    assert storage.get_task(2) is None
+    assert buffered.flushes == 1
+
+
+def test_deleted_and_saved_again_is_replaced(storage):
+    storage.save_task(make_task(1))
+    with BufferedStorage(RecordingStorage(storage)) as buffered:
+        buffered.delete_task(1)
+        buffered.save_task(make_task(1, "New"))
+        assert buffered.get_task(1).name == "New 1"
+        buffered.flush()
+        assert buffered.storage.calls == [("delete_tasks", [1]), ("save_tasks", [1])]
+    assert [task.name for task in storage.get_all_tasks()] == ["New 1"]
+
+
+def test_failed_flush_does_not_repeat_written_calls(storage, monkeypatch):
+    storage.save_tasks([make_task(1), make_task(2)])
+    buffered = BufferedStorage(storage)
+    buffered.delete_task(1)
+    buffered.save_task(make_task(1, "New"))
+    buffered.save_task(make_task(3))
+    buffered.update_task(make_task(2, "Renamed"))
+
+    update_tasks = storage.update_tasks
+
+    def failing_update(tasks):
+        monkeypatch.setattr(storage, "update_tasks", update_tasks)
+        raise OSError("disk full")
+    monkeypatch.setattr(storage, "update_tasks", failing_update)
+    with pytest.raises(OSError):
+        buffered.flush()
+    assert buffered.get_task(2).name == "Renamed 2"
+
+    recording = RecordingStorage(storage)
+    buffered.storage = recording
+    buffered.flush()
+    assert recording.calls == [("update_tasks", [2])]
+    assert sorted((task.id, task.name) for task in storage.get_all_tasks()) == [
+        (1, "New 1"), (2, "Renamed 2"), (3, "Task 3")
+    ]
+
+
+def test_flushes_when_full(storage):
+    recording = RecordingStorage(storage)
+    buffered = BufferedStorage(recording, max_pending=3)
+    buffered.save_tasks([make_task(i) for i in range(1, 6)])
+    assert recording.calls == [("save_tasks", [1, 2, 3])]
+    buffered.close()
+    assert recording.calls[-1] == ("save_tasks", [4, 5])
+
+
+def test_flushes_after_interval(storage):
+    buffered = BufferedStorage(storage, flush_interval=0.05)
+    buffered.save_task(make_task(1))
+    deadline = time.monotonic() + 5
+    while buffered.flushes == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert buffered.flushes == 1
+    assert storage.get_task(1) is not None
+    buffered.close()
+
+
+def test_buffered_tasks_are_copies(storage):
+    buffered = BufferedStorage(storage)
+    task = make_task(1)
+    buffered.save_task(task)
+    task.name = "Changed"
+    buffered.get_task(1).name = "Changed too"
+    assert buffered.get_task(1).name == "Task 1"
+
+
+def test_reads_match_unbuffered_storage(storage, temp_dir):
+    reference = SqliteStorage(os.path.join(temp_dir, "reference.db"))
+    buffered = BufferedStorage(storage, max_pending=25)
+    rng = random.Random(7)
+    queries = [None, parse_query("priority >= 2"), parse_query("name contains 1")]
+    try:
+        for step in range(300):
+            id = rng.randint(1, 40)
+            operation = rng.random()
+            exists = reference.get_task(id) is not None
+            task = Task(id, f"Task {rng.randint(1, 20)}", f"2025-01-{rng.randint(1, 28):02d}", rng.choice([None, 1, 2, 3]),
+                        rng.choice(["home", "work", None]))
+            if operation < 0.4 and not exists:
+                changes = [("save_task", task)]
+            elif operation < 0.8:
+                changes = [("update_task", task)]
+            else:
+                changes = [("delete_task", id)]
+            for name, argument in changes:
+                getattr(reference, name)(argument)
+                getattr(buffered, name)(argument)
+
+            assert (buffered.get_task(id) or Task(0, "", "2025-01-01")).to_dict() == \
+                   (reference.get_task(id) or Task(0, "", "2025-01-01")).to_dict()
+            order_by = rng.choice(["id", "name", "due_date", "priority", "category"])
+            descending = rng.random() < 0.5
+            limit = rng.choice([None, 5])
+            offset = rng.choice([0, 3])
+            query = rng.choice(queries)
+            category = rng.choice([None, "home"])
+            expected = reference.get_tasks(category, None, order_by, descending, limit, offset, query)
+            actual = buffered.get_tasks(category, None, order_by, descending, limit, offset, query)
+            assert [task.to_dict() for task in actual] == [task.to_dict() for task in expected], step
+            assert sorted(task.id for task in buffered.get_tasks(query=query)) == \
+                   sorted(task.id for task in reference.get_tasks(query=query))
+            assert sorted(task.id for task in buffered.search("task 1")) == \
+                   sorted(task.id for task in reference.search("task 1"))
+            assert buffered.summarize(["category", "priority"], category=category, query=query) == \
+                   reference.summarize(["category", "priority"], category=category, query=query)
+        buffered.flush()
+        assert sorted(map(Task.to_json, storage.get_all_tasks())) == sorted(map(Task.to_json, reference.get_all_tasks()))
+    finally:
+        reference.close()
+
+
+def test_task_manager_with_buffered_storage(storage):
+    with BufferedStorage(storage) as buffered:
+        manager = TaskManager(buffered)
+        created = manager.create_tasks({"name": f"Task {i}", "due_date": "2025-01-01"} for i in range(3))
+        manager.delete_task(created[0].id)
+        assert [task.id for task in manager.get_tasks(order_by="id")] == [2, 3]
+        assert storage.get_all_tasks() == []
+    assert [task.id for task in storage.get_all_tasks()] == [2, 3]
+
+
+def test_cli_batch_with_buffer(temp_dir, monkeypatch, capsys):
+    monkeypatch.chdir(temp_dir)
+    script = "add --name A --due 2025-01-01\nadd --name B --due 2025-01-01\ndelete --id 1\nlist\n"
+    monkeypatch.setattr(sys, "stdin", io.StringIO(script))
+    main.main(["batch", "--buffer", "100"])
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [task["id"] for task in results[-1]["tasks"]] == [2]
+    assert [task.id for task in JsonStorage("tasks.json").get_all_tasks()] == [2]
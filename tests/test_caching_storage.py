@@ -0,0 +1,132 @@
+import os
+import threading
+
+import pytest
+
+import main
+from kumo.caching_storage import CachingStorage
+from kumo.query import parse_query
+from kumo.storage import JournalStorage
+from kumo.task import Task, TaskPriority
+from kumo.task_manager import TaskManager
+
+
+@pytest.fixture
+def storages(storage_factory):
+    # A cached storage and a second, uncached one on the same file, standing
+    # in for another process.
+    storage = storage_factory()
+    other = storage_factory()
+    TaskManager(storage).create_tasks({"name": f"Task {i}", "due_date": "2025-01-01", "priority": i % 3 + 1,
+                                       "category": "home" if i % 2 else "work"} for i in range(10))
+    cached = CachingStorage(storage)
+    yield cached, other
+    cached.close()
+    other.close()
+
+
+def test_get_task_hits_and_misses(storages):
+    cached, _ = storages
+    assert cached.get_task(1).name == "Task 0"
+    assert cached.get_task(1).name == "Task 0"
+    assert cached.get_task(99) is None
+    assert cached.get_task(99) is None
+    stats = cached.cache_stats()
+    assert (stats["task_hits"], stats["task_misses"]) == (2, 2)
+
+
+def test_cached_tasks_are_copies(storages):
+    cached, _ = storages
+    cached.get_task(1).name = "Changed"
+    cached.get_tasks(category="home", order_by="id")[0].name = "Changed"
+    assert cached.get_task(1).name == "Task 0"
+    assert cached.get_tasks(category="home", order_by="id")[0].name == "Task 1"
+
+
+def test_query_results_are_cached_by_arguments(storages):
+    cached, _ = storages
+    assert [task.id for task in cached.get_tasks(category="home", order_by="id")] == [2, 4, 6, 8, 10]
+    assert [task.id for task in cached.get_tasks(category="home", order_by="id")] == [2, 4, 6, 8, 10]
+    cached.get_tasks(category="home", order_by="id", descending=True)
+    cached.get_tasks(query=parse_query("category = home"), order_by="id")
+    assert [task.id for task in cached.iter_tasks(category="home", order_by="id", limit=2)] == [2, 4]
+    assert [task.id for task in cached.iter_tasks(category="home", order_by="id", limit=2)] == [2, 4]
+    stats = cached.cache_stats()
+    assert (stats["query_hits"], stats["query_misses"]) == (3, 3)
+
+
+def test_writes_invalidate_only_affected_entries(storages):
+    cached, _ = storages
+    cached.get_task(1)
+    cached.get_task(2)
+    cached.get_tasks(category="home")
+    cached.get_tasks(category="work")
+
+    task = cached.get_task(1)
+    task.name = "Renamed"
+    cached.update_task(task)
+    assert cached.get_task(1).name == "Renamed"
+    assert [task.name for task in cached.get_tasks(category="work")][0] == "Renamed"
+    cached.get_task(2)
+    cached.get_tasks(category="home")
+    stats = cached.cache_stats()
+    # Task 2 and the home listing were served from the cache.
+    assert stats["task_hits"] == 2
+    assert stats["query_hits"] == 1
+
+    cached.save_task(Task(20, "New", "2025-01-01", TaskPriority.LOW, "home"))
+    assert 20 in [task.id for task in cached.get_tasks(category="home")]
+    cached.delete_task(20)
+    assert 20 not in [task.id for task in cached.get_tasks(category="home")]
+    assert cached.get_task(20) is None
+
+
+def test_writes_from_other_connections_are_detected(storages):
+    cached, other = storages
+    assert cached.get_task(1).name == "Task 0"
+    assert len(cached.get_tasks(category="home")) == 5
+
+    task = other.get_task(1)
+    task.name = "Changed elsewhere"
+    other.update_task(task)
+    other.save_task(Task(30, "Other", "2025-01-01", category="home"))
+
+    assert cached.get_task(1).name == "Changed elsewhere"
+    assert len(cached.get_tasks(category="home")) == 6
+    assert cached.cache_stats()["invalidations"] == 1
+
+
+def test_other_threads_see_external_writes(storages):
+    cached, other = storages
+    cached.get_task(1)
+    task = other.get_task(1)
+    task.name = "Changed elsewhere"
+    other.update_task(task)
+
+    names = []
+    thread = threading.Thread(target=lambda: names.append(cached.get_task(1).name))
+    thread.start()
+    thread.join()
+    assert names == ["Changed elsewhere"]
+
+
+def test_lru_is_bounded(temp_dir):
+    storage = JournalStorage(os.path.join(temp_dir, "test_tasks.jsonl"), background_compaction=False)
+    storage.save_tasks([Task(i, f"Task {i}", "2025-01-01") for i in range(1, 5)])
+    with CachingStorage(storage, max_tasks=2, max_queries=1) as cached:
+        cached.get_task(1)
+        cached.get_task(2)
+        cached.get_task(1)
+        cached.get_task(3)
+        assert list(cached._tasks) == [1, 3]
+        cached.get_tasks(category="a")
+        cached.get_tasks(category="b")
+        assert cached.cache_stats()["cached_queries"] == 1
+
+
+def test_serve_cache_needs_data_version(temp_dir, monkeypatch, capsys):
+    monkeypatch.chdir(temp_dir)
+    with pytest.raises(SystemExit) as exc_info:
+        main.main(["serve", "--cache", "--storage", "sharded"])
+    assert exc_info.value.code == 1
+    assert "--cache is not supported by the sharded storage" in capsys.readouterr().out
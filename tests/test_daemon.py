@@ -0,0 +1,103 @@
+import io
+import os
+import socket
+import stat
+import threading
+
+import pytest
+
+from kumo import daemon as daemon_module
+from kumo.daemon import OUTPUT_FRAME_SIZE, DaemonServer, forward
+
+
+@pytest.fixture
+def socket_path(temp_dir):
+    return os.path.join(temp_dir, "kumo.sock")
+
+
+def echo(argv, stdout):
+    for arg in argv:
+        print(arg, file=stdout)
+    if "raise" in argv:
+        raise ValueError("bad argument")
+    return 3 if "fail" in argv else 0
+
+
+@pytest.fixture
+def daemon(socket_path):
+    server = DaemonServer(socket_path, echo)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def test_forward_returns_output_and_status(daemon, socket_path):
+    stdout = io.StringIO()
+    assert forward(socket_path, ["list", "--limit", "2"], stdout) == 0
+    assert stdout.getvalue() == "list\n--limit\n2\n"
+
+    stdout = io.StringIO()
+    assert forward(socket_path, ["fail"], stdout) == 3
+    assert stdout.getvalue() == "fail\n"
+
+
+def test_forward_reports_executor_errors(daemon, socket_path):
+    stdout = io.StringIO()
+    assert forward(socket_path, ["raise"], stdout) == 1
+    assert stdout.getvalue() == "raise\nError: bad argument\n"
+    assert forward(socket_path, ["ok"], io.StringIO()) == 0
+
+
+def test_socket_is_private(daemon, socket_path):
+    assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+
+
+def test_idle_connection_times_out(monkeypatch, daemon, socket_path):
+    assert daemon_module._RequestHandler.timeout == daemon_module.REQUEST_TIMEOUT
+    monkeypatch.setattr(daemon_module._RequestHandler, "timeout", 0.1)
+    idle = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    idle.connect(socket_path)
+    try:
+        stdout = io.StringIO()
+        assert forward(socket_path, ["ok"], stdout) == 0
+        assert stdout.getvalue() == "ok\n"
+    finally:
+        idle.close()
+
+
+def test_forward_streams_large_output(daemon, socket_path):
+    argv = ["x" * 1000] * (3 * OUTPUT_FRAME_SIZE // 1000)
+    stdout = io.StringIO()
+    assert forward(socket_path, argv, stdout) == 0
+    assert stdout.getvalue() == "".join(arg + "\n" for arg in argv)
+
+
+def test_forward_without_daemon(socket_path):
+    assert forward(socket_path, ["list"], io.StringIO()) is None
+
+
+def test_forward_with_stale_socket(socket_path):
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+    assert os.path.exists(socket_path)
+    assert forward(socket_path, ["list"], io.StringIO()) is None
+
+
+def test_server_replaces_stale_socket(socket_path):
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+
+    server = DaemonServer(socket_path, echo)
+    server.server_close()
+    assert not os.path.exists(socket_path)
+
+
+def test_server_refuses_second_daemon(daemon, socket_path):
+    with pytest.raises(RuntimeError):
+        DaemonServer(socket_path, echo)
+    assert forward(socket_path, ["get"], io.StringIO()) == 0
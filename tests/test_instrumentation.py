@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from kumo.instrumentation import LATENCY_LABELS, InstrumentedStorage, format_report
+from kumo.storage import JsonStorage
+from kumo.task_manager import TaskManager
+
+
+@pytest.fixture
+def manager(storage_factory):
+    manager = TaskManager(storage_factory(), instrument=True)
+    manager.create_tasks({"name": f"Task {i}", "due_date": "2025-01-01", "category": "home" if i % 2 else "work"}
+                         for i in range(10))
+    manager.storage.reset()
+    yield manager
+    manager.storage.close()
+
+
+def test_stats_disabled_by_default(temp_dir):
+    manager = TaskManager(JsonStorage(os.path.join(temp_dir, "test_tasks.json")))
+    assert manager.stats is None
+
+
+def test_records_calls_latency_and_tasks(manager):
+    manager.get_task(1)
+    manager.get_task(2)
+    manager.get_task(999)
+    assert len(manager.get_tasks(category="home")) == 5
+    assert len(list(manager.iter_tasks(limit=3))) == 3
+    manager.create_task("New", "2025-02-01")
+
+    stats = manager.stats
+    assert stats["get_task"]["calls"] == 3
+    assert stats["get_task"]["tasks"] == 2
+    assert sum(stats["get_task"]["histogram"].values()) == 3
+    assert list(stats["get_task"]["histogram"]) == list(LATENCY_LABELS)
+    assert stats["get_task"]["seconds"] >= stats["get_task"]["max_seconds"] > 0
+    assert stats["get_tasks"]["tasks"] == 5
+    assert stats["iter_tasks"]["calls"] == 1
+    assert stats["iter_tasks"]["tasks"] == 3
+    assert stats["allocate_ids"]["calls"] == 1
+    assert stats["save_task"]["calls"] == 1
+
+
+def test_counts_rows_scanned_by_in_process_backends(manager):
+    manager.get_tasks(category="home")
+    scanned = manager.stats["get_tasks"]["rows_scanned"]
+    if manager.storage.counts_rows:
+        assert scanned == 10
+    else:
+        assert scanned == 0
+
+
+def test_records_bytes_written(manager):
+    if not os.path.exists("/proc/thread-self/io"):
+        pytest.skip("per-thread I/O counters are only available on Linux")
+    manager.create_task("New", "2025-02-01")
+    assert manager.stats["save_task"]["bytes_written"] > 0
+
+
+def test_records_failed_calls(temp_dir):
+    class FailingStorage:
+        def get_task(self, id):
+            raise RuntimeError("boom")
+
+    storage = InstrumentedStorage(FailingStorage())
+    with pytest.raises(RuntimeError):
+        storage.get_task(1)
+    assert storage.report()["get_task"]["calls"] == 1
+    assert not storage.counts_rows
+
+
+def test_format_report(manager):
+    manager.get_task(1)
+    text = format_report(manager.stats, manager.storage.counts_rows)
+    assert text.splitlines()[0].startswith("operation")
+    assert "get_task" in text
@@ -1,3 +1,5 @@
+import datetime
+
 from kumo.task import Task, TaskPriority
 
 
@@ -86,3 +88,43 @@ def test_task_from_dict_without_priority_and_category():
     assert task.due_date.isoformat() == "1918-11-11"
     assert task.priority is None
     assert task.category is None
+
+
+def test_task_init_with_date():
+    task = Task(id=1, name="Test task", due_date=datetime.date(1918, 11, 11))
+    assert task.due_date == datetime.date(1918, 11, 11)
+
+
+def test_task_init_with_int_priority():
+    task = Task(id=1, name="Test task", due_date="1918-11-11", priority=3)
+    assert task.priority == TaskPriority.HIGH
+
+
+def test_task_init_with_unpadded_date():
+    task = Task(id=1, name="Test task", due_date="1918-1-2")
+    assert task.due_date == datetime.date(1918, 1, 2)
+
+
+def test_task_has_slots():
+    task = Task(id=1, name="Test task", due_date="1918-11-11")
+    assert not hasattr(task, "__dict__")
+
+
+def test_task_str():
+    task = Task(id=1, name="Test task", due_date="1918-11-11", priority=TaskPriority.MEDIUM, category="test")
+    assert str(task) == "Task #1: Test task, due date: 1918-11-11, priority: MEDIUM, category: test"
+
+
+def test_task_from_row():
+    task = Task.from_row((1, "Test task", datetime.date(1918, 11, 11).toordinal(), 2, "test"))
+    assert task.id == 1
+    assert task.name == "Test task"
+    assert task.due_date.isoformat() == "1918-11-11"
+    assert task.priority == TaskPriority.MEDIUM
+    assert task.category == "test"
+
+
+def test_task_from_row_without_priority_and_category():
+    task = Task.from_row((1, "Test task", datetime.date(1918, 11, 11).toordinal(), None, None))
+    assert task.priority is None
+    assert task.category is None
@@ -0,0 +1,102 @@
+import datetime
+
+import pytest
+
+from kumo.query import And, Condition, Not, Or, field, overdue, parse_query
+from kumo.task import TaskPriority
+
+JSON_FIELDS = {
+    "id": 't["id"]',
+    "name": 't["name"]',
+    "due_date": 't["dueDate"]',
+    "priority": 't.get("priority")',
+    "category": 't.get("category")',
+}
+
+
+def matches(query, task):
+    return query.to_python(JSON_FIELDS, datetime.date.isoformat)(task)
+
+
+def test_field_operators():
+    query = (field("priority") >= TaskPriority.MEDIUM) & ~(field("category") == "test") | field("name").startswith("Te")
+    assert isinstance(query, Or)
+    assert isinstance(query.queries[0], And)
+    assert isinstance(query.queries[0].queries[1], Not)
+    assert query.queries[0].queries[0].value == 2
+
+
+def test_condition_normalizes_values():
+    assert Condition("due_date", "<", "1918-11-11").value == datetime.date(1918, 11, 11)
+    assert Condition("priority", "=", "high").value == 3
+    assert Condition("priority", "in", ["1", TaskPriority.MEDIUM]).value == (1, 2)
+    assert Condition("id", "=", "5").value == 5
+
+
+@pytest.mark.parametrize("args", [
+    ("owner", "=", "me"),
+    ("name", "~", "x"),
+    ("priority", "contains", "1"),
+    ("due_date", "<", None),
+    ("priority", "=", "urgent"),
+])
+def test_condition_rejects_invalid(args):
+    with pytest.raises(ValueError):
+        Condition(*args)
+
+
+def test_to_sql():
+    query = (field("priority") >= 2) & (field("category").in_(["a", "b"]) | (field("category") == None))  # noqa: E711
+    assert query.to_sql() == ("(priority >= ? AND (category IN (?, ?) OR category IS NULL))", [2, "a", "b"])
+
+
+def test_to_sql_encodes_dates_as_ordinals():
+    sql, params = (field("due_date") < "1918-11-11").to_sql()
+    assert sql == "due_date < ?"
+    assert params == [datetime.date(1918, 11, 11).toordinal()]
+
+
+def test_to_python():
+    task = {"id": 1, "name": "Test task", "dueDate": "1918-11-11", "priority": 2}
+    assert matches(field("name").contains("task"), task)
+    assert matches(field("name").startswith("Test"), task)
+    assert not matches(field("name").startswith("test"), task)
+    assert matches(field("due_date") <= "1918-11-11", task)
+    assert matches(overdue(datetime.date(1920, 1, 1)), task)
+    assert not matches(overdue(datetime.date(1918, 11, 11)), task)
+    assert matches(field("category") == None, task)  # noqa: E711
+    assert not matches(field("category") == "test", task)
+    assert not matches(field("category") != "test", task)
+    assert matches(~(field("category") == "test"), task)
+    assert matches(field("priority").in_([2, 3]) & (field("id") == 1), task)
+
+
+def test_parse_query():
+    query = parse_query('priority >= medium and (category in (home, "day job") or not name contains \'x y\') or overdue')
+    assert isinstance(query, Or)
+    first = query.queries[0]
+    assert isinstance(first, And)
+    assert first.queries[0].value == 2
+    assert first.queries[1].queries[0].value == ("home", "day job")
+    assert first.queries[1].queries[1].query.value == "x y"
+    assert query.queries[1].field == "due_date"
+
+
+def test_parse_query_null():
+    query = parse_query("category = null and due_date > 1918-11-11")
+    assert query.queries[0].value is None
+    assert query.queries[1].value == datetime.date(1918, 11, 11)
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "priority >=",
+    "owner = me",
+    "priority 2",
+    "(priority = 2",
+    "priority = 2 category = a",
+    "category in a",
+])
+def test_parse_query_rejects_invalid(text):
+    with pytest.raises(ValueError):
+        parse_query(text)
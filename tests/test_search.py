@@ -0,0 +1,25 @@
+from kumo.search import InvertedIndex, tokenize
+
+
+def test_tokenize():
+    assert tokenize("Café au lait, 2x_large!") == ["cafe", "au", "lait", "2x", "large"]
+    assert tokenize("") == []
+
+
+def test_inverted_index_requires_all_words():
+    index = InvertedIndex.build([(1, "red apple"), (2, "green apple"), (3, "red car")])
+    assert len(index) == 3
+    assert sorted(index.search("apple")) == [1, 2]
+    assert index.search("red apple") == [1]
+    assert index.search("blue apple") == []
+    assert index.search("") == []
+
+
+def test_inverted_index_ranking():
+    index = InvertedIndex.build([
+        (1, "apple pie with a long list of other ingredients"),
+        (2, "apple"),
+        (3, "apple apple pie"),
+    ])
+    assert index.search("apple") == [3, 2, 1]
+    assert index.search("apple", limit=2) == [3, 2]
@@ -0,0 +1,154 @@
+import os
+import threading
+
+import pytest
+
+from kumo.query import parse_query
+from kumo.registry import get_backend
+from kumo.sharded_storage import ShardedStorage, open_sharded_storage
+from kumo.storage import JsonStorage, SqliteStorage
+from kumo.task import Task
+from kumo.task_manager import TaskManager
+from kumo.transfer import import_tasks
+
+
+SHARD_FACTORIES = {
+    "json": lambda path: JsonStorage(path + ".json"),
+    "sqlite": lambda path: SqliteStorage(path + ".db"),
+}
+
+
+@pytest.fixture(params=[(backend, partition_by) for backend in SHARD_FACTORIES for partition_by in ("id", "category")],
+                ids=lambda param: "-".join(param))
+def storage(request, temp_dir):
+    backend, partition_by = request.param
+    shards = [SHARD_FACTORIES[backend](os.path.join(temp_dir, f"shard-{i}")) for i in range(3)]
+    storage = ShardedStorage(shards, partition_by)
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def reference(temp_dir):
+    storage = SqliteStorage(os.path.join(temp_dir, "reference.db"))
+    yield storage
+    storage.close()
+
+
+def populate(*storages):
+    fields = [{"name": f"Task {i % 7}", "due_date": f"2025-01-{i % 28 + 1:02d}", "priority": i % 4 or None,
+               "category": ("home", "work", "school", None)[i % 4]} for i in range(40)]
+    for storage in storages:
+        TaskManager(storage).create_tasks(fields)
+
+
+def ids(tasks):
+    return [task.id for task in tasks]
+
+
+def test_ids_are_unique_and_spread_over_shards(storage):
+    populate(storage)
+    assert sorted(ids(storage.get_all_tasks())) == list(range(1, 41))
+    assert all(shard.get_all_tasks() for shard in storage.shards)
+    assert storage.allocate_ids(1) == 41
+
+
+def test_point_lookup_routes_to_one_shard(temp_dir):
+    shards = [SqliteStorage(os.path.join(temp_dir, f"shard-{i}.db")) for i in range(2)]
+    storage = ShardedStorage(shards)
+    populate(storage)
+    calls = []
+    for shard in shards:
+        original = shard.get_task
+        shard.get_task = lambda id, shard=shard, original=original: calls.append(shard) or original(id)
+    assert storage.get_task(5).id == 5
+    assert calls == [shards[1]]
+    storage.close()
+
+
+@pytest.mark.parametrize("order_by", [None, "id", "name", "due_date", "priority", "category"])
+@pytest.mark.parametrize("descending", [False, True])
+def test_get_tasks_matches_single_storage(storage, reference, order_by, descending):
+    populate(storage, reference)
+    for limit, offset in [(None, 0), (5, 0), (7, 11), (None, 30)]:
+        expected = reference.get_tasks(order_by=order_by, descending=descending, limit=limit, offset=offset)
+        actual = storage.get_tasks(order_by=order_by, descending=descending, limit=limit, offset=offset)
+        if order_by is None:
+            assert len(actual) == len(expected)
+        else:
+            assert ids(actual) == ids(expected)
+            assert ids(storage.iter_tasks(order_by=order_by, descending=descending, limit=limit,
+                                          offset=offset)) == ids(expected)
+
+
+def test_filters_match_single_storage(storage, reference):
+    populate(storage, reference)
+    query = parse_query("priority >= 2 and name startswith Task")
+    assert ids(storage.get_tasks(category="work", order_by="id")) == ids(reference.get_tasks(category="work",
+                                                                                            order_by="id"))
+    assert ids(storage.get_tasks(query=query, order_by="due_date")) == ids(reference.get_tasks(query=query,
+                                                                                               order_by="due_date"))
+
+
+def test_summarize_matches_single_storage(storage, reference):
+    populate(storage, reference)
+    query = parse_query("priority >= 2")
+    assert storage.summarize() == reference.summarize()
+    assert storage.summarize(["category", "priority"], query=query) == \
+        reference.summarize(["category", "priority"], query=query)
+    assert storage.summarize(["due_date"], category="work") == reference.summarize(["due_date"], category="work")
+
+
+def test_fan_out_runs_on_worker_threads(storage):
+    populate(storage)
+    threads = set()
+    for shard in storage.shards:
+        original = shard.get_tasks
+        shard.get_tasks = lambda *args, original=original: threads.add(threading.get_ident()) or original(*args)
+    storage.get_tasks(priority=2)
+    assert threading.get_ident() not in threads
+
+
+def test_update_and_delete(storage):
+    populate(storage)
+    task = storage.get_task(1)
+    task.category = "moved"
+    task.name = "Renamed"
+    storage.update_task(task)
+    storage.update_task(Task(100, "Missing", "2025-01-01"))
+    assert storage.get_task(1).name == "Renamed"
+    assert ids(storage.get_tasks(category="moved")) == [1]
+    assert storage.get_task(100) is None
+    assert len(storage.get_all_tasks()) == 40
+
+    storage.delete_tasks([1, 2, 3])
+    assert storage.get_task(1) is None
+    assert len(storage.get_all_tasks()) == 37
+
+
+def test_saved_ids_advance_the_sequence(storage):
+    import_tasks(storage, [Task(50, "Imported", "2025-01-01", category="home")])
+    assert storage.allocate_ids(1) == 51
+
+
+def test_search_interleaves_shards(storage):
+    populate(storage)
+    assert sorted(ids(storage.search("task 3"))) == [4, 11, 18, 25, 32, 39]
+    assert len(storage.search("task", limit=5)) == 5
+
+
+def test_open_sharded_storage_keeps_its_layout(temp_dir):
+    path = os.path.join(temp_dir, "tasks.shards")
+    storage = open_sharded_storage(path, shard_count=2, partition_by="category")
+    populate(storage)
+    storage.close()
+    assert {"shard-0.db", "shard-1.db", "shards.json"} <= set(os.listdir(path))
+
+    storage = get_backend("sharded").open(path)
+    assert len(storage.shards) == 2
+    assert storage.partition_by == "category"
+    assert len(storage.get_all_tasks()) == 40
+    storage.close()
+
+    with pytest.raises(ValueError):
+        open_sharded_storage(os.path.join(temp_dir, "other"), backend="sharded")
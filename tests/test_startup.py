@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+# Generous enough for a loaded CI machine, tight enough to catch a storage
+# backend or a heavy dependency being imported eagerly again.
+IMPORT_BUDGET_SECONDS = 0.05
+STARTUP_BUDGET_SECONDS = 1.0
+BACKEND_MODULES = {"kumo.storage", "kumo.sqlite_storage", "kumo.binary_storage", "kumo.sharded_storage",
+                   "kumo.task_manager", "sqlite3"}
+
+
+def run_main(cwd, *args):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", MAIN, *args], cwd=cwd, capture_output=True,
+                            text=True)
+    elapsed = time.perf_counter() - start
+
+    # Lines look like "import time:  self [us] | cumulative | name", with
+    # nested imports indented under the module that triggered them.
+    imports = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            imports[name.strip()] = (int(cumulative), not name.startswith("  "))
+    return result, imports, elapsed
+
+
+def kumo_import_seconds(imports):
+    return sum(cumulative for name, (cumulative, top_level) in imports.items()
+               if top_level and name.split(".")[0] == "kumo") / 1e6
+
+
+@pytest.mark.parametrize("args", [["--help"], ["frobnicate"]])
+def test_help_and_unknown_actions_do_not_touch_storage(tmp_path, args):
+    result, imports, elapsed = run_main(tmp_path, *args)
+
+    assert result.returncode == (0 if args == ["--help"] else 1)
+    assert not BACKEND_MODULES & set(imports)
+    assert os.listdir(tmp_path) == []
+    assert kumo_import_seconds(imports) < IMPORT_BUDGET_SECONDS
+    assert elapsed < STARTUP_BUDGET_SECONDS
+
+
+def test_only_the_selected_backend_is_imported(tmp_path):
+    result, imports, elapsed = run_main(tmp_path, "list", "--storage", "json")
+
+    assert result.returncode == 0
+    assert "kumo.storage" in imports
+    assert not {"kumo.sqlite_storage", "kumo.binary_storage", "sqlite3", "mmap"} & set(imports)
+    assert elapsed < STARTUP_BUDGET_SECONDS
+
+
+def test_storage_module_still_exports_every_backend():
+    from kumo import storage
+    from kumo.binary_storage import BinaryStorage
+    from kumo.sqlite_storage import SQLITE_SCHEMA_VERSION, SqliteStorage
+
+    assert storage.SqliteStorage is SqliteStorage
+    assert storage.BinaryStorage is BinaryStorage
+    assert storage.SQLITE_SCHEMA_VERSION == SQLITE_SCHEMA_VERSION
+    with pytest.raises(AttributeError):
+        storage.NoSuchStorage
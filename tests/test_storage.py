@@ -1,19 +1,17 @@
+import datetime
+import multiprocessing
 import pytest
 import os
 import json
 import sqlite3
-import tempfile
-import shutil
+import threading
 
 from kumo.task import Task, TaskPriority
-from kumo.storage import JsonStorage, SqliteStorage
-
-
-@pytest.fixture
-def temp_dir():
-    dir_path = tempfile.mkdtemp()
-    yield dir_path
-    shutil.rmtree(dir_path)
+from kumo import storage as storage_module
+from kumo.query import field, parse_query
+from kumo.storage import (JSON_COMPRESSIONS, JSON_LAYOUTS, SQLITE_SCHEMA_VERSION, BinaryStorage, JournalStorage,
+                          JsonStorage, SqliteStorage)
+from kumo.task_manager import TaskManager
 
 
 @pytest.fixture
@@ -22,10 +20,28 @@ def json_storage(temp_dir):
     return JsonStorage(json_file)
 
 
+@pytest.fixture
+def journal_storage(temp_dir):
+    journal_file = os.path.join(temp_dir, "test_tasks.jsonl")
+    storage = JournalStorage(journal_file, background_compaction=False)
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def binary_storage(temp_dir):
+    binary_file = os.path.join(temp_dir, "test_tasks.bin")
+    storage = BinaryStorage(binary_file)
+    yield storage
+    storage.close()
+
+
 @pytest.fixture
 def sqlite_storage(temp_dir):
     db_file = os.path.join(temp_dir, "test_tasks.db")
-    return SqliteStorage(db_file)
+    storage = SqliteStorage(db_file)
+    yield storage
+    storage.close()
 
 
 @pytest.fixture
@@ -41,12 +57,21 @@ def populated_json_storage(json_storage):
     return json_storage
 
 
+@pytest.fixture
+def populated_sqlite_storage(sqlite_storage):
+    sqlite_storage.save_task(Task(id=1, name="Test task 1", due_date="1918-11-11", priority=TaskPriority.HIGH, category="test"))
+    sqlite_storage.save_task(Task(id=2, name="Test task 2", due_date="1918-11-11", priority=TaskPriority.MEDIUM, category="test"))
+    sqlite_storage.save_task(Task(id=3, name="Test task 3", due_date="1918-11-11", priority=TaskPriority.MEDIUM, category="test 2"))
+
+    return sqlite_storage
+
+
 def test_json_ensure_file_exists(json_storage, temp_dir):
     json_file = os.path.join(temp_dir, "test_tasks.json")
     assert os.path.exists(json_file)
     with open(json_file, "r") as file:
         content = json.load(file)
-    assert content == []
+    assert content == {"nextId": 1, "tasks": []}
 
 
 def test_json_save_and_get_task(json_storage):
@@ -165,6 +190,214 @@ def test_json_delete_nonexistent_task(json_storage):
     json_storage.delete_task(1683)
 
 
+def test_json_get_task_uses_cache(populated_json_storage, monkeypatch):
+    def fail_load(f):
+        raise AssertionError("tasks file should not be parsed again")
+
+    monkeypatch.setattr(json, "load", fail_load)
+
+    assert populated_json_storage.get_task(2).name == "Test task 2"
+    assert populated_json_storage.get_task(4) is None
+    assert len(populated_json_storage.get_tasks(category="test")) == 2
+
+
+def test_json_cache_picks_up_external_writes(populated_json_storage):
+    other_storage = JsonStorage(populated_json_storage.file_path)
+    other_storage.save_task(Task(id=4, name="Test task 4", due_date="1918-11-11"))
+    other_storage.delete_task(1)
+
+    assert populated_json_storage.get_task(1) is None
+    assert populated_json_storage.get_task(4).name == "Test task 4"
+
+
+def test_journal_ensure_files_exist(journal_storage, temp_dir):
+    journal_file = os.path.join(temp_dir, "test_tasks.jsonl")
+    assert os.path.getsize(journal_file) == 0
+    with open(journal_file + ".snapshot", "r") as file:
+        content = json.load(file)
+    assert content == {"nextId": 1, "tasks": []}
+
+
+def test_journal_save_and_get_task(journal_storage):
+    task = Task(
+        id=1,
+        name="Test task",
+        due_date="1918-11-11",
+        priority=TaskPriority.MEDIUM,
+        category="test"
+    )
+    journal_storage.save_task(task)
+
+    retrieved_task = journal_storage.get_task(1)
+    assert retrieved_task is not None
+    assert retrieved_task.id == 1
+    assert retrieved_task.name == "Test task"
+    assert retrieved_task.due_date.isoformat() == "1918-11-11"
+    assert retrieved_task.priority == TaskPriority.MEDIUM
+    assert retrieved_task.category == "test"
+
+
+def test_journal_get_nonexistent_task(journal_storage):
+    assert journal_storage.get_task(1863) is None
+
+
+def test_journal_get_tasks(journal_storage):
+    journal_storage.save_task(Task(id=1, name="Test task 1", due_date="1918-11-11", priority=TaskPriority.HIGH, category="test"))
+    journal_storage.save_task(Task(id=2, name="Test task 2", due_date="1918-11-11", priority=TaskPriority.MEDIUM, category="test"))
+    journal_storage.save_task(Task(id=3, name="Test task 3", due_date="1918-11-11", priority=TaskPriority.MEDIUM, category="test 2"))
+
+    assert [task.id for task in journal_storage.get_all_tasks()] == [1, 2, 3]
+    assert [task.id for task in journal_storage.get_tasks(priority=TaskPriority.MEDIUM.value)] == [2, 3]
+    assert [task.id for task in journal_storage.get_tasks(category="test")] == [1, 2]
+
+
+def test_journal_update_task(journal_storage):
+    task = Task(
+        id=1,
+        name="Test task",
+        due_date="1918-11-11",
+        priority=TaskPriority.MEDIUM,
+        category="test"
+    )
+    journal_storage.save_task(task)
+
+    task.name = "Test task updated"
+    task.due_date = "1920-08-25"
+    task.priority = TaskPriority.HIGH
+    task.category = "updated"
+    journal_storage.update_task(task)
+
+    updated_task = journal_storage.get_task(1)
+    assert updated_task.name == "Test task updated"
+    assert updated_task.due_date.isoformat() == "1920-08-25"
+    assert updated_task.priority == TaskPriority.HIGH
+    assert updated_task.category == "updated"
+
+
+def test_journal_update_nonexistent_task(journal_storage):
+    journal_storage.update_task(Task(id=1, name="Test task", due_date="1918-11-11"))
+    assert journal_storage.get_task(1) is None
+
+
+def test_journal_delete_task(journal_storage):
+    journal_storage.save_task(Task(id=1, name="Test task", due_date="1918-11-11"))
+    assert journal_storage.get_task(1) is not None
+
+    journal_storage.delete_task(1)
+    journal_storage.delete_task(1683)
+
+    assert journal_storage.get_task(1) is None
+
+
+def test_journal_replay(journal_storage):
+    task = Task(id=1, name="Test task", due_date="1918-11-11")
+    journal_storage.save_task(task)
+    journal_storage.save_task(Task(id=2, name="Test task 2", due_date="1918-11-11"))
+    task.name = "Test task updated"
+    journal_storage.update_task(task)
+    journal_storage.delete_task(2)
+
+    reopened = JournalStorage(journal_storage.file_path)
+    assert [(task.id, task.name) for task in reopened.get_all_tasks()] == [(1, "Test task updated")]
+
+    reopened.save_task(Task(id=3, name="Test task 3", due_date="1918-11-11"))
+    assert journal_storage.get_task(3).name == "Test task 3"
+
+
+def test_journal_ignores_partial_entry(journal_storage):
+    journal_storage.save_task(Task(id=1, name="Test task", due_date="1918-11-11"))
+    with open(journal_storage.file_path, "a") as f:
+        f.write('{"op":"delete","id":')
+
+    reopened = JournalStorage(journal_storage.file_path)
+    assert reopened.get_task(1) is not None
+
+    reopened.save_task(Task(id=2, name="Test task 2", due_date="1918-11-11"))
+    reopened = JournalStorage(journal_storage.file_path)
+    assert [task.id for task in reopened.get_all_tasks()] == [1, 2]
+    with open(journal_storage.file_path, "rb") as f:
+        assert all(json.loads(line) for line in f)
+
+
+def test_journal_compaction(temp_dir):
+    journal_file = os.path.join(temp_dir, "test_tasks.jsonl")
+    storage = JournalStorage(journal_file, compaction_ratio=1.0, compaction_min_bytes=0, background_compaction=False)
+    for i in range(1, 21):
+        storage.save_task(Task(id=i, name=f"Test task {i}", due_date="1918-11-11"))
+    for i in range(1, 11):
+        storage.delete_task(i)
+
+    with open(journal_file + ".snapshot", "r") as file:
+        snapshot = json.load(file)
+    assert len(snapshot["tasks"]) > 0
+    assert os.path.getsize(journal_file) <= os.path.getsize(journal_file + ".snapshot")
+
+    reopened = JournalStorage(journal_file)
+    assert [task.id for task in reopened.get_all_tasks()] == list(range(11, 21))
+
+
+@pytest.fixture
+def umask():
+    previous = os.umask(0o022)
+    yield 0o022
+    os.umask(previous)
+
+
+def file_mode(path):
+    return os.stat(path).st_mode & 0o777
+
+
+def test_journal_compaction_keeps_file_modes(temp_dir, umask):
+    journal_file = os.path.join(temp_dir, "test_tasks.jsonl")
+    storage = JournalStorage(journal_file, compaction_ratio=1.0, compaction_min_bytes=0, background_compaction=False)
+    os.chmod(journal_file, 0o640)
+    storage.save_tasks([Task(id=i, name=f"Test task {i}", due_date="1918-11-11") for i in range(1, 11)])
+    storage.delete_tasks(range(1, 11))
+
+    assert file_mode(journal_file + ".snapshot") == 0o666 & ~umask
+    assert file_mode(journal_file) == 0o640
+
+
+def test_journal_background_compaction(temp_dir):
+    journal_file = os.path.join(temp_dir, "test_tasks.jsonl")
+    storage = JournalStorage(journal_file, compaction_ratio=1.0, compaction_min_bytes=0)
+    for i in range(1, 51):
+        storage.save_task(Task(id=i, name=f"Test task {i}", due_date="1918-11-11"))
+    storage.close()
+
+    assert [task.id for task in storage.get_all_tasks()] == list(range(1, 51))
+    reopened = JournalStorage(journal_file)
+    assert [task.id for task in reopened.get_all_tasks()] == list(range(1, 51))
+
+
+def _journal_writer(path: str, worker: int, writes: int, start) -> None:
+    storage = JournalStorage(path, compaction_min_bytes=2048)
+    manager = TaskManager(storage)
+    start.wait()
+    for i in range(writes):
+        manager.create_task(f"worker {worker} task {i}", "2025-01-01")
+    storage.close()
+
+
+def test_journal_concurrent_writer_processes_with_compaction(temp_dir):
+    journal_file = os.path.join(temp_dir, "test_tasks.jsonl")
+    start = multiprocessing.Event()
+    workers = [multiprocessing.Process(target=_journal_writer, args=(journal_file, worker, 100, start))
+               for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    start.set()
+    for worker in workers:
+        worker.join()
+    assert [worker.exitcode for worker in workers] == [0, 0, 0, 0]
+
+    tasks = JournalStorage(journal_file).get_all_tasks()
+    assert sorted(task.id for task in tasks) == list(range(1, 401))
+    assert len({task.name for task in tasks}) == 400
+    # The journal was compacted along the way.
+    assert os.path.getsize(journal_file + ".snapshot") > 2048
+
+
 def test_sqlite_initialize_db(sqlite_storage, temp_dir):
     db_file = os.path.join(temp_dir, "test_tasks.db")
     conn = sqlite3.connect(db_file)
@@ -267,3 +500,709 @@ def test_sqlite_delete_task(sqlite_storage):
     sqlite_storage.delete_task(1)
 
     assert sqlite_storage.get_task(1) is None
+
+
+def test_sqlite_pragmas(temp_dir):
+    db_file = os.path.join(temp_dir, "test_tasks.db")
+    with SqliteStorage(db_file, synchronous="full", cache_size=-2000, mmap_size=0) as storage:
+        conn = storage._conn
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 2
+        assert conn.execute("PRAGMA cache_size").fetchone()[0] == -2000
+        assert conn.execute("PRAGMA mmap_size").fetchone()[0] == 0
+
+
+def test_sqlite_invalid_pragma(temp_dir):
+    db_file = os.path.join(temp_dir, "test_tasks.db")
+    with pytest.raises(ValueError):
+        SqliteStorage(db_file, journal_mode="wal; DROP TABLE tasks")
+
+
+def test_sqlite_reuses_connection(sqlite_storage):
+    conn = sqlite_storage._conn
+    sqlite_storage.save_task(Task(id=1, name="Test task", due_date="1918-11-11"))
+    sqlite_storage.get_task(1)
+    assert sqlite_storage._conn is conn
+
+
+def test_sqlite_connection_per_thread(sqlite_storage):
+    sqlite_storage.save_task(Task(id=1, name="Test task", due_date="1918-11-11"))
+    results = []
+
+    def worker():
+        results.append((sqlite_storage._conn, sqlite_storage.get_task(1).name))
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+
+    assert results[0][0] is not sqlite_storage._conn
+    assert results[0][1] == "Test task"
+
+
+def test_sqlite_close(temp_dir):
+    db_file = os.path.join(temp_dir, "test_tasks.db")
+    with SqliteStorage(db_file) as storage:
+        storage.save_task(Task(id=1, name="Test task", due_date="1918-11-11"))
+        conn = storage._conn
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+
+    with SqliteStorage(db_file) as storage:
+        assert storage.get_task(1) is not None
+
+
+def test_sqlite_schema(sqlite_storage, temp_dir):
+    db_file = os.path.join(temp_dir, "test_tasks.db")
+    conn = sqlite3.connect(db_file)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SQLITE_SCHEMA_VERSION
+    table_sql = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='tasks'").fetchone()[0]
+    assert table_sql.rstrip().endswith("STRICT")
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    assert {"idx_tasks_category", "idx_tasks_priority", "idx_tasks_due_date", "idx_tasks_category_priority"} <= indexes
+    conn.close()
+
+
+def test_sqlite_stores_due_date_as_ordinal(sqlite_storage, temp_dir):
+    sqlite_storage.save_task(Task(id=1, name="Test task", due_date="1918-11-11"))
+
+    conn = sqlite3.connect(os.path.join(temp_dir, "test_tasks.db"))
+    assert conn.execute("SELECT due_date FROM tasks").fetchone()[0] == datetime.date(1918, 11, 11).toordinal()
+    conn.close()
+
+
+def test_sqlite_get_tasks_uses_index(populated_sqlite_storage):
+    plan = populated_sqlite_storage._conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM tasks WHERE category = ? AND priority = ?", ("test", 2)
+    ).fetchall()
+    assert "idx_tasks_category_priority" in plan[0][-1]
+
+    tasks = populated_sqlite_storage.get_tasks(category="test", priority=TaskPriority.MEDIUM.value)
+    assert [task.name for task in tasks] == ["Test task 2"]
+
+
+def test_sqlite_migrates_legacy_database(temp_dir):
+    db_file = os.path.join(temp_dir, "test_tasks.db")
+    conn = sqlite3.connect(db_file)
+    conn.execute('''
+        CREATE TABLE tasks (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            priority INTEGER DEFAULT NULL,
+            category TEXT DEFAULT NULL
+        )
+    ''')
+    conn.execute("INSERT INTO tasks VALUES (1, 'Test task 1', '1918-11-11', 3, 'test')")
+    conn.execute("INSERT INTO tasks VALUES (2, 'Test task 2', '1920-08-25', NULL, NULL)")
+    conn.commit()
+    conn.close()
+
+    with SqliteStorage(db_file) as storage:
+        task1 = storage.get_task(1)
+        assert task1.due_date.isoformat() == "1918-11-11"
+        assert task1.priority == TaskPriority.HIGH
+        assert task1.category == "test"
+
+        task2 = storage.get_task(2)
+        assert task2.due_date.isoformat() == "1920-08-25"
+        assert task2.priority is None
+
+        assert storage._conn.execute("PRAGMA user_version").fetchone()[0] == SQLITE_SCHEMA_VERSION
+        assert [task.id for task in storage.search("task 2")] == [2]
+
+
+@pytest.mark.parametrize("storage_fixture", ["json_storage", "journal_storage", "sqlite_storage", "binary_storage"])
+def test_batch_writes(storage_fixture, request):
+    storage = request.getfixturevalue(storage_fixture)
+    tasks = [Task(id=i, name=f"Test task {i}", due_date="1918-11-11", category="test") for i in range(1, 6)]
+    storage.save_tasks(tasks)
+    assert [task.id for task in storage.get_all_tasks()] == [1, 2, 3, 4, 5]
+
+    tasks[1].name = "Test task 2 updated"
+    tasks[3].priority = TaskPriority.HIGH
+    storage.update_tasks([tasks[1], tasks[3]])
+    assert storage.get_task(2).name == "Test task 2 updated"
+    assert storage.get_task(4).priority == TaskPriority.HIGH
+
+    storage.delete_tasks([1, 3, 1683])
+    assert [task.id for task in storage.get_all_tasks()] == [2, 4, 5]
+
+
+def test_sqlite_save_tasks_is_atomic(sqlite_storage):
+    sqlite_storage.save_task(Task(id=3, name="Test task 3", due_date="1918-11-11"))
+
+    with pytest.raises(sqlite3.IntegrityError):
+        sqlite_storage.save_tasks([
+            Task(id=1, name="Test task 1", due_date="1918-11-11"),
+            Task(id=2, name="Test task 2", due_date="1918-11-11"),
+            Task(id=3, name="Duplicate", due_date="1918-11-11"),
+        ])
+
+    assert [task.id for task in sqlite_storage.get_all_tasks()] == [3]
+
+
+def test_journal_batch_is_single_entry(journal_storage):
+    journal_storage.save_tasks([Task(id=i, name=f"Test task {i}", due_date="1918-11-11") for i in range(1, 4)])
+
+    with open(journal_storage.file_path, "r") as f:
+        assert len(f.readlines()) == 1
+
+
+def test_json_save_tasks_writes_once(json_storage, monkeypatch):
+    writes = []
+    write_tasks = json_storage._write_tasks
+    monkeypatch.setattr(json_storage, "_write_tasks", lambda tasks, *args, **kwargs: writes.append(tasks) or
+                        write_tasks(tasks, *args, **kwargs))
+
+    json_storage.save_tasks([Task(id=i, name=f"Test task {i}", due_date="1918-11-11") for i in range(1, 4)])
+    assert len(writes) == 1
+
+
+@pytest.mark.parametrize("storage_fixture", ["json_storage", "journal_storage", "sqlite_storage", "binary_storage"])
+def test_allocate_ids(storage_fixture, request):
+    storage = request.getfixturevalue(storage_fixture)
+    assert storage.allocate_ids() == 1
+    assert storage.allocate_ids(3) == 2
+    assert storage.allocate_ids() == 5
+
+    storage.save_task(Task(id=10, name="Test task", due_date="1918-11-11"))
+    assert storage.allocate_ids() == 11
+
+
+@pytest.mark.parametrize("storage_fixture", ["json_storage", "journal_storage", "sqlite_storage", "binary_storage"])
+def test_next_id_does_not_allocate(storage_fixture, request):
+    storage = request.getfixturevalue(storage_fixture)
+    assert storage.next_id() == 1
+    assert storage.next_id() == 1
+    assert storage.allocate_ids(3) == 1
+    storage.save_task(Task(id=10, name="Test task", due_date="1918-11-11"))
+    assert storage.next_id() == 11
+    assert storage.allocate_ids() == 11
+
+
+def test_json_allocate_ids_is_shared_between_instances(populated_json_storage):
+    other_storage = JsonStorage(populated_json_storage.file_path)
+    assert populated_json_storage.allocate_ids() == 4
+    assert other_storage.allocate_ids() == 5
+    assert populated_json_storage.allocate_ids() == 6
+    assert len(populated_json_storage.get_all_tasks()) == 3
+
+
+def test_json_allocate_ids_does_not_reparse(populated_json_storage, monkeypatch):
+    populated_json_storage.allocate_ids()
+    monkeypatch.setattr(json, "load", lambda f: pytest.fail("tasks file should not be parsed again"))
+    populated_json_storage.allocate_ids()
+    assert populated_json_storage.get_task(1) is not None
+
+
+def test_json_reads_legacy_file(temp_dir):
+    json_file = os.path.join(temp_dir, "test_tasks.json")
+    with open(json_file, "w") as file:
+        json.dump([{"id": 7, "name": "Test task", "dueDate": "1918-11-11"}], file)
+
+    storage = JsonStorage(json_file)
+    assert storage.get_task(7).name == "Test task"
+    assert storage.allocate_ids() == 8
+    with open(json_file, "r") as file:
+        assert json.load(file)["nextId"] == 9
+
+
+def test_json_writes_from_stale_instances_are_not_lost(populated_json_storage):
+    other_storage = JsonStorage(populated_json_storage.file_path)
+    other_storage.get_all_tasks()
+    populated_json_storage.save_task(Task(id=4, name="Test task 4", due_date="1918-11-11"))
+    populated_json_storage.delete_task(1)
+    other_storage.save_task(Task(id=5, name="Test task 5", due_date="1918-11-11"))
+
+    assert [task.id for task in JsonStorage(populated_json_storage.file_path).get_all_tasks()] == [2, 3, 4, 5]
+
+
+def test_json_falls_back_to_locked_write_after_conflicts(populated_json_storage, monkeypatch):
+    write_tasks = populated_json_storage._write_tasks
+    attempts = []
+
+    def conflicting_write(tasks, version=None, lock=None):
+        attempts.append(version)
+        if lock is None:
+            return False
+        return write_tasks(tasks, version, lock)
+
+    monkeypatch.setattr(populated_json_storage, "_write_tasks", conflicting_write)
+    populated_json_storage.delete_task(1)
+    assert len(attempts) == storage_module.JSON_OPTIMISTIC_ATTEMPTS + 1
+    assert populated_json_storage.get_task(1) is None
+
+
+def test_json_failed_write_leaves_file_intact(populated_json_storage, monkeypatch):
+    with open(populated_json_storage.file_path, "rb") as file:
+        content = file.read()
+    monkeypatch.setattr(storage_module.os, "replace", lambda *args: (_ for _ in ()).throw(OSError("disk full")))
+    with pytest.raises(OSError):
+        populated_json_storage.save_task(Task(id=4, name="Test task 4", due_date="1918-11-11"))
+
+    with open(populated_json_storage.file_path, "rb") as file:
+        assert file.read() == content
+    directory = os.path.dirname(populated_json_storage.file_path)
+    assert sorted(os.listdir(directory)) == ["test_tasks.json", "test_tasks.json.lock"]
+
+
+def test_json_does_not_replace_corrupt_file(temp_dir):
+    json_file = os.path.join(temp_dir, "test_tasks.json")
+    with open(json_file, "w") as file:
+        file.write('{"nextId": 3, "tasks": [{"id": 1')
+
+    storage = JsonStorage(json_file)
+    with pytest.raises(ValueError):
+        storage.get_all_tasks()
+    with open(json_file) as file:
+        assert file.read() == '{"nextId": 3, "tasks": [{"id": 1'
+
+
+def test_json_concurrent_writer_processes(temp_dir):
+    from benchmarks.bench_json_writers import run_writers
+
+    result = run_writers(os.path.join(temp_dir, "test_tasks.json"), processes=4, writes=25)
+    assert result["tasks"] == 100
+    assert result["lost_saves"] == 0
+    assert result["lost_updates"] == 0
+    assert result["operations_per_second"] > 0
+
+
+def test_journal_allocate_ids_is_shared_between_instances(journal_storage):
+    other_storage = JournalStorage(journal_storage.file_path)
+    assert journal_storage.allocate_ids() == 1
+    assert other_storage.allocate_ids(2) == 2
+    assert journal_storage.allocate_ids() == 4
+
+    journal_storage.compact()
+    assert JournalStorage(journal_storage.file_path).allocate_ids() == 5
+
+
+def _journal_allocator(path: str, allocations: int, start, results) -> None:
+    storage = JournalStorage(path, compaction_min_bytes=512, background_compaction=False)
+    start.wait()
+    results.put([storage.allocate_ids(3) for _ in range(allocations)])
+
+
+def test_journal_allocate_ids_from_processes_with_compaction(temp_dir):
+    journal_file = os.path.join(temp_dir, "test_tasks.jsonl")
+    JournalStorage(journal_file)
+    start = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_journal_allocator, args=(journal_file, 100, start, results))
+               for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    start.set()
+    firsts = sorted(first for _ in workers for first in results.get(timeout=60))
+    for worker in workers:
+        worker.join()
+    assert [worker.exitcode for worker in workers] == [0, 0, 0, 0]
+
+    # Every range of three ids is disjoint from the others.
+    assert firsts == list(range(1, 1201, 3))
+    assert JournalStorage(journal_file).allocate_ids() == 1201
+
+
+def test_sqlite_allocate_ids_is_shared_between_instances(sqlite_storage):
+    with SqliteStorage(sqlite_storage.db_path) as other_storage:
+        assert sqlite_storage.allocate_ids() == 1
+        assert other_storage.allocate_ids(2) == 2
+        assert sqlite_storage.allocate_ids() == 4
+
+
+@pytest.mark.parametrize("storage_fixture", ["json_storage", "journal_storage", "sqlite_storage", "binary_storage"])
+def test_iter_tasks(storage_fixture, request):
+    storage = request.getfixturevalue(storage_fixture)
+    storage.save_tasks([
+        Task(id=1, name="Test task 1", due_date="1918-11-11", priority=TaskPriority.HIGH, category="test"),
+        Task(id=2, name="Test task 2", due_date="1918-11-11", priority=TaskPriority.MEDIUM, category="test"),
+        Task(id=3, name="Test task 3", due_date="1918-11-11", priority=TaskPriority.MEDIUM, category="test 2"),
+    ])
+
+    tasks = storage.iter_tasks()
+    assert not isinstance(tasks, list)
+    assert [task.id for task in tasks] == [1, 2, 3]
+    assert [task.id for task in storage.iter_tasks(priority=TaskPriority.MEDIUM.value)] == [2, 3]
+    assert [task.id for task in storage.iter_tasks(category="test", priority=TaskPriority.MEDIUM.value)] == [2]
+
+
+def test_json_iter_tasks_streams_file(json_storage, monkeypatch):
+    json_storage.save_tasks([Task(id=i, name=f"Test task {i}, [{i}]", due_date="1918-11-11") for i in range(1, 101)])
+    other_storage = JsonStorage(json_storage.file_path)
+    json_storage.save_task(Task(id=101, name="Test task 101", due_date="1918-11-11"))
+
+    monkeypatch.setattr(storage_module, "JSON_STREAM_CHUNK_SIZE", 7)
+    monkeypatch.setattr(json, "load", lambda f: pytest.fail("tasks file should be streamed"))
+    tasks = list(other_storage.iter_tasks())
+    assert [task.id for task in tasks] == list(range(1, 102))
+    assert tasks[41].name == "Test task 42, [42]"
+
+
+def test_json_iter_tasks_streams_legacy_file(temp_dir, monkeypatch):
+    json_file = os.path.join(temp_dir, "test_tasks.json")
+    with open(json_file, "w") as file:
+        json.dump([{"id": i, "name": f"Test task {i}", "dueDate": "1918-11-11"} for i in range(1, 11)], file, indent=2)
+    storage = JsonStorage(json_file)
+    storage._signature = None
+
+    monkeypatch.setattr(storage_module, "JSON_STREAM_CHUNK_SIZE", 5)
+    assert [task.id for task in storage.iter_tasks()] == list(range(1, 11))
+
+
+def test_sqlite_iter_tasks_in_batches(temp_dir):
+    with SqliteStorage(os.path.join(temp_dir, "test_tasks.db"), iter_batch_size=2) as storage:
+        storage.save_tasks([Task(id=i, name=f"Test task {i}", due_date="1918-11-11") for i in range(1, 6)])
+
+        tasks = storage.iter_tasks()
+        assert next(tasks).id == 1
+        assert storage.get_task(5) is not None
+        assert [task.id for task in tasks] == [2, 3, 4, 5]
+
+
+def test_binary_save_and_get_task(binary_storage):
+    task = Task(
+        id=1,
+        name="Test task ☁",
+        due_date="1918-11-11",
+        priority=TaskPriority.MEDIUM,
+        category="test"
+    )
+    binary_storage.save_task(task)
+
+    retrieved_task = binary_storage.get_task(1)
+    assert retrieved_task is not None
+    assert retrieved_task.id == 1
+    assert retrieved_task.name == "Test task ☁"
+    assert retrieved_task.due_date.isoformat() == "1918-11-11"
+    assert retrieved_task.priority == TaskPriority.MEDIUM
+    assert retrieved_task.category == "test"
+
+
+def test_binary_save_and_get_task_without_priority_and_category(binary_storage):
+    binary_storage.save_task(Task(id=1, name="Test task", due_date="1918-11-11", category=""))
+    binary_storage.save_task(Task(id=2, name="Test task", due_date="1918-11-11"))
+
+    assert binary_storage.get_task(1).category == ""
+    retrieved_task = binary_storage.get_task(2)
+    assert retrieved_task.priority is None
+    assert retrieved_task.category is None
+    assert [task.id for task in binary_storage.get_tasks(category="")] == [1]
+
+
+def test_binary_get_nonexistent_task(binary_storage):
+    binary_storage.save_task(Task(id=2, name="Test task", due_date="1918-11-11"))
+
+    assert binary_storage.get_task(1) is None
+    assert binary_storage.get_task(0) is None
+    assert binary_storage.get_task(1683) is None
+
+
+def test_binary_rejects_invalid_id(binary_storage):
+    with pytest.raises(ValueError):
+        binary_storage.save_task(Task(id=0, name="Test task", due_date="1918-11-11"))
+
+
+def test_binary_update_and_delete_task(binary_storage):
+    task = Task(id=1, name="Test task", due_date="1918-11-11", priority=TaskPriority.MEDIUM, category="test")
+    binary_storage.save_task(task)
+
+    task.name = "Test task updated"
+    task.due_date = "1920-08-25"
+    task.priority = TaskPriority.HIGH
+    task.category = "updated"
+    binary_storage.update_task(task)
+    binary_storage.update_task(Task(id=2, name="Test task 2", due_date="1918-11-11"))
+
+    updated_task = binary_storage.get_task(1)
+    assert updated_task.name == "Test task updated"
+    assert updated_task.due_date.isoformat() == "1920-08-25"
+    assert updated_task.priority == TaskPriority.HIGH
+    assert updated_task.category == "updated"
+    assert binary_storage.get_task(2) is None
+
+    binary_storage.delete_task(1)
+    binary_storage.delete_task(1683)
+    assert binary_storage.get_task(1) is None
+
+
+def test_binary_filters_without_building_other_tasks(binary_storage, monkeypatch):
+    binary_storage.save_tasks([
+        Task(id=i, name=f"Test task {i}", due_date="1918-11-11", priority=TaskPriority(i % 3 + 1), category=f"test {i % 2}")
+        for i in range(1, 11)
+    ])
+    built = []
+    from_row = Task.from_row
+    monkeypatch.setattr(Task, "from_row", classmethod(lambda cls, row: built.append(row[0]) or from_row(row)))
+
+    tasks = binary_storage.get_tasks(category="test 1", priority=TaskPriority.LOW.value)
+    assert [task.id for task in tasks] == [3, 9]
+    assert built == [3, 9]
+
+
+def test_binary_reopen(binary_storage):
+    binary_storage.save_tasks([Task(id=i, name=f"Test task {i}", due_date="1918-11-11") for i in range(1, 4)])
+    binary_storage.delete_task(2)
+
+    with BinaryStorage(binary_storage.file_path) as reopened:
+        assert [task.id for task in reopened.get_all_tasks()] == [1, 3]
+        assert reopened.allocate_ids() == 4
+        reopened.save_task(Task(id=4, name="Test task 4", due_date="1918-11-11"))
+
+    assert binary_storage.get_task(4).name == "Test task 4"
+
+
+def test_binary_compaction(temp_dir):
+    binary_file = os.path.join(temp_dir, "test_tasks.bin")
+    with BinaryStorage(binary_file, compaction_min_bytes=0) as storage:
+        other_storage = BinaryStorage(binary_file)
+        storage.save_tasks([Task(id=i, name=f"Test task {i}", due_date="1918-11-11", category="test") for i in range(1, 11)])
+        storage.delete_tasks(range(5, 11))
+        storage.update_task(Task(id=1, name="Test task 1 updated", due_date="1918-11-11"))
+
+        assert not os.path.exists(binary_file + ".heap.0")
+        assert os.path.getsize(binary_file) == 32 + 4 * 40
+        assert [task.name for task in other_storage.get_all_tasks()] == [
+            "Test task 1 updated", "Test task 2", "Test task 3", "Test task 4"
+        ]
+        assert other_storage.allocate_ids() == 11
+        other_storage.close()
+
+
+def test_binary_compaction_keeps_file_modes(temp_dir, umask):
+    binary_file = os.path.join(temp_dir, "test_tasks.bin")
+    with BinaryStorage(binary_file, compaction_min_bytes=0) as storage:
+        os.chmod(binary_file, 0o640)
+        storage.save_tasks([Task(id=i, name=f"Test task {i}", due_date="1918-11-11") for i in range(1, 11)])
+        storage.delete_tasks(range(5, 11))
+
+    assert not os.path.exists(binary_file + ".heap.0")
+    assert file_mode(binary_file) == 0o640
+    assert file_mode(binary_file + ".heap.1") == 0o666 & ~umask
+
+
+def test_binary_rejects_foreign_file(temp_dir):
+    binary_file = os.path.join(temp_dir, "test_tasks.bin")
+    with open(binary_file, "wb") as f:
+        f.write(b"x" * 64)
+
+    with pytest.raises(ValueError):
+        BinaryStorage(binary_file)
+
+
+@pytest.fixture
+def sortable_tasks():
+    return [
+        Task(id=1, name="delta", due_date="1920-08-25", priority=TaskPriority.LOW, category="b"),
+        Task(id=2, name="alpha", due_date="1918-11-11", category="a"),
+        Task(id=3, name="charlie", due_date="1939-09-01", priority=TaskPriority.HIGH),
+        Task(id=4, name="bravo", due_date="1918-11-11", priority=TaskPriority.HIGH, category="a"),
+        Task(id=5, name="echo", due_date="1989-06-04", priority=TaskPriority.MEDIUM, category="b"),
+    ]
+
+
+@pytest.mark.parametrize("storage_fixture", ["json_storage", "journal_storage", "sqlite_storage", "binary_storage"])
+@pytest.mark.parametrize("order_by, descending, limit, offset, expected", [
+    ("due_date", False, None, 0, [2, 4, 1, 3, 5]),
+    ("due_date", True, 2, 0, [5, 3]),
+    ("due_date", False, 2, 1, [4, 1]),
+    ("name", False, 3, 0, [2, 4, 3]),
+    ("priority", False, None, 0, [2, 1, 5, 3, 4]),
+    ("priority", True, 3, 0, [4, 3, 5]),
+    ("category", False, None, 0, [3, 2, 4, 1, 5]),
+    ("category", True, 1, 1, [1]),
+    ("id", True, None, 3, [2, 1]),
+    (None, False, 2, 2, [3, 4]),
+    (None, False, None, 4, [5]),
+])
+def test_get_tasks_ordered_and_paged(storage_fixture, order_by, descending, limit, offset, expected, sortable_tasks, request):
+    storage = request.getfixturevalue(storage_fixture)
+    storage.save_tasks(sortable_tasks)
+
+    tasks = storage.get_tasks(order_by=order_by, descending=descending, limit=limit, offset=offset)
+    assert [task.id for task in tasks] == expected
+    tasks = storage.iter_tasks(order_by=order_by, descending=descending, limit=limit, offset=offset)
+    assert [task.id for task in tasks] == expected
+
+
+@pytest.mark.parametrize("storage_fixture", ["json_storage", "journal_storage", "sqlite_storage", "binary_storage"])
+def test_get_tasks_filtered_ordered_and_paged(storage_fixture, sortable_tasks, request):
+    storage = request.getfixturevalue(storage_fixture)
+    storage.save_tasks(sortable_tasks)
+
+    tasks = storage.get_tasks(category="a", order_by="name", descending=True, limit=1)
+    assert [task.id for task in tasks] == [4]
+
+
+@pytest.mark.parametrize("storage_fixture", ["json_storage", "journal_storage", "sqlite_storage", "binary_storage"])
+def test_get_tasks_rejects_unknown_order(storage_fixture, request):
+    storage = request.getfixturevalue(storage_fixture)
+    with pytest.raises(ValueError):
+        storage.get_tasks(order_by="dueDate; DROP TABLE tasks")
+
+
+@pytest.mark.parametrize("storage_fixture", ["json_storage", "journal_storage", "sqlite_storage", "binary_storage"])
+@pytest.mark.parametrize("order_by, limit, offset", [
+    (None, -1, 0),
+    ("due_date", -5, 0),
+    (None, None, -1),
+    ("name", 2, -3),
+])
+def test_get_tasks_rejects_negative_page(storage_fixture, order_by, limit, offset, sortable_tasks, request):
+    storage = request.getfixturevalue(storage_fixture)
+    storage.save_tasks(sortable_tasks)
+    with pytest.raises(ValueError, match="must not be negative"):
+        storage.get_tasks(order_by=order_by, limit=limit, offset=offset)
+    with pytest.raises(ValueError, match="must not be negative"):
+        list(storage.iter_tasks(order_by=order_by, limit=limit, offset=offset))
+
+
+def test_json_get_tasks_with_limit_does_not_sort_everything(json_storage, sortable_tasks, monkeypatch):
+    json_storage.save_tasks(sortable_tasks)
+    monkeypatch.setattr(storage_module, "sorted", lambda *args, **kwargs: pytest.fail("should not sort"), raising=False)
+
+    assert [task.id for task in json_storage.get_tasks(order_by="due_date", limit=2)] == [2, 4]
+
+
+def test_sqlite_ordered_query_uses_index(populated_sqlite_storage):
+    plan = populated_sqlite_storage._conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM tasks ORDER BY due_date ASC, id ASC LIMIT 20"
+    ).fetchall()
+    assert "idx_tasks_due_date" in " ".join(row[-1] for row in plan)
+
+
+@pytest.mark.parametrize("storage_fixture", ["json_storage", "journal_storage", "sqlite_storage", "binary_storage"])
+@pytest.mark.parametrize("query, expected", [
+    ("priority >= medium", [3, 4, 5]),
+    ("due_date < 1930-01-01 and category = null", []),
+    ("due_date >= 1920-08-25 and due_date <= 1939-09-01", [1, 3]),
+    ("category in (a, c) or name startswith ch", [2, 3, 4]),
+    ("not category = a", [1, 3, 5]),
+    ("category != a", [1, 5]),
+    ("name contains ph and not priority = null", []),
+    ("name contains ph or priority = null", [2]),
+])
+def test_get_tasks_with_query(storage_fixture, query, expected, sortable_tasks, request):
+    storage = request.getfixturevalue(storage_fixture)
+    storage.save_tasks(sortable_tasks)
+
+    assert [task.id for task in storage.get_tasks(query=parse_query(query), order_by="id")] == expected
+    assert [task.id for task in storage.iter_tasks(query=parse_query(query), order_by="id")] == expected
+
+
+@pytest.mark.parametrize("storage_fixture", ["json_storage", "journal_storage", "sqlite_storage", "binary_storage"])
+def test_get_tasks_with_query_and_filters(storage_fixture, sortable_tasks, request):
+    storage = request.getfixturevalue(storage_fixture)
+    storage.save_tasks(sortable_tasks)
+
+    tasks = storage.get_tasks(category="b", query=field("priority") > 1, order_by="id", descending=True)
+    assert [task.id for task in tasks] == [5]
+
+
+@pytest.mark.parametrize("storage_fixture", ["json_storage", "journal_storage", "sqlite_storage", "binary_storage"])
+def test_search(storage_fixture, request):
+    storage = request.getfixturevalue(storage_fixture)
+    storage.save_tasks([
+        Task(id=1, name="Buy milk", due_date="1918-11-11"),
+        Task(id=2, name="Buy milk, milk and more milk for the café", due_date="1918-11-11"),
+        Task(id=3, name="Milk the cow", due_date="1918-11-11"),
+        Task(id=4, name="Call the CAFE", due_date="1918-11-11"),
+        Task(id=5, name="Write report", due_date="1918-11-11"),
+    ])
+
+    assert [task.id for task in storage.search("milk")] == [1, 2, 3]
+    assert [task.id for task in storage.search("MILK buy")] == [1, 2]
+    assert [task.id for task in storage.search("milk", limit=1)] == [1]
+    assert [task.id for task in storage.search("cafe")] == [4, 2]
+    assert storage.search("milkshake") == []
+    assert storage.search("  ,; ") == []
+    assert storage.search('"milk" OR') == storage.search("milk or")
+
+    storage.delete_task(3)
+    storage.update_task(Task(id=5, name="Write milk report", due_date="1918-11-11"))
+    assert [task.id for task in storage.search("milk")] == [1, 2, 5]
+
+
+@pytest.mark.parametrize("storage_fixture", ["json_storage", "journal_storage", "sqlite_storage", "binary_storage"])
+def test_summarize(storage_fixture, sortable_tasks, request):
+    storage = request.getfixturevalue(storage_fixture)
+    assert storage.summarize() == {(): 0}
+    assert storage.summarize(["category"]) == {}
+    storage.save_tasks(sortable_tasks + [Task(id=6, name="foxtrot", due_date="2999-01-01", category="a")])
+
+    assert storage.summarize() == {(): 6}
+    assert storage.summarize(["category"]) == {(None,): 1, ("a",): 3, ("b",): 2}
+    assert storage.summarize(["priority"]) == {(None,): 2, (1,): 1, (2,): 1, (3,): 2}
+    assert storage.summarize(["overdue"]) == {(True,): 5, (False,): 1}
+    assert storage.summarize(["due_date"], category="a") == {(datetime.date(1918, 11, 11),): 2,
+                                                             (datetime.date(2999, 1, 1),): 1}
+    assert storage.summarize(["category", "priority"], query=parse_query("priority >= medium")) == \
+        {(None, 3): 1, ("a", 3): 1, ("b", 2): 1}
+    assert storage.summarize(["category", "overdue"], priority=3) == {(None, True): 1, ("a", True): 1}
+    assert storage.summarize(category="c") == {(): 0}
+
+
+@pytest.mark.parametrize("storage_fixture", ["json_storage", "journal_storage", "sqlite_storage", "binary_storage"])
+def test_summarize_rejects_unknown_group(storage_fixture, request):
+    storage = request.getfixturevalue(storage_fixture)
+    with pytest.raises(ValueError):
+        storage.summarize(["name"])
+
+
+def test_json_summarize_does_not_build_tasks(populated_json_storage, monkeypatch):
+    monkeypatch.setattr(Task, "from_dict", lambda data: pytest.fail("should not build tasks"))
+    assert populated_json_storage.summarize(["category"]) == {("test",): 2, ("test 2",): 1}
+
+
+def test_sqlite_summarize_uses_index(populated_sqlite_storage):
+    statements = []
+    populated_sqlite_storage._conn.set_trace_callback(statements.append)
+    assert populated_sqlite_storage.summarize(["category", "priority"]) == \
+        {("test", 2): 1, ("test", 3): 1, ("test 2", 2): 1}
+    plan = populated_sqlite_storage._conn.execute("EXPLAIN QUERY PLAN " + statements[-1]).fetchall()
+    assert "COVERING INDEX idx_tasks_category_priority" in " ".join(row[-1] for row in plan)
+
+
+@pytest.mark.parametrize("layout", JSON_LAYOUTS)
+@pytest.mark.parametrize("compression", ["none", *JSON_COMPRESSIONS])
+def test_json_formats(layout, compression, sortable_tasks, temp_dir):
+    json_file = os.path.join(temp_dir, "test_tasks.json")
+    storage = JsonStorage(json_file, layout, compression)
+    storage.save_tasks(sortable_tasks)
+    storage.update_task(Task(id=2, name="alpha", due_date="1918-11-11", priority=TaskPriority.LOW))
+    storage.delete_task(5)
+    assert storage.allocate_ids(2) == 6
+
+    # Read back by an instance that does not know the format, which keeps
+    # it when writing.
+    other = JsonStorage(json_file)
+    expected = [task.to_dict() for task in storage.get_tasks(order_by="id")]
+    assert [task.to_dict() for task in other.get_tasks(order_by="id")] == expected
+    assert [task.to_dict() for task in JsonStorage(json_file).iter_tasks(order_by="id")] == expected
+    other.save_task(Task(id=9, name="foxtrot", due_date="1918-11-11"))
+    assert other.allocate_ids(1) == 10
+    with open(json_file, "rb") as f:
+        assert other._decode(f.read())[2] == (layout, compression)
+
+
+def test_json_format_can_be_changed(populated_json_storage, temp_dir):
+    json_file = os.path.join(temp_dir, "test_tasks.json")
+    plain_size = os.path.getsize(json_file)
+    storage = JsonStorage(json_file, "columnar", "zlib")
+    storage.delete_task(3)
+    assert os.path.getsize(json_file) < plain_size
+    assert [task.id for task in populated_json_storage.get_all_tasks()] == [1, 2]
+
+    JsonStorage(json_file, compression="none").delete_task(2)
+    with open(json_file) as f:
+        assert json.load(f) == {"nextId": 4, "columns": {"id": [1], "name": ["Test task 1"], "dueDate": ["1918-11-11"],
+                                                        "priority": [3], "category": ["test"]}}
+
+
+def test_json_rejects_unknown_format(temp_dir):
+    with pytest.raises(ValueError):
+        JsonStorage(os.path.join(temp_dir, "test_tasks.json"), layout="xml")
+    with pytest.raises(ValueError):
+        JsonStorage(os.path.join(temp_dir, "test_tasks.json"), compression="zip")
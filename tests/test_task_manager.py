@@ -1,17 +1,9 @@
 import pytest
 import os
-import tempfile
-import shutil
-from kumo.task import TaskPriority
+from kumo.task import Task, TaskPriority
 from kumo.storage import JsonStorage
 from kumo.task_manager import TaskManager
-
-
-@pytest.fixture
-def temp_dir():
-    dir_path = tempfile.mkdtemp()
-    yield dir_path
-    shutil.rmtree(dir_path)
+import main
 
 
 @pytest.fixture
@@ -118,4 +110,115 @@ def test_delete_task(task_manager):
 
     task_manager.delete_task(task.id)
 
-    assert task_manager.get_task(task.id) is None
\ No newline at end of file
+    assert task_manager.get_task(task.id) is None
+
+
+def test_create_tasks(task_manager):
+    task_manager.create_task("Test task 1", "1918-11-11")
+    tasks = task_manager.create_tasks([
+        {"name": "Test task 2", "due_date": "1918-11-11"},
+        {"name": "Test task 3", "due_date": "1920-08-25", "priority": TaskPriority.HIGH, "category": "test"},
+    ])
+    assert [task.id for task in tasks] == [2, 3]
+    assert task_manager.get_task(3).priority == TaskPriority.HIGH
+
+    task = task_manager.create_task("Test task 4", "1918-11-11")
+    assert task.id == 4
+
+
+def test_update_tasks(task_manager):
+    task1 = task_manager.create_task("Test task 1", "1918-11-11")
+    task2 = task_manager.create_task("Test task 2", "1918-11-11")
+
+    task1.name = "Test task 1 updated"
+    task_manager.update_task(task1)
+    task2.category = "updated"
+    task_manager.update_tasks([task2])
+
+    assert task_manager.get_task(1).name == "Test task 1 updated"
+    assert task_manager.get_task(2).category == "updated"
+
+
+def test_delete_tasks(task_manager):
+    task_manager.create_tasks([{"name": f"Test task {i}", "due_date": "1918-11-11"} for i in range(3)])
+    task_manager.delete_tasks([1, 3])
+
+    assert [task.id for task in task_manager.get_all_tasks()] == [2]
+
+
+def test_task_manager_does_not_load_tasks_on_init(json_storage, monkeypatch):
+    json_storage.save_task(Task(id=1, name="Test task", due_date="1918-11-11"))
+    monkeypatch.setattr(json_storage, "get_all_tasks", lambda: pytest.fail("tasks should not be loaded"))
+
+    manager = TaskManager(json_storage)
+    assert manager.create_task("Test task 2", "1918-11-11").id == 2
+
+
+def test_task_managers_share_id_sequence(json_storage):
+    manager1 = TaskManager(json_storage)
+    manager2 = TaskManager(JsonStorage(json_storage.file_path))
+
+    assert manager1.create_task("Test task 1", "1918-11-11").id == 1
+    assert manager2.create_task("Test task 2", "1918-11-11").id == 2
+    assert manager1.create_task("Test task 3", "1918-11-11").id == 3
+    assert len(manager1.get_all_tasks()) == 3
+
+
+def test_iter_tasks(task_manager):
+    task_manager.create_task("Test task 1", "1918-11-11", TaskPriority.HIGH, "test")
+    task_manager.create_task("Test task 2", "1918-11-11", TaskPriority.MEDIUM, "test")
+
+    assert [task.name for task in task_manager.iter_tasks(category="test", priority=TaskPriority.MEDIUM.value)] == ["Test task 2"]
+
+
+def test_get_tasks_ordered_and_paged(task_manager):
+    task_manager.create_task("Test task 1", "1920-08-25")
+    task_manager.create_task("Test task 2", "1918-11-11")
+    task_manager.create_task("Test task 3", "1939-09-01")
+
+    tasks = task_manager.get_tasks(order_by="due_date", descending=True, limit=2)
+    assert [task.id for task in tasks] == [3, 1]
+    tasks = task_manager.iter_tasks(order_by="due_date", offset=1)
+    assert [task.id for task in tasks] == [1, 3]
+
+
+def test_search(task_manager):
+    task_manager.create_task("Buy milk", "1918-11-11")
+    task_manager.create_task("Write report", "1918-11-11")
+
+    assert [task.name for task in task_manager.search("milk")] == ["Buy milk"]
+
+
+def test_summarize(task_manager):
+    task_manager.create_task("Buy milk", "1918-11-11", TaskPriority.HIGH, "home")
+    task_manager.create_task("Write report", "2999-01-01", TaskPriority.HIGH, "work")
+    task_manager.create_task("Call mom", "2999-01-01", category="home")
+
+    assert task_manager.summarize(["category"]) == {("home",): 2, ("work",): 1}
+    assert task_manager.summarize(["priority", "overdue"], category="home") == {(3, True): 1, (None, False): 1}
+
+
+def test_stats_action(temp_dir, monkeypatch, capsys):
+    monkeypatch.chdir(temp_dir)
+    main.main(["add", "--name", "Buy milk", "--due", "1918-11-11", "--priority", "3", "--category", "home"])
+    main.main(["add", "--name", "Write report", "--due", "2999-01-01", "--category", "work"])
+    capsys.readouterr()
+
+    main.main(["stats"])
+    assert capsys.readouterr().out.splitlines() == [
+        "tasks: 2",
+        "by category:", "  home: 1", "  work: 1",
+        "by priority:", "  None: 1", "  HIGH: 1",
+        "by overdue:", "  no: 1", "  yes: 1",
+    ]
+    main.main(["stats", "--group-by", "category,overdue", "--where", "priority = high"])
+    assert capsys.readouterr().out.splitlines() == ["tasks: 1", "by category, overdue:", "  home / yes: 1"]
+
+
+@pytest.mark.parametrize("option", ["--limit", "--offset"])
+def test_list_rejects_negative_page(temp_dir, monkeypatch, capsys, option):
+    monkeypatch.chdir(temp_dir)
+    with pytest.raises(SystemExit) as exc_info:
+        main.main(["list", option, "-1"])
+    assert exc_info.value.code == 2
+    assert "must not be negative: -1" in capsys.readouterr().err
@@ -0,0 +1,159 @@
+import io
+import json
+import os
+
+import pytest
+
+import main
+from kumo.storage import JournalStorage, JsonStorage, SqliteStorage
+from kumo.task import Task, TaskPriority
+from kumo.task_manager import TaskManager
+from kumo.transfer import import_tasks, migrate, read_tasks, write_tasks
+
+
+def make_tasks(count):
+    return [Task(i, f"Task {i}", "2025-01-01", TaskPriority.HIGH if i % 2 else None, "home" if i % 3 else None)
+            for i in range(1, count + 1)]
+
+
+def as_dicts(tasks):
+    return sorted((task.to_dict() for task in tasks), key=lambda task: task["id"])
+
+
+@pytest.mark.parametrize("format", ["jsonl", "csv"])
+def test_write_and_read_round_trip(format):
+    tasks = make_tasks(5)
+    output = io.StringIO()
+    assert write_tasks(tasks, output, format) == 5
+    assert as_dicts(read_tasks(io.StringIO(output.getvalue()), format)) == as_dicts(tasks)
+
+
+def test_read_csv_accepts_priority_names_and_missing_ids():
+    text = "name,due_date,priority,category\nBuy milk,2025-01-01,high,home\nCall mom,2025-02-01,,\n"
+    tasks = list(read_tasks(io.StringIO(text), "csv"))
+    assert [(task.id, task.priority, task.category) for task in tasks] == [(0, TaskPriority.HIGH, "home"),
+                                                                           (0, None, None)]
+
+
+def test_read_reports_bad_lines():
+    with pytest.raises(ValueError, match="line 2"):
+        list(read_tasks(io.StringIO('{"name": "a", "dueDate": "2025-01-01"}\n{"name": "b"}\n')))
+    with pytest.raises(ValueError, match="missing"):
+        list(read_tasks(io.StringIO("id,name\n1,a\n"), "csv"))
+
+
+def test_import_preserves_ids_in_chunks(storage):
+    progress = []
+    tasks = make_tasks(7)
+    tasks[3].id = 40
+    assert import_tasks(storage, tasks, chunk_size=3, progress=lambda *counts: progress.append(counts)) == (7, 0)
+    assert progress == [(3, 0), (6, 0), (7, 0)]
+    assert as_dicts(storage.get_all_tasks()) == as_dicts(tasks)
+    assert storage.allocate_ids(1) == 41
+
+
+def test_import_resumes_by_skipping_existing_ids(storage):
+    tasks = make_tasks(10)
+    import_tasks(storage, tasks[:4], chunk_size=3)
+    assert import_tasks(storage, make_tasks(10), chunk_size=3) == (6, 4)
+    assert as_dicts(storage.get_all_tasks()) == as_dicts(tasks)
+
+
+def test_import_replace_overwrites_existing_ids(storage):
+    import_tasks(storage, make_tasks(4))
+    tasks = make_tasks(6)
+    for task in tasks:
+        task.name = f"New {task.id}"
+    assert import_tasks(storage, tasks, chunk_size=4, replace=True) == (6, 0)
+    assert as_dicts(storage.get_all_tasks()) == as_dicts(tasks)
+
+
+def test_import_allocates_missing_ids(storage):
+    TaskManager(storage).create_task("Existing", "2025-01-01")
+    tasks = list(read_tasks(io.StringIO('{"name": "a", "dueDate": "2025-01-01"}\n'
+                                        '{"name": "b", "dueDate": "2025-01-02"}\n')))
+    assert import_tasks(storage, tasks) == (2, 0)
+    assert sorted(task.id for task in storage.get_all_tasks()) == [1, 2, 3]
+
+
+def test_migrate_json_to_sqlite_preserves_ids(temp_dir):
+    source = JsonStorage(os.path.join(temp_dir, "tasks.json"))
+    manager = TaskManager(source)
+    manager.create_tasks({"name": f"Task {i}", "due_date": "2025-01-01", "category": "home"} for i in range(10))
+    manager.delete_tasks([3, 10])
+    target = SqliteStorage(os.path.join(temp_dir, "tasks.db"))
+    try:
+        assert migrate(source, target, chunk_size=4) == (8, 0)
+        assert as_dicts(target.get_all_tasks()) == as_dicts(source.get_all_tasks())
+        # Ids of deleted tasks are not reused by the target.
+        assert target.allocate_ids(1) == 11
+    finally:
+        target.close()
+
+
+def directory_contents(path):
+    # SQLite's shared-memory file records readers too.
+    contents = {}
+    for name in os.listdir(path):
+        if name.endswith("-shm"):
+            continue
+        with open(os.path.join(path, name), "rb") as f:
+            contents[name] = f.read()
+    return contents
+
+
+def test_migrate_does_not_write_to_the_source(storage, temp_dir, tmp_path):
+    manager = TaskManager(storage)
+    manager.create_tasks({"name": f"Task {i}", "due_date": "2025-01-01"} for i in range(5))
+    manager.delete_tasks([5])
+    before = directory_contents(temp_dir)
+    target = SqliteStorage(str(tmp_path / "tasks.db"))
+    try:
+        assert migrate(storage, target) == (4, 0)
+        assert target.allocate_ids(1) == 6
+    finally:
+        target.close()
+    assert directory_contents(temp_dir) == before
+
+
+def test_migrate_keeps_target_tasks_the_source_does_not_have(temp_dir):
+    source = JsonStorage(os.path.join(temp_dir, "tasks.json"))
+    source.save_tasks(make_tasks(2))
+    target = SqliteStorage(os.path.join(temp_dir, "tasks.db"))
+    try:
+        stale = make_tasks(3)
+        for task in stale:
+            task.name = "Stale"
+        target.save_tasks(stale)
+        assert migrate(source, target) == (0, 2)
+        assert [task.name for task in target.get_tasks(order_by="id")] == ["Stale"] * 3
+        assert migrate(source, target, replace=True) == (2, 0)
+        assert [task.name for task in target.get_tasks(order_by="id")] == ["Task 1", "Task 2", "Stale"]
+    finally:
+        target.close()
+
+
+def test_cli_export_import_and_migrate(temp_dir, monkeypatch, capsys):
+    monkeypatch.chdir(temp_dir)
+    main.main(["add", "--name", "Buy milk", "--due", "2025-01-01", "--priority", "2", "--category", "home"])
+    main.main(["add", "--name", "Write, report", "--due", "2025-02-01"])
+
+    main.main(["export", "--file", "tasks.csv"])
+    with open("tasks.csv") as f:
+        assert f.readline().strip() == "id,name,due_date,priority,category"
+    main.main(["import", "--storage", "journal", "--file", "tasks.csv"])
+    main.main(["migrate", "--to", "sqlite", "--chunk-size", "1"])
+    assert "migrated: 2 tasks" in capsys.readouterr().err
+
+    main.main(["export", "--storage", "sqlite", "--order-by", "id"])
+    exported = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert exported == [
+        {"id": 1, "name": "Buy milk", "dueDate": "2025-01-01", "priority": 2, "category": "home"},
+        {"id": 2, "name": "Write, report", "dueDate": "2025-02-01"},
+    ]
+    journal = JournalStorage("tasks.jsonl", background_compaction=False)
+    assert as_dicts(journal.get_all_tasks()) == exported
+    journal.close()
+
+    with pytest.raises(SystemExit):
+        main.main(["migrate"])